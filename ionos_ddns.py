@@ -4,12 +4,926 @@ Script per aggiornare DNS dinamico su IONOS
 """
 
 import argparse
+import fcntl
+import functools
+import fnmatch
 import json
+import os
+import queue
+import random
+import signal
+import socket
+import struct
 import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 import ipaddress
-import requests
+
+# Moduli pesanti (requests, asyncio, ssl, concurrent.futures, ...) vengono importati
+# solo dove servono: un'esecuzione da cron con IP invariato resta leggera.
+
+
+def write_json_atomic(path: Path, data) -> None:
+    """
+    Scrive un file JSON in modo atomico
+
+    Il contenuto viene scritto su un file temporaneo nella stessa directory
+    e poi rinominato, così un lettore concorrente vede sempre o il file
+    vecchio o quello nuovo, mai uno scritto a metà.
+    """
+    write_text_atomic(path, json.dumps(data))
+
+
+@contextmanager
+def file_lock(lock_path: Path):
+    """
+    Lock esclusivo tra processi su un file di lock (fcntl.flock)
+
+    Chi arriva dopo attende il rilascio. Anche due thread dello stesso
+    processo si escludono, perché ognuno apre il file per conto suo.
+    """
+    lock_path = Path(lock_path)
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_text_atomic(path: Path, text: str, mode: Optional[int] = None) -> None:
+    """
+    Scrive un file di testo in modo atomico (vedi write_json_atomic)
+
+    Args:
+        path: File da scrivere
+        text: Contenuto
+        mode: Permessi del file (default: quelli di mkstemp, 0600)
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            if mode is not None:
+                os.fchmod(f.fileno(), mode)
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class Metrics:
+    """
+    Metriche di esecuzione in formato Prometheus
+
+    Contatori, gauge e istogrammi con etichette, tenuti in memoria e
+    condivisi da PublicIPDetector, IONOSClient e DNSUpdater. render()
+    produce il formato testuale di Prometheus, usato sia per il collector
+    textfile di node_exporter (write_textfile) sia per l'endpoint /metrics
+    del daemon (MetricsServer).
+    """
+
+    # Limiti superiori in secondi dei bucket degli istogrammi di durata
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    # Nome -> (tipo, descrizione) delle metriche esportate
+    DEFINITIONS = {
+        "ionos_ddns_runs_total": (
+            "counter", "Esecuzioni per esito (unchanged, changed, error)"),
+        "ionos_ddns_phase_duration_seconds": (
+            "histogram", "Durata delle fasi di un'esecuzione (detect, zone_lookup, zone_read, write, total)"),
+        "ionos_ddns_records_total": (
+            "counter", "Record verificati per tipo ed esito (unchanged, updated, created, error)"),
+        "ionos_ddns_last_run_timestamp_seconds": (
+            "gauge", "Fine dell'ultima esecuzione (Unix time)"),
+        "ionos_ddns_last_success_timestamp_seconds": (
+            "gauge", "Fine dell'ultima esecuzione senza errori (Unix time)"),
+        "ionos_ddns_detections_total": (
+            "counter", "Rilevamenti dell'IP pubblico per famiglia e fonte che ha risposto (cache, none se nessuna)"),
+        "ionos_ddns_ip_service_requests_total": (
+            "counter", "Richieste ai servizi di rilevamento IP per esito (ok, error, invalid)"),
+        "ionos_ddns_ip_service_duration_seconds": (
+            "histogram", "Latenza delle richieste ai servizi di rilevamento IP"),
+        "ionos_ddns_ip_service_skipped_total": (
+            "counter", "Servizi di rilevamento IP saltati perché sospesi (circuito aperto)"),
+        "ionos_ddns_ip_service_dissents_total": (
+            "counter", "Risposte dei servizi di rilevamento IP in disaccordo con l'indirizzo scelto dal quorum"),
+        "ionos_ddns_api_requests_total": (
+            "counter", "Richieste alle API IONOS per endpoint e stato HTTP (error per errori di rete)"),
+        "ionos_ddns_api_request_duration_seconds": (
+            "histogram", "Latenza delle richieste alle API IONOS per endpoint"),
+        "ionos_ddns_api_retries_total": (
+            "counter", "Nuovi tentativi di richieste alle API IONOS"),
+        "ionos_ddns_api_throttle_seconds_total": (
+            "counter", "Secondi di attesa imposti dal limite di frequenza verso le API IONOS"),
+        "ionos_ddns_poll_interval_seconds": (
+            "gauge", "Intervallo corrente tra due cicli del daemon, escluso il jitter"),
+        "ionos_ddns_poll_interval_reason": (
+            "gauge", "Motivo dell'intervallo corrente (1 per il motivo attivo)"),
+    }
+
+    def __init__(self):
+        # Nome -> etichette ordinate -> valore (per gli istogrammi [conteggi per bucket, somma, conteggio])
+        self._samples: Dict[str, Dict[Tuple[Tuple[str, str], ...], object]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels: Dict[str, object]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        """Incrementa un contatore"""
+        key = self._key(labels)
+        with self._lock:
+            samples = self._samples.setdefault(name, {})
+            samples[key] = samples.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """Imposta il valore di un gauge"""
+        key = self._key(labels)
+        with self._lock:
+            self._samples.setdefault(name, {})[key] = float(value)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Registra un'osservazione in un istogramma"""
+        key = self._key(labels)
+        with self._lock:
+            samples = self._samples.setdefault(name, {})
+            histogram = samples.get(key)
+            if histogram is None:
+                histogram = samples[key] = [[0] * len(self.BUCKETS), 0.0, 0]
+            for index, bound in enumerate(self.BUCKETS):
+                if value <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Misura la durata del blocco e la registra nell'istogramma indicato"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start, **labels)
+
+    def value(self, name: str, **labels) -> float:
+        """Valore di un contatore o gauge (numero di osservazioni per un istogramma), 0 se assente"""
+        with self._lock:
+            sample = self._samples.get(name, {}).get(self._key(labels), 0.0)
+        return sample[2] if isinstance(sample, list) else sample
+
+    @staticmethod
+    def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = key + extra
+        if not pairs:
+            return ""
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    @staticmethod
+    def _format_value(value: float) -> str:
+        return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+    def render(self) -> str:
+        """Restituisce tutte le metriche nel formato testuale di Prometheus (versione 0.0.4)"""
+        with self._lock:
+            snapshot = {name: {key: ([list(sample[0]), sample[1], sample[2]] if isinstance(sample, list) else sample)
+                               for key, sample in samples.items()}
+                        for name, samples in self._samples.items()}
+
+        lines = []
+        for name, (kind, help_text) in self.DEFINITIONS.items():
+            samples = snapshot.get(name)
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, sample in sorted(samples.items()):
+                if kind != "histogram":
+                    lines.append(f"{name}{self._format_labels(key)} {self._format_value(sample)}")
+                    continue
+                buckets, total, count = sample
+                for bound, bucket_count in zip(self.BUCKETS, buckets):
+                    le = (("le", repr(bound)),)
+                    lines.append(f"{name}_bucket{self._format_labels(key, le)} {bucket_count}")
+                lines.append(f"{name}_bucket{self._format_labels(key, (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{self._format_labels(key)} {self._format_value(total)}")
+                lines.append(f"{name}_count{self._format_labels(key)} {count}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def write_textfile(self, path: Path) -> bool:
+        """
+        Scrive le metriche per il collector textfile di node_exporter
+
+        Il file viene sostituito in modo atomico, così node_exporter non legge
+        mai un file scritto a metà, ed è leggibile da tutti (node_exporter di
+        solito gira con un altro utente).
+
+        Returns:
+            True se il file è stato scritto
+        """
+        try:
+            write_text_atomic(path, self.render(), mode=0o644)
+            return True
+        except OSError as e:
+            # Le metriche sono accessorie: un errore non deve far fallire l'aggiornamento
+            print(f"ATTENZIONE: impossibile scrivere le metriche in {path}: {e}")
+            return False
+
+
+class MetricsServer:
+    """Espone le metriche su HTTP (GET /metrics) da un thread in background"""
+
+    DEFAULT_PORT = 9877
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, metrics: Metrics, address: str = "127.0.0.1", port: int = DEFAULT_PORT):
+        """
+        Args:
+            metrics: Metriche da esporre
+            address: Indirizzo su cui ascoltare (default: solo locale)
+            port: Porta TCP (0 per una porta libera qualsiasi)
+        """
+        self.metrics = metrics
+        self.address = address
+        self.port = port
+        self._server = None
+
+    def start(self) -> 'MetricsServer':
+        """Avvia il server; la porta effettiva è in self.port"""
+        # http.server importa diversi moduli: serve solo in modalità daemon
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self.metrics
+        content_type = self.CONTENT_TYPE
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((self.address, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.5},
+                         name="metrics-server", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        """Arresta il server"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class TransportError(Exception):
+    """Errore di rete durante una richiesta HTTP (connessione, timeout, TLS, ...)"""
+
+
+class HTTPStatusError(TransportError):
+    """Risposta HTTP con stato di errore (4xx/5xx)"""
+
+    def __init__(self, message: str, response: 'HTTPResponse'):
+        super().__init__(message)
+        self.response = response
+
+
+class HTTPResponse:
+    """Risposta HTTP indipendente dal trasporto usato"""
+
+    __slots__ = ('status_code', 'headers', 'content', 'url')
+
+    def __init__(self, status_code: int, headers, content: bytes, url: str):
+        """
+        Args:
+            status_code: Codice di stato HTTP
+            headers: Header della risposta (mapping con get() case-insensitive)
+            content: Corpo della risposta
+            url: URL richiesto
+        """
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        """Solleva HTTPStatusError se la risposta indica un errore"""
+        if self.status_code >= 400:
+            kind = "Client Error" if self.status_code < 500 else "Server Error"
+            raise HTTPStatusError(f"{self.status_code} {kind} for url: {self.url}", self)
+
+
+class HTTPTransport:
+    """
+    Interfaccia del livello HTTP usato da IONOSClient e PublicIPDetector
+
+    Le implementazioni devono essere thread-safe e sollevare TransportError
+    per gli errori di rete; le risposte con stato di errore vengono
+    restituite normalmente.
+    """
+
+    def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                params: Optional[Dict[str, str]] = None, json=None,
+                timeout: Optional[float] = None, data: Optional[bytes] = None) -> HTTPResponse:
+        """Invia una richiesta; il corpo è json (serializzato) oppure data (byte grezzi)"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Chiude le connessioni aperte"""
+
+
+class UrllibTransport(HTTPTransport):
+    """
+    Trasporto basato solo sulla libreria standard (http.client)
+
+    Mantiene un pool di connessioni keep-alive per host: al massimo
+    pool_size connessioni aperte insieme, i thread in eccesso attendono
+    una connessione libera.
+    """
+
+    IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'})
+
+    def __init__(self, pool_size: int = 10):
+        """
+        Args:
+            pool_size: Numero massimo di connessioni aperte contemporaneamente
+        """
+        self.pool_size = pool_size
+        self._idle: Dict[Tuple[str, str, Optional[int]], list] = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._ssl_context = None
+
+    def _connect(self, scheme: str, host: str, port: Optional[int], timeout: Optional[float]):
+        import http.client
+        if scheme == 'http':
+            return http.client.HTTPConnection(host, port, timeout=timeout)
+        if self._ssl_context is None:
+            import ssl
+            self._ssl_context = ssl.create_default_context()
+        return http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl_context)
+
+    def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                params: Optional[Dict[str, str]] = None, json=None,
+                timeout: Optional[float] = None, data: Optional[bytes] = None) -> HTTPResponse:
+        import http.client
+        from json import dumps
+        from urllib.parse import urlencode, urlsplit
+
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise TransportError(f"URL non supportato: {url}")
+        path = parts.path or '/'
+        query = "&".join(q for q in (parts.query, urlencode(params) if params else "") if q)
+        if query:
+            path = f"{path}?{query}"
+            url = f"{parts.scheme}://{parts.netloc}{path}"
+        headers = dict(headers or {})
+        body = data
+        if json is not None:
+            body = dumps(json).encode()
+            headers.setdefault("Content-Type", "application/json")
+        key = (parts.scheme, parts.hostname, parts.port)
+
+        with self._slots:
+            conn = self._take_idle(key)
+            reused = conn is not None
+            while True:
+                if conn is None:
+                    conn = self._connect(parts.scheme, parts.hostname, parts.port, timeout)
+                else:
+                    conn.timeout = timeout
+                    if conn.sock is not None:
+                        conn.sock.settimeout(timeout)
+                sent = False
+                try:
+                    conn.request(method, path, body=body, headers=headers)
+                    sent = True
+                    response = conn.getresponse()
+                    content = response.read()
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                    conn.close()
+                    if not reused:
+                        raise TransportError(f"{method} {url}: {e}") from e
+                    # Connessione keep-alive chiusa dal server mentre era inattiva: le altre inattive
+                    # verso lo stesso host sono probabilmente scadute insieme
+                    self._close_idle(key)
+                    if sent and method.upper() not in self.IDEMPOTENT_METHODS:
+                        # Il server potrebbe aver già eseguito la richiesta: ripeterla duplicherebbe l'effetto
+                        raise TransportError(f"{method} {url}: {e}") from e
+                    # Si riprova una volta su una connessione nuova
+                    conn, reused = None, False
+                    continue
+                except (OSError, http.client.HTTPException) as e:
+                    conn.close()
+                    raise TransportError(f"{method} {url}: {e}") from e
+
+                if response.will_close:
+                    conn.close()
+                else:
+                    with self._lock:
+                        self._idle.setdefault(key, []).append(conn)
+                return HTTPResponse(response.status, response.headers, content, url)
+
+    def _take_idle(self, key: Tuple[str, str, Optional[int]]):
+        """
+        Preleva una connessione inattiva verso un host, scartando quelle già chiuse dal server
+
+        Una connessione inattiva non ha dati da leggere: se il socket risulta
+        leggibile il server l'ha chiusa (keep-alive scaduto) e va scartata
+        prima di inviarci una richiesta che non si potrebbe ripetere.
+        """
+        import select
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                conn = idle.pop() if idle else None
+            if conn is None or conn.sock is None:
+                return conn
+            try:
+                readable, _, _ = select.select([conn.sock], [], [], 0)
+            except (OSError, ValueError):
+                readable = True
+            if not readable:
+                return conn
+            conn.close()
+
+    def _close_idle(self, key: Tuple[str, str, Optional[int]]) -> None:
+        """Chiude le connessioni inattive verso un host"""
+        with self._lock:
+            connections = self._idle.pop(key, [])
+        for conn in connections:
+            conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+
+class RequestsTransport(HTTPTransport):
+    """Trasporto basato su requests (opzionale, importato solo se usato)"""
+
+    def __init__(self, session=None, pool_size: int = 10):
+        """
+        Args:
+            session: requests.Session da usare; se None ne viene creata una con pool keep-alive
+            pool_size: Numero massimo di connessioni mantenute nel pool
+        """
+        import requests
+        self._requests = requests
+        self.session = session if session is not None else self._create_session(pool_size)
+
+    def _create_session(self, pool_size: int):
+        """
+        Crea una sessione HTTP con pool di connessioni keep-alive
+
+        Il pool è thread-safe: con pool_block i thread attendono una
+        connessione libera invece di aprirne di nuove.
+        """
+        session = self._requests.Session()
+        adapter = self._requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            pool_block=True
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                params: Optional[Dict[str, str]] = None, json=None,
+                timeout: Optional[float] = None, data: Optional[bytes] = None) -> HTTPResponse:
+        try:
+            response = self.session.request(method, url, headers=headers, params=params,
+                                            json=json, data=data, timeout=timeout)
+        except self._requests.exceptions.RequestException as e:
+            raise TransportError(str(e)) from e
+        return HTTPResponse(response.status_code, response.headers, response.content, response.url)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+TRANSPORTS = {"urllib": UrllibTransport, "requests": RequestsTransport}
+DEFAULT_TRANSPORT = "urllib"
+
+
+def create_transport(name: Optional[str] = None, pool_size: int = 10) -> HTTPTransport:
+    """
+    Crea il trasporto HTTP indicato
+
+    Args:
+        name: 'urllib' (solo libreria standard) o 'requests'; default DEFAULT_TRANSPORT
+        pool_size: Numero massimo di connessioni mantenute nel pool
+    """
+    name = name or DEFAULT_TRANSPORT
+    try:
+        return TRANSPORTS[name](pool_size=pool_size)
+    except KeyError:
+        raise ValueError(f"Trasporto HTTP sconosciuto: {name}") from None
+
+
+def _udp_exchange(sock: socket.socket, request: bytes, matches: Callable[[bytes], bool],
+                  timeout: float, rto: float) -> Optional[bytes]:
+    """
+    Invia una richiesta su un socket UDP connesso e ne attende la risposta
+
+    La richiesta viene ritrasmessa con attese che raddoppiano a partire da
+    rto, fino a timeout; i pacchetti per cui matches() è falso vengono ignorati.
+
+    Returns:
+        La risposta o None se non è arrivata in tempo
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        sock.send(request)
+        retransmit = min(time.monotonic() + rto, deadline)
+        rto *= 2
+        while True:
+            remaining = retransmit - time.monotonic()
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            try:
+                data = sock.recv(2048)
+            except socket.timeout:
+                break
+            if matches(data):
+                return data
+        if time.monotonic() >= deadline:
+            return None
+
+
+# STUN (RFC 5389): richiesta Binding e attributi con l'indirizzo visto dal server
+STUN_PORT = 3478
+STUN_MAGIC_COOKIE = 0x2112A442
+STUN_BINDING_REQUEST = 0x0001
+STUN_BINDING_SUCCESS = 0x0101
+STUN_ATTR_MAPPED_ADDRESS = 0x0001
+STUN_ATTR_XOR_MAPPED_ADDRESS = 0x0020
+STUN_RTO = 0.25  # Attesa in secondi prima della prima ritrasmissione (raddoppia ogni volta)
+
+_STUN_HEADER = struct.Struct("!HHI12s")
+_STUN_ATTR = struct.Struct("!HH")
+
+
+def parse_stun_uri(uri: str) -> Tuple[str, int]:
+    """
+    Separa host e porta di un URI stun:host[:porta] (IPv6 tra parentesi quadre)
+
+    Raises:
+        ValueError: se l'URI non è valido
+    """
+    if not uri.startswith("stun:"):
+        raise ValueError(f"URI STUN non valido: {uri}")
+    rest = uri[len("stun:"):]
+    if rest.startswith('['):
+        host, _, tail = rest[1:].partition(']')
+        port = tail[1:] if tail.startswith(':') else tail
+    else:
+        host, _, port = rest.partition(':')
+    if not host or (port and not port.isdigit()):
+        raise ValueError(f"URI STUN non valido: {uri}")
+    return host, int(port) if port else STUN_PORT
+
+
+def build_stun_request(transaction_id: bytes) -> bytes:
+    """Costruisce una richiesta Binding senza attributi"""
+    return _STUN_HEADER.pack(STUN_BINDING_REQUEST, 0, STUN_MAGIC_COOKIE, transaction_id)
+
+
+def parse_stun_response(data: bytes, transaction_id: bytes) -> Optional[str]:
+    """
+    Estrae l'indirizzo mappato da una risposta Binding
+
+    Preferisce XOR-MAPPED-ADDRESS e ripiega su MAPPED-ADDRESS dei server
+    che implementano solo RFC 3489.
+
+    Returns:
+        L'indirizzo IP o None se la risposta non lo contiene
+
+    Raises:
+        ValueError: se il messaggio non è la risposta di successo alla richiesta indicata
+    """
+    if len(data) < _STUN_HEADER.size:
+        raise ValueError("Risposta STUN troncata")
+    message_type, length, cookie, received_id = _STUN_HEADER.unpack_from(data)
+    if cookie != STUN_MAGIC_COOKIE or received_id != transaction_id:
+        raise ValueError("La risposta STUN non corrisponde alla richiesta")
+    if message_type != STUN_BINDING_SUCCESS:
+        raise ValueError(f"Risposta STUN di errore (tipo 0x{message_type:04x})")
+
+    mapped = None
+    offset, end = _STUN_HEADER.size, min(len(data), _STUN_HEADER.size + length)
+    while offset + _STUN_ATTR.size <= end:
+        attr_type, attr_length = _STUN_ATTR.unpack_from(data, offset)
+        value = data[offset + _STUN_ATTR.size:offset + _STUN_ATTR.size + attr_length]
+        if attr_type == STUN_ATTR_XOR_MAPPED_ADDRESS:
+            mask = struct.pack("!I", STUN_MAGIC_COOKIE) + transaction_id
+            return _stun_address(value, mask)
+        if attr_type == STUN_ATTR_MAPPED_ADDRESS and mapped is None:
+            mapped = _stun_address(value, bytes(16))
+        # Gli attributi sono allineati a 4 byte
+        offset += _STUN_ATTR.size + ((attr_length + 3) & ~3)
+    return mapped
+
+
+def _stun_address(value: bytes, mask: bytes) -> str:
+    """Decodifica un attributo indirizzo (famiglia, porta, indirizzo) applicando la maschera XOR"""
+    if len(value) < 8:
+        raise ValueError("Attributo indirizzo STUN troncato")
+    size = {0x01: 4, 0x02: 16}.get(value[1])
+    raw = value[4:4 + size] if size else b""
+    if len(raw) != size:
+        raise ValueError("Attributo indirizzo STUN non valido")
+    return str(ipaddress.ip_address(bytes(a ^ b for a, b in zip(raw, mask))))
+
+
+def stun_query(host: str, port: int, version: int, timeout: float) -> Optional[str]:
+    """
+    Chiede a un server STUN l'indirizzo pubblico con cui viene visto
+
+    La richiesta viene ritrasmessa con attese crescenti (da STUN_RTO) fino
+    a timeout; le risposte con un ID di transazione diverso vengono ignorate.
+
+    Args:
+        host: Nome o indirizzo del server
+        port: Porta UDP
+        version: Famiglia da usare (4 o 6): determina l'indirizzo restituito
+        timeout: Secondi massimi di attesa per questo server
+
+    Returns:
+        L'indirizzo mappato o None se il server non ha risposto in tempo
+
+    Raises:
+        OSError: se il server non è risolvibile o raggiungibile
+        ValueError: se il server risponde con un errore
+    """
+    family = socket.AF_INET if version == 4 else socket.AF_INET6
+    address = socket.getaddrinfo(host, port, family, socket.SOCK_DGRAM)[0][4]
+    transaction_id = os.urandom(12)
+    request = build_stun_request(transaction_id)
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.connect(address)
+        data = _udp_exchange(sock, request, lambda data: data[4:20] == request[4:20], timeout, STUN_RTO)
+    return parse_stun_response(data, transaction_id) if data is not None else None
+
+
+class ServiceStats:
+    """
+    Statistiche dei servizi di rilevamento IP, persistenti tra le esecuzioni
+
+    Per ogni servizio: media mobile esponenziale (EWMA) della latenza delle
+    risposte valide e del tasso di successo, fallimenti consecutivi e ora
+    dell'ultimo fallimento. PublicIPDetector le usa per interrogare prima i
+    servizi con il costo atteso più basso e per sospendere (circuit breaker)
+    quelli che falliscono di continuo. Il file viene scritto sotto lock e in
+    modo atomico, come StateStore; senza file le statistiche restano in memoria.
+    """
+
+    ALPHA = 0.3  # Peso dell'ultima misura nelle medie mobili
+    PRIOR_LATENCY = 1.0  # Latenza ipotizzata in secondi per un servizio mai interrogato
+    FAILURE_THRESHOLD = 3  # Fallimenti consecutivi che aprono il circuito
+    COOLDOWN = 600  # Secondi di sospensione di un servizio con il circuito aperto
+
+    def __init__(self, path: Optional[Path] = None, failure_threshold: int = FAILURE_THRESHOLD,
+                 cooldown: float = COOLDOWN):
+        """
+        Args:
+            path: File in cui salvare le statistiche (opzionale)
+            failure_threshold: Fallimenti consecutivi che aprono il circuito
+            cooldown: Secondi di sospensione dopo l'ultimo fallimento a circuito aperto
+        """
+        self.path = Path(path) if path else None
+        self.lock_path = self.path.with_name(self.path.name + '.lock') if self.path else None
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._services: Dict[str, Dict] = self._read()
+        self._changed = set()
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Dict]:
+        """Legge le statistiche dal file (vuote se assente o corrotto)"""
+        if not self.path:
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                services = json.load(f).get('services', {})
+            return {name: entry for name, entry in services.items() if isinstance(entry, dict)}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def get(self, service: str) -> Optional[Dict]:
+        """Copia delle statistiche di un servizio, o None se mai interrogato"""
+        with self._lock:
+            entry = self._services.get(service)
+            return dict(entry) if entry is not None else None
+
+    def record(self, service: str, ok: bool, latency: float, now: Optional[float] = None) -> None:
+        """Registra l'esito di una richiesta a un servizio"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._services.setdefault(service, {})
+            if ok:
+                entry['latency'] = self._ewma(entry.get('latency'), latency)
+                entry['failures'] = 0
+            else:
+                entry['failures'] = entry.get('failures', 0) + 1
+                entry['last_failure'] = now
+            entry['success'] = self._ewma(entry.get('success'), 1.0 if ok else 0.0)
+            entry['attempts'] = entry.get('attempts', 0) + 1
+            self._changed.add(service)
+
+    def _ewma(self, average: Optional[float], value: float) -> float:
+        return value if average is None else average + self.ALPHA * (value - average)
+
+    def cost(self, service: str, timeout: float) -> float:
+        """
+        Costo atteso in secondi di una richiesta al servizio
+
+        Latenza media più il timeout pesato per la probabilità di fallimento:
+        un servizio veloce ma inaffidabile costa più di uno lento e stabile.
+        """
+        with self._lock:
+            entry = self._services.get(service, {})
+            latency = entry.get('latency', self.PRIOR_LATENCY)
+            success = entry.get('success', 1.0)
+        return latency + (1.0 - success) * timeout
+
+    def is_open(self, service: str, now: Optional[float] = None) -> bool:
+        """Verifica se il circuito del servizio è aperto (servizio sospeso)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._services.get(service, {})
+            return (entry.get('failures', 0) >= self.failure_threshold
+                    and now - entry.get('last_failure', 0) < self.cooldown)
+
+    def save(self) -> None:
+        """Salva sul file le statistiche aggiornate da questo processo"""
+        if not self.path:
+            return
+        with self._lock:
+            changed = {service: dict(self._services[service]) for service in self._changed}
+            self._changed.clear()
+        if not changed:
+            return
+        try:
+            with file_lock(self.lock_path):
+                # Rilegge sotto lock per non perdere i servizi aggiornati da altri processi
+                services = self._read()
+                services.update(changed)
+                write_json_atomic(self.path, {"services": services})
+        except OSError:
+            # Le statistiche sono solo un'ottimizzazione: un errore di scrittura non è fatale
+            pass
+
+
+class DetectionCache:
+    """
+    Cache su disco dell'IP rilevato, condivisa tra processi
+
+    Con più esecuzioni da cron nello stesso minuto (una per hostname o per
+    account) l'IP viene rilevato una volta sola: il primo processo interroga
+    i servizi tenendo un lock esclusivo per famiglia di indirizzi, gli altri
+    attendono sul lock e poi leggono il risultato invece di interrogare a
+    loro volta. Le voci scadono dopo ttl secondi e non valgono più se sono
+    cambiati gli indirizzi delle interfacce locali (nuova rete, nuovo lease
+    DHCP, riconnessione PPPoE). Anche i rilevamenti falliti vengono
+    registrati, per NEGATIVE_TTL secondi: chi attendeva sul lock non ripete
+    a sua volta un rilevamento destinato a fallire (es. IPv6 con
+    --dual-stack su una rete solo IPv4). Le scritture sono atomiche, quindi
+    una voce valida si legge senza lock.
+    """
+
+    TTL = 60  # Validità in secondi di un IP rilevato
+    NEGATIVE_TTL = 10  # Validità in secondi di un rilevamento fallito
+
+    def __init__(self, path: Path, ttl: float = TTL):
+        """
+        Args:
+            path: File della cache
+            ttl: Secondi dopo i quali l'IP va rilevato di nuovo
+        """
+        self.path = Path(path)
+        self.ttl = ttl
+
+    def _lock_path(self, name: str) -> Path:
+        return self.path.with_name(f"{self.path.name}.{name}.lock")
+
+    def _read(self) -> Dict:
+        """Legge le voci dal file (vuote se assente o corrotto)"""
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _lookup(self, record_type: str, fingerprint: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """
+        Returns:
+            (True, IP) per una voce valida, con IP None se registra un
+            rilevamento fallito; (False, None) se la voce manca o è scaduta
+        """
+        entry = self._read().get(record_type)
+        if not isinstance(entry, dict):
+            return False, None
+        try:
+            age = time.time() - float(entry['ts'])
+        except (KeyError, TypeError, ValueError):
+            return False, None
+        ip = entry.get('ip')
+        ttl = self.ttl if ip else min(self.ttl, self.NEGATIVE_TTL)
+        if not 0 <= age < ttl or entry.get('interfaces') != fingerprint:
+            return False, None
+        return True, ip
+
+    def get(self, record_type: str, fingerprint: Optional[str] = None) -> Optional[str]:
+        """
+        Restituisce l'IP in cache per il tipo di record ('A' o 'AAAA')
+
+        Returns:
+            L'IP se la voce non è scaduta ed è stata scritta con gli stessi
+            indirizzi locali, altrimenti None
+        """
+        return self._lookup(record_type, fingerprint)[1]
+
+    def set(self, record_type: str, ip: Optional[str], fingerprint: Optional[str] = None) -> None:
+        """Registra l'IP rilevato (None se il rilevamento è fallito) per il tipo di record con il timestamp corrente"""
+        with file_lock(self._lock_path("write")):
+            # Rilegge sotto lock per non perdere la voce dell'altra famiglia
+            entries = self._read()
+            entries[record_type] = {"ip": ip, "ts": time.time(), "interfaces": fingerprint}
+            write_json_atomic(self.path, entries)
+
+    def get_or_detect(self, version: int,
+                      detect: Callable[[], Tuple[Optional[str], Optional[str]]]) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Restituisce l'IP in cache o lo rileva con detect() e lo salva
+
+        Args:
+            version: Famiglia di indirizzi (4 o 6)
+            detect: Rilevamento vero e proprio, restituisce (IP, fonte)
+
+        Returns:
+            (IP, fonte), con fonte "cache" se la risposta viene dalla cache;
+            (None, "cache") se un rilevamento recente è fallito
+        """
+        record_type = 'A' if version == 4 else 'AAAA'
+        fingerprint = interface_fingerprint()
+        cached, ip = self._lookup(record_type, fingerprint)
+        if cached:
+            return ip, "cache"
+        with ExitStack() as stack:
+            # Solo il lock è protetto: un OSError di detect() non deve farlo ripetere
+            try:
+                stack.enter_context(file_lock(self._lock_path(f"ipv{version}")))
+            except OSError:
+                # Lock non disponibile (directory non scrivibile): si rileva senza condividere il risultato
+                return detect()
+            # Mentre si attendeva il lock un altro processo può aver già rilevato l'IP (o fallito)
+            cached, ip = self._lookup(record_type, fingerprint)
+            if cached:
+                return ip, "cache"
+            ip, source = detect()
+            try:
+                self.set(record_type, ip, fingerprint)
+            except OSError:
+                # La cache è solo un'ottimizzazione: un errore di scrittura non è fatale
+                pass
+            return ip, source
 
 
 class PublicIPDetector:
@@ -28,257 +942,2700 @@ class PublicIPDetector:
         "https://ifconfig.me/ip",
     ]
 
-    @staticmethod
-    def get_public_ip() -> Tuple[str, str]:
-        """
-        Rileva l'IP pubblico e determina se è IPv4 o IPv6
+    # Server STUN pubblici (IPv4 e IPv6), usati con stun_servers=STUN_SERVERS
+    STUN_SERVERS = [
+        "stun:stun.l.google.com:19302",
+        "stun:stun.cloudflare.com:3478",
+        "stun:stun1.l.google.com:19302",
+    ]
+
+    REQUEST_TIMEOUT = 5  # Timeout in secondi per ogni servizio
+    STUN_TIMEOUT = 2  # Timeout in secondi per ogni server STUN, ritrasmissioni comprese
+    RACE_DEADLINE = 5  # Tempo massimo in secondi per una gara tra servizi
+
+    def __init__(self, race: bool = False, race_deadline: float = RACE_DEADLINE,
+                 backends: Optional[list] = None, transport: Optional[HTTPTransport] = None,
+                 metrics: Optional[Metrics] = None, stun_servers: Optional[List[str]] = None,
+                 ipv4_services: Optional[List[str]] = None, ipv6_services: Optional[List[str]] = None,
+                 stats: Optional[ServiceStats] = None, quorum: Optional[int] = None,
+                 quorum_size: Optional[int] = None, cache: Optional[DetectionCache] = None):
+        """
+        Args:
+            race: Se True interroga tutti i servizi in parallelo e usa la prima risposta valida
+            race_deadline: Tempo massimo in secondi per ogni gara o votazione (una per famiglia di indirizzi)
+            backends: Rilevatori da consultare, in ordine, prima dei servizi HTTP;
+                ognuno espone detect(version) -> Optional[str]
+            transport: Trasporto HTTP per i servizi (default: create_transport())
+            metrics: Metriche in cui registrare latenza ed esito dei servizi
+            stun_servers: Server STUN (stun:host[:porta]) da interrogare prima dei
+                servizi HTTP di entrambe le famiglie, con la stessa logica di
+                selezione (in ordine o in gara)
+            ipv4_services: Servizi IPv4 aggiuntivi (URL HTTP(S) o stun:), in coda ai predefiniti
+            ipv6_services: Servizi IPv6 aggiuntivi, in coda ai predefiniti
+            stats: Statistiche dei servizi, condivisibili tra più rilevatori
+                (default: solo in memoria per questa istanza)
+            quorum: Se indicato, accetta solo un IP su cui concordano almeno
+                quorum servizi (ha la precedenza su race; non combinabile con backends)
+            quorum_size: Servizi interrogati in parallelo in modalità quorum
+                (default: 2 * quorum - 1, cioè la maggioranza)
+            cache: Cache su disco condivisa con gli altri processi: l'IP
+                rilevato da uno viene riusato dagli altri fino alla scadenza
+
+        Raises:
+            ValueError: se un servizio non è un URL HTTP(S) o un URI STUN valido,
+                se quorum e quorum_size non sono coerenti o se il quorum è
+                richiesto insieme a dei backend
+        """
+        if quorum is not None:
+            quorum_size = quorum_size if quorum_size is not None else 2 * quorum - 1
+            if quorum < 1 or quorum_size < quorum:
+                raise ValueError("Il quorum deve essere almeno 1 e non superiore ai servizi interrogati")
+            # Un backend che risponde renderebbe il quorum inutile senza avvisare
+            if backends:
+                raise ValueError("Il quorum si applica solo ai servizi, non ai backend locali, router o DNS")
+        self.quorum = quorum
+        self.quorum_size = quorum_size
+        self.race = race
+        self.race_deadline = race_deadline
+        self.backends = list(backends or [])
+        for service in (stun_servers or []) + (ipv4_services or []) + (ipv6_services or []):
+            self._check_service(service)
+        if stun_servers:
+            self.IPV4_SERVICES = list(stun_servers) + self.IPV4_SERVICES
+            self.IPV6_SERVICES = list(stun_servers) + self.IPV6_SERVICES
+        if ipv4_services:
+            self.IPV4_SERVICES = self.IPV4_SERVICES + list(ipv4_services)
+        if ipv6_services:
+            self.IPV6_SERVICES = self.IPV6_SERVICES + list(ipv6_services)
+        self.stats = stats if stats is not None else ServiceStats()
+        self.cache = cache
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._transport = transport
+        self._transport_lock = threading.Lock()
+
+    @staticmethod
+    def _check_service(service: str) -> None:
+        """Verifica che un servizio sia un URL HTTP(S) o un URI stun:host[:porta]"""
+        if service.startswith("stun:"):
+            parse_stun_uri(service)
+        elif not service.startswith(("http://", "https://")):
+            raise ValueError(f"Servizio di rilevamento IP non valido: {service}")
+
+    @property
+    def transport(self) -> HTTPTransport:
+        """Trasporto HTTP, creato al primo uso: se rispondono i backend locali non serve"""
+        with self._transport_lock:
+            if self._transport is None:
+                self._transport = create_transport(pool_size=len(self.IPV4_SERVICES) + len(self.IPV6_SERVICES))
+            return self._transport
+
+    def close(self) -> None:
+        """Chiude le connessioni verso i servizi, se il trasporto è stato creato"""
+        with self._transport_lock:
+            if self._transport is not None:
+                self._transport.close()
+
+    def get_public_ip(self) -> Tuple[str, str]:
+        """
+        Rileva l'IP pubblico e determina se è IPv4 o IPv6
+
+        Returns:
+            Tuple[str, str]: (indirizzo_ip, tipo) dove tipo è 'A' per IPv4 o 'AAAA' per IPv6
+        """
+        # Prova prima con IPv4
+        ip = self._detect(self.IPV4_SERVICES, 4)
+        if ip:
+            return ip, 'A'
+
+        # Se IPv4 fallisce, prova con IPv6
+        ip = self._detect(self.IPV6_SERVICES, 6)
+        if ip:
+            return ip, 'AAAA'
+
+        raise RuntimeError("Impossibile rilevare l'indirizzo IP pubblico")
+
+    def get_public_ips(self) -> Dict[str, Optional[str]]:
+        """
+        Rileva in parallelo sia l'IPv4 sia l'IPv6 pubblici (dual-stack)
+
+        Returns:
+            Dict[str, Optional[str]]: {'A': ipv4, 'AAAA': ipv6}, con None per
+            la famiglia che non è stato possibile rilevare
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            ipv4 = executor.submit(self._detect, self.IPV4_SERVICES, 4)
+            ipv6 = executor.submit(self._detect, self.IPV6_SERVICES, 6)
+            return {'A': ipv4.result(), 'AAAA': ipv6.result()}
+
+    def _detect(self, services: list, version: int) -> Optional[str]:
+        """Rileva l'IP della famiglia indicata: prima i backend locali, poi i servizi (STUN e HTTP)"""
+        if self.cache is not None:
+            ip, source = self.cache.get_or_detect(version, lambda: self._detect_source(services, version))
+        else:
+            ip, source = self._detect_source(services, version)
+        self.metrics.inc("ionos_ddns_detections_total", family=f"ipv{version}", source=source or "none")
+        self.stats.save()
+        return ip
+
+    def _detect_source(self, services: list, version: int) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Returns:
+            (IP, fonte che ha risposto: nome del backend o URL del servizio), (None, None) se nessuna
+        """
+        for backend in self.backends:
+            ip = backend.detect(version)
+            if ip:
+                return ip, type(backend).__name__
+
+        services = self._rank_services(services, version)
+        if self.quorum is not None:
+            return self._quorum_services(services, version)
+        if self.race:
+            return self._race_services(services, version)
+        for service in services:
+            ip = self._query_service(service, version)
+            if ip:
+                return ip, service
+        return None, None
+
+    def _rank_services(self, services: list, version: int) -> list:
+        """
+        Ordina i servizi per costo atteso, escludendo quelli con il circuito aperto
+
+        A parità di costo (es. servizi mai interrogati) resta l'ordine configurato.
+        Se tutti i servizi sono sospesi vengono provati comunque: meglio un
+        tentativo in più che nessun rilevamento.
+        """
+        now = time.time()
+        ranked = sorted(services, key=lambda service: self.stats.cost(service, self._timeout(service)))
+        available = [service for service in ranked if not self.stats.is_open(service, now)]
+        if not available:
+            return ranked
+        for service in ranked:
+            if service not in available:
+                self.metrics.inc("ionos_ddns_ip_service_skipped_total", service=service, family=f"ipv{version}")
+        return available
+
+    def _timeout(self, service: str) -> float:
+        """Tempo massimo di attesa di un servizio"""
+        return self.STUN_TIMEOUT if service.startswith("stun:") else self.REQUEST_TIMEOUT
+
+    def _query_service(self, service: str, version: int, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Interroga un singolo servizio
+
+        Args:
+            service: URL HTTP(S) o URI STUN
+            version: Famiglia di indirizzi (4 o 6)
+            timeout: Tempo massimo di attesa (default: quello del tipo di servizio)
+
+        Returns:
+            L'IP restituito se valido per la famiglia indicata (4 o 6), altrimenti None
+        """
+        result, ip = "error", None
+        start = time.monotonic()
+        try:
+            ip = self._fetch(service, version, timeout if timeout is not None else self._timeout(service))
+            if ip is not None:
+                result = "invalid"
+                # Verifica che sia un IP valido della famiglia richiesta
+                if version == 4:
+                    ipaddress.IPv4Address(ip)
+                elif ipaddress.IPv6Address(ip).ipv4_mapped is not None:
+                    # ::ffff:a.b.c.d è un IPv4 visto da un server dual-stack, non un IPv6 pubblicabile
+                    raise ValueError(f"Indirizzo IPv4-mapped: {ip}")
+                result = "ok"
+        except (TransportError, OSError, ValueError):
+            # Ignora errori di rete o IP non validi
+            pass
+        family = f"ipv{version}"
+        elapsed = time.monotonic() - start
+        self.stats.record(service, result == "ok", elapsed)
+        self.metrics.observe("ionos_ddns_ip_service_duration_seconds", elapsed,
+                             service=service, family=family)
+        self.metrics.inc("ionos_ddns_ip_service_requests_total", service=service, family=family, result=result)
+        return ip if result == "ok" else None
+
+    def _fetch(self, service: str, version: int, timeout: float) -> Optional[str]:
+        """
+        Chiede l'indirizzo a un servizio: HTTP(S) o STUN (stun:host[:porta])
+
+        Returns:
+            La risposta del servizio, da validare, o None se non ha risposto
+        """
+        if service.startswith("stun:"):
+            host, port = parse_stun_uri(service)
+            return stun_query(host, port, version, timeout)
+        response = self.transport.request('GET', service, timeout=timeout)
+        return response.text.strip() if response.status_code == 200 else None
+
+    def _race_services(self, services: list, version: int) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Interroga tutti i servizi in parallelo e restituisce il primo IP valido
+
+        Ogni servizio gira in un thread daemon con un timeout che non supera
+        race_deadline. Le richieste perdenti non vengono interrotte quando un
+        servizio vince: terminano al più tardi alla scadenza della gara e le
+        loro risposte vengono solo scartate. I thread rimasti non trattengono
+        l'uscita del processo.
+
+        Returns:
+            (IP, servizio vincitore) o (None, None)
+        """
+        results: "queue.Queue[Tuple[Optional[str], str]]" = queue.Queue()
+        deadline = time.monotonic() + self.race_deadline
+        for service in services:
+            self._start_query(service, version, deadline, results)
+
+        for _ in services:
+            answer = self._next_answer(results, deadline)
+            if answer is None:
+                break
+            ip, service = answer
+            if ip:
+                return ip, service
+        return None, None
+
+    def _start_query(self, service: str, version: int, deadline: float,
+                     results: "queue.Queue[Tuple[Optional[str], str]]") -> None:
+        """
+        Interroga un servizio in un thread daemon, senza superare deadline
+
+        La coppia (IP o None, servizio) viene messa in results; le statistiche
+        del servizio sono registrate da _query_service.
+        """
+        def worker() -> None:
+            timeout = min(self._timeout(service), max(deadline - time.monotonic(), 0.0))
+            results.put((self._query_service(service, version, timeout), service))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    @staticmethod
+    def _next_answer(results: "queue.Queue[Tuple[Optional[str], str]]",
+                     deadline: float) -> Optional[Tuple[Optional[str], str]]:
+        """Prossima risposta arrivata in results, o None se scade deadline"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        try:
+            return results.get(timeout=remaining)
+        except queue.Empty:
+            return None
+
+    def _quorum_services(self, services: list, version: int) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Interroga quorum_size servizi in parallelo e accetta l'IP su cui ne concordano almeno quorum
+
+        Si restituisce appena un indirizzo raggiunge il quorum, senza attendere
+        le altre risposte. Se per errori o risposte discordanti il quorum non è
+        più raggiungibile con i servizi in volo, si interrogano i successivi
+        della lista. Le risposte diverse dall'IP scelto vengono segnalate: un
+        servizio anomalo (proxy, risposta errata) non porta a scrivere un IP
+        sbagliato che l'esecuzione successiva dovrebbe correggere. Come nella
+        gara, le richieste ancora in volo terminano entro race_deadline e le
+        loro risposte vengono scartate.
+
+        Returns:
+            (IP, "quorum") o (None, None) se nessun IP raggiunge il quorum entro race_deadline
+        """
+        results: "queue.Queue[Tuple[Optional[str], str]]" = queue.Queue()
+        deadline = time.monotonic() + self.race_deadline
+        pending = iter(services)
+
+        def start_next() -> bool:
+            service = next(pending, None)
+            if service is None:
+                return False
+            self._start_query(service, version, deadline, results)
+            return True
+
+        in_flight = sum(start_next() for _ in range(self.quorum_size))
+        votes: Dict[str, List[str]] = {}
+        while True:
+            best = max((len(voters) for voters in votes.values()), default=0)
+            while best + in_flight < self.quorum and start_next():
+                in_flight += 1
+            if best + in_flight < self.quorum:
+                break
+            answer = self._next_answer(results, deadline)
+            if answer is None:
+                break
+            in_flight -= 1
+            ip, service = answer
+            if not ip:
+                continue
+            ip = str(ipaddress.ip_address(ip))
+            votes.setdefault(ip, []).append(service)
+            if len(votes[ip]) >= self.quorum:
+                self._report_dissent(votes, ip, version)
+                return ip, "quorum"
+        self._report_dissent(votes, None, version)
+        return None, None
+
+    def _report_dissent(self, votes: Dict[str, List[str]], winner: Optional[str], version: int) -> None:
+        """Segnala i servizi che hanno risposto con un IP diverso da quello scelto (o tutti, senza quorum)"""
+        if winner is None and votes:
+            answers = ", ".join(f"{ip} da {', '.join(voters)}" for ip, voters in votes.items())
+            print(f"ATTENZIONE: quorum di {self.quorum} servizi non raggiunto per IPv{version}: {answers}")
+        for ip, voters in votes.items():
+            if ip == winner:
+                continue
+            for service in voters:
+                self.metrics.inc("ionos_ddns_ip_service_dissents_total", service=service, family=f"ipv{version}")
+                if winner is not None:
+                    print(f"ATTENZIONE: {service} ha risposto {ip}, diverso da {winner} scelto dal quorum")
+
+
+# Costanti netlink (linux/netlink.h, linux/rtnetlink.h, linux/if_addr.h)
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x01
+NLM_F_DUMP = 0x300
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+IFA_FLAGS = 8
+RT_SCOPE_UNIVERSE = 0
+
+_NLMSGHDR = struct.Struct("=IHHII")
+_IFADDRMSG = struct.Struct("=BBBBI")
+_RTATTR = struct.Struct("=HH")
+
+
+class InterfaceAddress(NamedTuple):
+    """Indirizzo assegnato a un'interfaccia locale"""
+    ifname: str
+    address: str
+    prefixlen: int
+    scope: int
+    flags: int
+
+
+def _netlink_align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def parse_netlink_addresses(data: bytes) -> Iterator[Tuple[int, InterfaceAddress]]:
+    """
+    Decodifica i messaggi RTM_NEWADDR/RTM_DELADDR contenuti in un buffer netlink
+
+    Yields:
+        (tipo messaggio, indirizzo) per ogni messaggio di indirizzo; gli altri
+        messaggi (NLMSG_DONE, errori, ...) vengono ignorati
+    """
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        msg_len, msg_type, _, _, _ = _NLMSGHDR.unpack_from(data, offset)
+        if msg_len < _NLMSGHDR.size:
+            break
+        end = offset + msg_len
+        if msg_type in (RTM_NEWADDR, RTM_DELADDR):
+            body = offset + _NLMSGHDR.size
+            family, prefixlen, flags, scope, index = _IFADDRMSG.unpack_from(data, body)
+            attrs = {}
+            attr_offset = body + _IFADDRMSG.size
+            while attr_offset + _RTATTR.size <= end:
+                attr_len, attr_type = _RTATTR.unpack_from(data, attr_offset)
+                if attr_len < _RTATTR.size:
+                    break
+                attrs[attr_type] = data[attr_offset + _RTATTR.size:attr_offset + attr_len]
+                attr_offset += _netlink_align(attr_len)
+
+            # Sulle interfacce punto-punto (es. PPPoE) IFA_ADDRESS è il peer, IFA_LOCAL l'indirizzo locale
+            raw = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)
+            if raw and family in (socket.AF_INET, socket.AF_INET6):
+                if IFA_FLAGS in attrs:
+                    flags = struct.unpack("=I", attrs[IFA_FLAGS][:4])[0]
+                if IFA_LABEL in attrs:
+                    ifname = attrs[IFA_LABEL].split(b"\0", 1)[0].decode(errors='replace')
+                else:
+                    try:
+                        ifname = socket.if_indextoname(index)
+                    except OSError:
+                        ifname = str(index)
+                yield msg_type, InterfaceAddress(
+                    ifname, socket.inet_ntop(family, raw), prefixlen, scope, flags
+                )
+        offset += _netlink_align(msg_len)
+
+
+def netlink_dump_addresses(family: int, timeout: float = 1.0) -> List[InterfaceAddress]:
+    """
+    Elenca gli indirizzi della famiglia indicata tramite una richiesta RTM_GETADDR
+
+    Raises:
+        OSError: se netlink non è disponibile (sistemi non Linux, sandbox)
+    """
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE) as sock:
+        sock.settimeout(timeout)
+        sock.bind((0, 0))
+        request = _NLMSGHDR.pack(_NLMSGHDR.size + _IFADDRMSG.size, RTM_GETADDR,
+                                 NLM_F_REQUEST | NLM_F_DUMP, 1, 0)
+        request += _IFADDRMSG.pack(family, 0, 0, 0, 0)
+        sock.send(request)
+
+        addresses = []
+        while True:
+            data = sock.recv(65536)
+            addresses.extend(address for _, address in parse_netlink_addresses(data))
+            # La risposta al dump termina con NLMSG_DONE (o un errore)
+            offset = 0
+            while offset + _NLMSGHDR.size <= len(data):
+                msg_len, msg_type, _, _, _ = _NLMSGHDR.unpack_from(data, offset)
+                if msg_type in (NLMSG_DONE, NLMSG_ERROR):
+                    return addresses
+                if msg_len < _NLMSGHDR.size:
+                    return addresses
+                offset += _netlink_align(msg_len)
+
+
+def interface_fingerprint() -> Optional[str]:
+    """
+    Impronta degli indirizzi assegnati alle interfacce locali
+
+    Cambia quando la macchina cambia rete o riceve nuovi indirizzi; gli
+    indirizzi IPv6 temporanei, che ruotano da soli, vengono ignorati.
+
+    Returns:
+        Digest esadecimale o None se gli indirizzi non sono leggibili (netlink assente)
+    """
+    import hashlib
+    excluded = LocalInterfaceDetector.IFA_F_TEMPORARY | LocalInterfaceDetector.IFA_F_TENTATIVE
+    try:
+        # I flag IPv6 valgono solo per AF_INET6: per IPv4 0x01 è IFA_F_SECONDARY
+        entries = netlink_dump_addresses(socket.AF_INET) + [
+            entry for entry in netlink_dump_addresses(socket.AF_INET6) if not entry.flags & excluded]
+    except OSError:
+        return None
+    addresses = sorted(f"{entry.ifname}/{entry.address}/{entry.prefixlen}" for entry in entries)
+    return hashlib.sha256("\n".join(addresses).encode()).hexdigest()
+
+
+class LocalInterfaceDetector:
+    """
+    Rileva l'IP pubblico tra gli indirizzi assegnati alle interfacce locali
+
+    Utile con IPv6 o quando l'IPv4 pubblico è configurato direttamente su
+    un'interfaccia (es. PPPoE): nessuna richiesta HTTP, solo una lettura dal
+    kernel via netlink (con /proc/net/if_inet6 come alternativa per IPv6).
+    Vengono considerati solo indirizzi globali, escludendo quelli temporanei
+    (privacy extensions), deprecati o non ancora validati dal DAD.
+    """
+
+    IF_INET6_PATH = "/proc/net/if_inet6"
+
+    # Flag IFA_F_* degli indirizzi IPv6 da non pubblicare (per IPv4 0x01 è IFA_F_SECONDARY)
+    IFA_F_TEMPORARY = 0x01
+    IFA_F_DADFAILED = 0x08
+    IFA_F_DEPRECATED = 0x20
+    IFA_F_TENTATIVE = 0x40
+    EXCLUDED_FLAGS = IFA_F_TEMPORARY | IFA_F_DADFAILED | IFA_F_DEPRECATED | IFA_F_TENTATIVE
+
+    def __init__(self, interfaces: Optional[List[str]] = None, prefixes: Optional[List[str]] = None):
+        """
+        Args:
+            interfaces: Nomi di interfaccia ammessi (anche con caratteri jolly, es. ppp*)
+            prefixes: Reti ammesse in notazione CIDR (es. 2001:db8::/32)
+        """
+        self.interfaces = list(interfaces or [])
+        self.prefixes = [ipaddress.ip_network(prefix, strict=False) for prefix in (prefixes or [])]
+
+    def detect(self, version: int) -> Optional[str]:
+        """Restituisce il primo indirizzo pubblico locale della famiglia indicata (4 o 6)"""
+        addresses = self.addresses(version)
+        return addresses[0] if addresses else None
+
+    def addresses(self, version: int) -> List[str]:
+        """Elenca gli indirizzi pubblici locali della famiglia indicata che passano i filtri"""
+        family = socket.AF_INET if version == 4 else socket.AF_INET6
+        try:
+            entries = netlink_dump_addresses(family)
+        except OSError:
+            entries = self._read_if_inet6() if version == 6 else []
+        return [entry.address for entry in entries if self.accepts(entry)]
+
+    def accepts(self, entry: InterfaceAddress) -> bool:
+        """Verifica se un indirizzo di interfaccia è pubblicabile secondo i filtri"""
+        if entry.scope != RT_SCOPE_UNIVERSE:
+            return False
+        try:
+            address = ipaddress.ip_address(entry.address)
+        except ValueError:
+            return False
+        if not address.is_global or (address.version == 6 and entry.flags & self.EXCLUDED_FLAGS):
+            return False
+        if self.interfaces and not any(fnmatch.fnmatchcase(entry.ifname, pattern)
+                                       for pattern in self.interfaces):
+            return False
+        if self.prefixes and not any(address.version == network.version and address in network
+                                     for network in self.prefixes):
+            return False
+        return True
+
+    def _read_if_inet6(self) -> List[InterfaceAddress]:
+        """Legge gli indirizzi IPv6 da /proc/net/if_inet6"""
+        entries = []
+        try:
+            with open(self.IF_INET6_PATH, 'r') as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 6:
+                        continue
+                    raw, _, prefixlen, scope, flags, ifname = fields[:6]
+                    address = str(ipaddress.IPv6Address(bytes.fromhex(raw)))
+                    entries.append(InterfaceAddress(ifname, address, int(prefixlen, 16),
+                                                    int(scope, 16), int(flags, 16)))
+        except (OSError, ValueError):
+            pass
+        return entries
+
+
+# Tipi di record DNS (RFC 1035, RFC 3596) e classe Internet
+DNS_TYPES = {'A': 1, 'AAAA': 28, 'TXT': 16}
+DNS_CLASS_IN = 1
+DNS_FLAG_QR = 0x8000  # Messaggio di risposta
+DNS_FLAG_TC = 0x0200  # Risposta troncata
+DNS_FLAG_RD = 0x0100  # Ricorsione richiesta
+
+_DNS_HEADER = struct.Struct("!HHHHHH")
+_DNS_QUESTION = struct.Struct("!HH")
+_DNS_RR = struct.Struct("!HHIH")
+
+
+def build_dns_query(name: str, record_type: str, query_id: int) -> bytes:
+    """
+    Costruisce una richiesta DNS con una sola domanda (classe IN, ricorsione richiesta)
+
+    Raises:
+        ValueError: se il nome non è valido
+    """
+    qname = b""
+    for label in name.rstrip('.').split('.'):
+        encoded = label.encode('ascii')
+        if not 0 < len(encoded) < 64:
+            raise ValueError(f"Nome DNS non valido: {name}")
+        qname += bytes([len(encoded)]) + encoded
+    header = _DNS_HEADER.pack(query_id, DNS_FLAG_RD, 1, 0, 0, 0)
+    return header + qname + b"\0" + _DNS_QUESTION.pack(DNS_TYPES[record_type], DNS_CLASS_IN)
+
+
+def _skip_dns_name(data: bytes, offset: int) -> int:
+    """Restituisce la posizione successiva a un nome DNS (etichette o puntatore di compressione)"""
+    while True:
+        if offset >= len(data):
+            raise ValueError("Risposta DNS troncata")
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        if length == 0:
+            return offset + 1
+        offset += 1 + length
+
+
+def parse_dns_response(data: bytes) -> List[Tuple[int, bytes]]:
+    """
+    Estrae le risposte da un messaggio DNS
+
+    Returns:
+        Lista di (tipo record, rdata) della sezione answer
+
+    Raises:
+        ValueError: se il messaggio non è una risposta valida o riporta un errore (rcode)
+    """
+    if len(data) < _DNS_HEADER.size:
+        raise ValueError("Risposta DNS troncata")
+    _, flags, questions, answers, _, _ = _DNS_HEADER.unpack_from(data)
+    if not flags & DNS_FLAG_QR:
+        raise ValueError("Il messaggio DNS non è una risposta")
+    if flags & DNS_FLAG_TC:
+        raise ValueError("Risposta DNS troncata dal server")
+    if flags & 0x000F:
+        raise ValueError(f"Errore DNS (rcode {flags & 0x000F})")
+
+    offset = _DNS_HEADER.size
+    for _ in range(questions):
+        offset = _skip_dns_name(data, offset) + _DNS_QUESTION.size
+    records = []
+    for _ in range(answers):
+        offset = _skip_dns_name(data, offset)
+        if offset + _DNS_RR.size > len(data):
+            raise ValueError("Risposta DNS troncata")
+        record_type, _, _, length = _DNS_RR.unpack_from(data, offset)
+        offset += _DNS_RR.size
+        rdata = data[offset:offset + length]
+        if len(rdata) != length:
+            raise ValueError("Risposta DNS troncata")
+        offset += length
+        records.append((record_type, rdata))
+    return records
+
+
+class DNSDetector:
+    """
+    Rileva l'IP pubblico con una singola query DNS su UDP
+
+    Alcuni server DNS rispondono con l'indirizzo da cui ricevono la query:
+    i resolver di OpenDNS risolvono myip.opendns.com (A/AAAA) e i server
+    autoritativi di Google rispondono a o-o.myaddr.l.google.com con un
+    record TXT. Basta un pacchetto UDP per famiglia, senza TCP, TLS né
+    HTTP. L'indirizzo restituito è quello della famiglia usata per
+    raggiungere il resolver, per questo ogni famiglia ha il suo resolver.
+    """
+
+    # Provider predefiniti: (resolver per famiglia, nome da interrogare, tipo di record)
+    # Con tipo None si chiede A su IPv4 e AAAA su IPv6
+    PROVIDERS = {
+        "opendns": ({4: "208.67.222.222", 6: "2620:119:35::35"}, "myip.opendns.com", None),
+        "google": ({4: "216.239.32.10", 6: "2001:4860:4802:32::a"}, "o-o.myaddr.l.google.com", "TXT"),
+    }
+    DEFAULT_PROVIDER = "opendns"
+    PORT = 53
+    TIMEOUT = 2  # Secondi di attesa della risposta per ogni tentativo
+    RETRIES = 2  # Tentativi aggiuntivi dopo un timeout
+    MAX_RESPONSE = 4096  # Byte letti al massimo da una risposta
+
+    def __init__(self, provider: str = DEFAULT_PROVIDER, resolvers: Optional[List[str]] = None,
+                 query_name: Optional[str] = None, record_type: Optional[str] = None,
+                 port: int = PORT, timeout: float = TIMEOUT, retries: int = RETRIES):
+        """
+        Args:
+            provider: Provider predefinito (chiave di PROVIDERS)
+            resolvers: Indirizzi IP dei resolver da usare al posto di quelli del
+                provider; la famiglia di ognuno determina quella che rileva
+            query_name: Nome da interrogare al posto di quello del provider
+            record_type: 'A', 'AAAA' o 'TXT' al posto di quello del provider
+            port: Porta UDP dei resolver
+            timeout: Secondi di attesa della risposta per ogni tentativo
+            retries: Tentativi aggiuntivi dopo un timeout
+
+        Raises:
+            ValueError: se provider, resolver o tipo di record non sono validi
+        """
+        if provider not in self.PROVIDERS:
+            raise ValueError(f"Provider DNS sconosciuto: {provider}")
+        default_resolvers, default_name, default_type = self.PROVIDERS[provider]
+        self.resolvers: Dict[int, str] = dict(default_resolvers)
+        for resolver in resolvers or []:
+            address = ipaddress.ip_address(resolver)
+            self.resolvers[address.version] = str(address)
+        self.query_name = query_name or default_name
+        self.record_type = record_type or default_type
+        if self.record_type is not None and self.record_type not in DNS_TYPES:
+            raise ValueError(f"Tipo di record DNS non supportato: {self.record_type}")
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+
+    def detect(self, version: int) -> Optional[str]:
+        """Interroga il resolver della famiglia indicata (4 o 6) e restituisce l'IP se valido"""
+        resolver = self.resolvers.get(version)
+        if not resolver:
+            return None
+        record_type = self.record_type or ('A' if version == 4 else 'AAAA')
+        for _ in range(self.retries + 1):
+            try:
+                return self._query(resolver, version, record_type)
+            except socket.timeout:
+                # Pacchetto perso: si ritenta
+                continue
+            except (OSError, ValueError):
+                # Rete non raggiungibile, porta chiusa o risposta non valida
+                return None
+        return None
+
+    def _query(self, resolver: str, version: int, record_type: str) -> Optional[str]:
+        """
+        Invia una query e attende la risposta corrispondente
+
+        Il socket è connesso al resolver, quindi il kernel scarta i pacchetti
+        da altri indirizzi; le risposte con un ID diverso vengono ignorate.
+        """
+        family = socket.AF_INET if version == 4 else socket.AF_INET6
+        query = build_dns_query(self.query_name, record_type, random.getrandbits(16))
+        with socket.socket(family, socket.SOCK_DGRAM) as sock:
+            sock.connect((resolver, self.port))
+            sock.send(query)
+            deadline = time.monotonic() + self.timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout("Nessuna risposta dal resolver DNS")
+                sock.settimeout(remaining)
+                data = sock.recv(self.MAX_RESPONSE)
+                if data[:2] == query[:2]:
+                    return self._extract_ip(parse_dns_response(data), version)
+
+    @staticmethod
+    def _extract_ip(records: List[Tuple[int, bytes]], version: int) -> Optional[str]:
+        """Restituisce il primo indirizzo della famiglia indicata tra record A, AAAA e TXT"""
+        for record_type, rdata in records:
+            if record_type == DNS_TYPES['A'] and len(rdata) == 4:
+                candidates = [socket.inet_ntop(socket.AF_INET, rdata)]
+            elif record_type == DNS_TYPES['AAAA'] and len(rdata) == 16:
+                candidates = [socket.inet_ntop(socket.AF_INET6, rdata)]
+            elif record_type == DNS_TYPES['TXT']:
+                # Sequenza di stringhe precedute dalla lunghezza
+                candidates, offset = [], 0
+                while offset < len(rdata):
+                    length = rdata[offset]
+                    candidates.append(rdata[offset + 1:offset + 1 + length].decode('ascii', 'replace').strip())
+                    offset += 1 + length
+            else:
+                continue
+            for candidate in candidates:
+                try:
+                    address = ipaddress.ip_address(candidate)
+                except ValueError:
+                    # Es. "edns0-client-subnet ..." nelle risposte TXT di Google
+                    continue
+                if address.version == version:
+                    return str(address)
+        return None
+
+
+def parse_ssdp_response(data: bytes) -> Dict[str, str]:
+    """
+    Legge gli header di una risposta SSDP (HTTP su UDP) a una M-SEARCH
+
+    Returns:
+        Header con nome in minuscolo
+
+    Raises:
+        ValueError: se il messaggio non è una risposta 200 OK
+    """
+    lines = data.decode('latin-1').split('\r\n')
+    status = lines[0].split(None, 2)
+    if len(status) < 2 or not status[0].startswith('HTTP/') or status[1] != '200':
+        raise ValueError("Risposta SSDP non valida")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+def _xml_local_name(tag: str) -> str:
+    """Nome di un elemento XML senza namespace"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _parse_xml(data: bytes):
+    """
+    Legge un documento XML
+
+    Raises:
+        ValueError: se il documento non è valido
+    """
+    import xml.etree.ElementTree as ElementTree
+    try:
+        return ElementTree.fromstring(data)
+    except ElementTree.ParseError as e:
+        raise ValueError(f"XML non valido: {e}") from None
+
+
+def find_wan_service(description: bytes, location: str,
+                     service_types: Iterable[str]) -> Optional[Tuple[str, str]]:
+    """
+    Cerca un servizio WAN nella descrizione di un dispositivo UPnP
+
+    Args:
+        description: XML della descrizione del dispositivo
+        location: URL da cui è stata letta (base per gli URL relativi)
+        service_types: Tipi di servizio accettati, in ordine di preferenza
+
+    Returns:
+        (URL di controllo assoluto, tipo di servizio) o None se assente
+
+    Raises:
+        ValueError: se la descrizione non è XML valido
+    """
+    from urllib.parse import urljoin
+    root = _parse_xml(description)
+    base = location
+    services = {}
+    for element in root.iter():
+        name = _xml_local_name(element.tag)
+        if name == 'URLBase' and element.text:
+            base = element.text.strip()
+        elif name == 'service':
+            fields = {_xml_local_name(child.tag): (child.text or '').strip() for child in element}
+            if fields.get('serviceType') and fields.get('controlURL'):
+                services.setdefault(fields['serviceType'], fields['controlURL'])
+    for service_type in service_types:
+        if service_type in services:
+            return urljoin(base, services[service_type]), service_type
+    return None
+
+
+def parse_natpmp_response(data: bytes) -> str:
+    """
+    Estrae l'indirizzo esterno da una risposta NAT-PMP (RFC 6886, opcode 0)
+
+    Raises:
+        ValueError: se la risposta è troncata, di altro tipo o con errore
+    """
+    if len(data) < 12:
+        raise ValueError("Risposta NAT-PMP troncata")
+    version, opcode, result, _, address = struct.unpack_from("!BBHI4s", data)
+    if version != 0 or opcode != 128:
+        raise ValueError("Risposta NAT-PMP inattesa")
+    if result != 0:
+        raise ValueError(f"Errore NAT-PMP {result}")
+    return socket.inet_ntoa(address)
+
+
+def default_gateway(route_path: str = "/proc/net/route") -> Optional[str]:
+    """Restituisce il gateway IPv4 della rotta predefinita, letto dalla tabella del kernel"""
+    RTF_UP, RTF_GATEWAY = 0x1, 0x2
+    try:
+        with open(route_path, 'r') as f:
+            next(f, None)  # Intestazione
+            for line in f:
+                fields = line.split()
+                if len(fields) < 4 or fields[1] != '00000000':
+                    continue
+                flags = int(fields[3], 16)
+                if flags & RTF_UP and flags & RTF_GATEWAY:
+                    # Indirizzo in esadecimale nell'ordine dei byte della macchina
+                    return socket.inet_ntoa(struct.pack("=I", int(fields[2], 16)))
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class RouterDetector:
+    """
+    Rileva l'IP pubblico chiedendolo al router della rete locale
+
+    Il router conosce già l'indirizzo WAN: una richiesta sulla LAN costa
+    circa un millisecondo, contro le centinaia di un servizio esterno.
+    Si prova UPnP IGD (azione GetExternalIPAddress del servizio
+    WANIPConnection/WANPPPConnection trovato con SSDP) e poi NAT-PMP verso
+    il gateway predefinito. Il metodo che ha funzionato, con l'URL di
+    controllo UPnP, viene salvato in cache_file: le esecuzioni successive
+    evitano la ricerca SSDP e la lettura della descrizione del dispositivo.
+
+    Solo IPv4: con IPv6 non c'è NAT a cui chiedere. Un indirizzo WAN non
+    pubblico (doppio NAT, CGNAT) viene scartato, così si passa ai servizi esterni.
+    """
+
+    SSDP_ADDRESS = ("239.255.255.250", 1900)
+    SSDP_SEARCH_TARGET = "urn:schemas-upnp-org:device:InternetGatewayDevice:1"
+    # Servizi IGD che espongono GetExternalIPAddress, in ordine di preferenza
+    WAN_SERVICES = [
+        "urn:schemas-upnp-org:service:WANIPConnection:2",
+        "urn:schemas-upnp-org:service:WANIPConnection:1",
+        "urn:schemas-upnp-org:service:WANPPPConnection:1",
+    ]
+    NATPMP_PORT = 5351
+    NATPMP_RTO = 0.25  # Attesa in secondi prima della prima ritrasmissione (RFC 6886)
+    METHODS = ("upnp", "natpmp")
+    DISCOVERY_TIMEOUT = 1.0  # Secondi di attesa delle risposte SSDP
+    TIMEOUT = 2  # Secondi per ogni richiesta HTTP al router o scambio NAT-PMP
+
+    def __init__(self, methods: Iterable[str] = METHODS, cache_file: Optional[Path] = None,
+                 gateway: Optional[str] = None, ssdp_address: Tuple[str, int] = SSDP_ADDRESS,
+                 natpmp_port: int = NATPMP_PORT, discovery_timeout: float = DISCOVERY_TIMEOUT,
+                 timeout: float = TIMEOUT, transport: Optional[HTTPTransport] = None):
+        """
+        Args:
+            methods: Protocolli da provare, in ordine ('upnp', 'natpmp')
+            cache_file: File in cui ricordare tra un'esecuzione e l'altra il
+                metodo che ha funzionato e l'URL di controllo UPnP (opzionale)
+            gateway: Indirizzo del router per NAT-PMP (default: gateway predefinito)
+            ssdp_address: Destinazione delle ricerche SSDP
+            natpmp_port: Porta UDP NAT-PMP del router
+            discovery_timeout: Secondi di attesa delle risposte SSDP
+            timeout: Secondi per ogni richiesta HTTP al router o scambio NAT-PMP
+            transport: Trasporto HTTP per UPnP (default: create_transport())
+
+        Raises:
+            ValueError: se un metodo non è supportato
+        """
+        self.methods = list(methods)
+        unknown = [method for method in self.methods if method not in self.METHODS]
+        if unknown:
+            raise ValueError(f"Metodo di rilevamento dal router sconosciuto: {', '.join(unknown)}")
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.gateway = gateway
+        self.ssdp_address = ssdp_address
+        self.natpmp_port = natpmp_port
+        self.discovery_timeout = discovery_timeout
+        self.timeout = timeout
+        self._transport = transport
+        # Router trovato: {"method": "upnp", "control_url", "service_type"} o {"method": "natpmp", "gateway"}
+        self._router: Optional[Dict[str, str]] = None
+        self._cache_loaded = False
+
+    @property
+    def transport(self) -> HTTPTransport:
+        """Trasporto HTTP, creato al primo uso: con NAT-PMP non serve"""
+        if self._transport is None:
+            self._transport = create_transport(pool_size=1)
+        return self._transport
+
+    def detect(self, version: int) -> Optional[str]:
+        """Chiede al router l'indirizzo WAN (solo IPv4) e lo restituisce se pubblico"""
+        if version != 4:
+            return None
+        known = self._known_router()
+        if known is not None:
+            ip = self._ask(known)
+            if ip:
+                return ip
+        # Router sconosciuto o non più raggiungibile all'indirizzo salvato: nuova ricerca
+        for method in self.methods:
+            router = self._discover(method)
+            if router is None or router == known:
+                continue
+            ip = self._ask(router)
+            if ip:
+                self._remember(router)
+                return ip
+        return None
+
+    def _known_router(self) -> Optional[Dict[str, str]]:
+        """Router trovato in precedenza, da questa istanza o da cache_file"""
+        if not self._cache_loaded and self.cache_file:
+            self._cache_loaded = True
+            try:
+                with open(self.cache_file, 'r') as f:
+                    router = json.load(f)
+                if isinstance(router, dict) and router.get('method') in self.methods:
+                    self._router = router
+            except (OSError, ValueError):
+                # Cache assente o corrotta: si cerca di nuovo il router
+                pass
+        return self._router
+
+    def _remember(self, router: Dict[str, str]) -> None:
+        """Salva il router trovato in memoria e, se configurato, su cache_file"""
+        self._router = router
+        if self.cache_file:
+            try:
+                write_json_atomic(self.cache_file, router)
+            except OSError:
+                # La cache è solo un'ottimizzazione: un errore di scrittura non è fatale
+                pass
+
+    def _discover(self, method: str) -> Optional[Dict[str, str]]:
+        """Cerca il router con il metodo indicato"""
+        if method == "natpmp":
+            gateway = self.gateway or default_gateway()
+            return {"method": "natpmp", "gateway": gateway} if gateway else None
+        try:
+            location = self._ssdp_search()
+            if location is None:
+                return None
+            response = self.transport.request('GET', location, timeout=self.timeout)
+            if response.status_code != 200:
+                return None
+            service = find_wan_service(response.content, location, self.WAN_SERVICES)
+        except (TransportError, OSError, ValueError):
+            return None
+        if service is None:
+            return None
+        control_url, service_type = service
+        return {"method": "upnp", "control_url": control_url, "service_type": service_type}
+
+    def _ssdp_search(self) -> Optional[str]:
+        """
+        Cerca un Internet Gateway Device con una M-SEARCH SSDP
+
+        Returns:
+            L'URL della descrizione del primo dispositivo che risponde, o None
+        """
+        host, port = self.ssdp_address
+        search = (
+            "M-SEARCH * HTTP/1.1\r\n"
+            f"HOST: {host}:{port}\r\n"
+            'MAN: "ssdp:discover"\r\n'
+            f"MX: {max(1, int(self.discovery_timeout))}\r\n"
+            f"ST: {self.SSDP_SEARCH_TARGET}\r\n"
+            "\r\n"
+        ).encode()
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+            # Due copie: su UDP la prima può andare persa
+            for _ in range(2):
+                sock.sendto(search, self.ssdp_address)
+            deadline = time.monotonic() + self.discovery_timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                sock.settimeout(remaining)
+                try:
+                    data = sock.recv(2048)
+                except socket.timeout:
+                    return None
+                try:
+                    location = parse_ssdp_response(data).get('location')
+                except ValueError:
+                    continue
+                if location:
+                    return location
+
+    def _ask(self, router: Dict[str, str]) -> Optional[str]:
+        """Chiede l'indirizzo WAN al router indicato; None se non risponde o non è pubblico"""
+        try:
+            if router.get("method") == "upnp":
+                ip = self._get_external_ip(router["control_url"], router["service_type"])
+            else:
+                ip = self._natpmp_external_ip(router["gateway"])
+            address = ipaddress.IPv4Address(ip)
+        except (TransportError, OSError, ValueError, KeyError, TypeError):
+            return None
+        return str(address) if address.is_global else None
+
+    def _get_external_ip(self, control_url: str, service_type: str) -> Optional[str]:
+        """Esegue l'azione SOAP GetExternalIPAddress sul servizio WAN"""
+        body = (
+            '<?xml version="1.0"?>'
+            '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" '
+            's:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
+            f'<s:Body><u:GetExternalIPAddress xmlns:u="{service_type}"/></s:Body>'
+            '</s:Envelope>'
+        ).encode()
+        headers = {
+            "Content-Type": 'text/xml; charset="utf-8"',
+            "SOAPAction": f'"{service_type}#GetExternalIPAddress"',
+        }
+        response = self.transport.request('POST', control_url, headers=headers, data=body,
+                                          timeout=self.timeout)
+        if response.status_code != 200:
+            return None
+        for element in _parse_xml(response.content).iter():
+            if _xml_local_name(element.tag) == 'NewExternalIPAddress':
+                return (element.text or '').strip()
+        return None
+
+    def _natpmp_external_ip(self, gateway: str) -> Optional[str]:
+        """Chiede l'indirizzo esterno al gateway con NAT-PMP, ritrasmettendo come da RFC 6886"""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect((gateway, self.natpmp_port))
+            data = _udp_exchange(sock, b"\x00\x00", lambda data: data[:2] == b"\x00\x80",
+                                 self.timeout, self.NATPMP_RTO)
+        return parse_natpmp_response(data) if data is not None else None
+
+
+class AddressWatcher:
+    """
+    Notifica le variazioni degli indirizzi locali ascoltando netlink
+
+    Si iscrive ai gruppi multicast RTM_NEWADDR/RTM_DELADDR del kernel e
+    chiama on_change quando cambia un indirizzo rilevante (secondo i filtri
+    di LocalInterfaceDetector). Gli eventi ravvicinati, tipici di una
+    riconnessione PPPoE o di un rinnovo SLAAC, vengono raggruppati: la
+    notifica parte solo dopo debounce secondi senza nuovi eventi.
+    """
+
+    DEFAULT_DEBOUNCE = 2  # Secondi di quiete prima di notificare una variazione
+    POLL_TIMEOUT = 1  # Secondi massimi di attesa su recv, per reagire a stop()
+
+    def __init__(self, on_change: Callable[[], None],
+                 detector: Optional[LocalInterfaceDetector] = None,
+                 debounce: float = DEFAULT_DEBOUNCE, sock=None):
+        """
+        Args:
+            on_change: Funzione chiamata dopo una variazione rilevante degli indirizzi
+            detector: Filtri per decidere quali indirizzi sono rilevanti
+            debounce: Secondi di quiete prima di chiamare on_change
+            sock: Socket netlink già aperto (iniettabile nei test)
+        """
+        self.on_change = on_change
+        self.detector = detector if detector is not None else LocalInterfaceDetector()
+        self.debounce = debounce
+        self.sock = sock
+        self._stop = threading.Event()
+
+    @staticmethod
+    def open_socket():
+        """Apre un socket netlink iscritto alle variazioni degli indirizzi IPv4 e IPv6"""
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        sock.bind((0, RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+        return sock
+
+    def is_relevant(self, data: bytes) -> bool:
+        """Verifica se un buffer netlink contiene variazioni di indirizzi pubblicabili"""
+        return any(self.detector.accepts(address) for _, address in parse_netlink_addresses(data))
+
+    def stop(self) -> None:
+        """Richiede la terminazione del ciclo di ascolto"""
+        self._stop.set()
+
+    def start(self) -> threading.Thread:
+        """Avvia l'ascolto in un thread daemon"""
+        if self.sock is None:
+            self.sock = self.open_socket()
+        thread = threading.Thread(target=self.run, name="address-watcher", daemon=True)
+        thread.start()
+        return thread
+
+    def run(self) -> None:
+        """Ciclo di ascolto degli eventi netlink, termina dopo stop()"""
+        if self.sock is None:
+            self.sock = self.open_socket()
+        pending = False
+        try:
+            while not self._stop.is_set():
+                self.sock.settimeout(self.debounce if pending else self.POLL_TIMEOUT)
+                try:
+                    data = self.sock.recv(65536)
+                except socket.timeout:
+                    if pending:
+                        pending = False
+                        self.on_change()
+                    continue
+                except OSError:
+                    # Es. ENOBUFS: il kernel ha scartato eventi, meglio ricontrollare
+                    pending = True
+                    continue
+                if self.is_relevant(data):
+                    pending = True
+        finally:
+            self.sock.close()
+
+
+class RateLimiter:
+    """
+    Limitatore di richieste a token bucket, condiviso tra thread
+
+    Ogni richiesta consuma un token; i token si ricaricano a `rate` al
+    secondo fino a `burst`. pause() sospende tutte le richieste, ad esempio
+    per rispettare il Retry-After di una risposta 429.
+    """
+
+    def __init__(self, rate: Optional[float], burst: Optional[float] = None):
+        """
+        Args:
+            rate: Richieste al secondo consentite (None o 0 per nessun limite)
+            burst: Richieste consecutive consentite senza attesa (default: max(1, rate))
+        """
+        self.rate = rate or None
+        self.burst = burst if burst is not None else max(1.0, rate or 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Sospende tutte le richieste per almeno `seconds` secondi"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self) -> float:
+        """
+        Attende un token
+
+        Returns:
+            Secondi di attesa (0 se la richiesta è partita subito)
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if self.rate:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif not self.rate:
+                    return waited
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                else:
+                    delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class IONOSClient:
+    """Client per le API IONOS"""
+
+    BASE_URL = "https://api.hosting.ionos.com"
+    REQUEST_TIMEOUT = 30  # Timeout in secondi per le richieste HTTP
+    POOL_SIZE = 10  # Connessioni keep-alive mantenute verso l'API
+    WRITE_CONCURRENCY = 4  # PUT paralleli quando l'aggiornamento in blocco non è disponibile
+    ZONE_CACHE_TTL = 3600  # Validità in secondi della cache nome zona -> ID
+    RATE_LIMIT = 10.0  # Richieste al secondo inviate al massimo all'API
+    MAX_RETRIES = 4  # Tentativi aggiuntivi per le richieste idempotenti
+    BACKOFF_BASE = 1.0  # Attesa in secondi prima del primo nuovo tentativo (raddoppia ogni volta)
+    BACKOFF_MAX = 60.0  # Attesa massima in secondi tra due tentativi
+    MAX_RETRY_AFTER = 300.0  # Retry-After più lungo che si è disposti ad attendere
+    RETRY_STATUS = frozenset({429, 502, 503, 504})  # Risposte temporanee da ritentare
+    IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'PUT', 'PATCH', 'DELETE'})
+    PATCH_UNSUPPORTED = frozenset({404, 405, 501})  # Risposte alla PATCH della zona che portano alle PUT
+
+    def __init__(self, pub_key: str, secret_key: str,
+                 session=None, pool_size: int = POOL_SIZE,
+                 zone_cache_ttl: float = ZONE_CACHE_TTL, zone_cache_file: Optional[Path] = None,
+                 base_url: Optional[str] = None, rate_limit: Optional[float] = RATE_LIMIT,
+                 max_retries: int = MAX_RETRIES, transport: Optional[HTTPTransport] = None,
+                 metrics: Optional[Metrics] = None):
+        """
+        Args:
+            pub_key: Chiave pubblica API IONOS
+            secret_key: Chiave segreta API IONOS
+            session: requests.Session da usare (iniettabile nei test); implica RequestsTransport
+            pool_size: Numero massimo di connessioni mantenute nel pool
+            zone_cache_ttl: Validità in secondi degli ID zona in cache
+            zone_cache_file: File in cui persistere la cache degli ID zona (opzionale)
+            base_url: URL base dell'API (default: BASE_URL; utile per server di test locali)
+            rate_limit: Richieste al secondo verso l'API (None o 0 per nessun limite)
+            max_retries: Tentativi aggiuntivi per le richieste idempotenti rifiutate
+                temporaneamente (429, 502-504) o fallite per errori di rete
+            transport: Trasporto HTTP da usare; se None ne viene creato uno con
+                create_transport(), che mantiene un pool di connessioni keep-alive
+                così l'handshake TCP/TLS viene pagato una sola volta per esecuzione
+            metrics: Metriche in cui registrare richieste, latenze e nuovi tentativi
+        """
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
+        self.pub_key = pub_key
+        self.secret_key = secret_key
+        self.headers = {
+            "X-API-Key": f"{pub_key}.{secret_key}",
+            "Accept": "application/json",
+            "Content-Type": "application/json"
+        }
+        if transport is None:
+            transport = RequestsTransport(session) if session is not None else create_transport(pool_size=pool_size)
+        self.transport = transport
+        self.zone_cache_ttl = zone_cache_ttl
+        self.zone_cache_file = Path(zone_cache_file) if zone_cache_file else None
+        # Cache nome zona -> (ID zona, timestamp di inserimento), condivisa tra i thread di AsyncIONOSClient
+        self._zone_cache: Dict[str, Tuple[str, float]] = self._load_zone_cache()
+        self._zone_lock = threading.Lock()
+        self.limiter = RateLimiter(rate_limit)
+        self.max_retries = max_retries
+        # Contatori delle richieste: inviate, ritentate, rifiutate con 429, rallentate dal limitatore
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "throttled": 0}
+        self._stats_lock = threading.Lock()
+        self.metrics = metrics if metrics is not None else Metrics()
+
+    def close(self) -> None:
+        """Chiude le connessioni del pool"""
+        self.transport.close()
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _endpoint(self, url: str) -> str:
+        """Percorso dell'URL con gli ID sostituiti da segnaposto (es. /dns/v1/zones/{zoneId})"""
+        parts = url[len(self.base_url):].split('?', 1)[0].split('/')
+        for index in range(1, len(parts)):
+            if parts[index - 1] == 'zones':
+                parts[index] = '{zoneId}'
+            elif parts[index - 1] == 'records':
+                parts[index] = '{recordId}'
+        return '/'.join(parts)
+
+    def _observe(self, method: str, endpoint: str, status: str, start: float) -> None:
+        """Registra nelle metriche una richiesta completata (o fallita) all'API"""
+        self.metrics.inc("ionos_ddns_api_requests_total", method=method, endpoint=endpoint, status=status)
+        self.metrics.observe("ionos_ddns_api_request_duration_seconds", time.monotonic() - start,
+                             method=method, endpoint=endpoint)
+
+    def _request(self, method: str, url: str, **kwargs) -> HTTPResponse:
+        """
+        Invia una richiesta all'API rispettando il limite di frequenza
+
+        Le richieste idempotenti rifiutate temporaneamente (429, 502-504) o
+        fallite per errori di rete vengono ripetute con backoff esponenziale
+        e jitter; un Retry-After della risposta ha la precedenza e sospende
+        anche le altre richieste in corso. Le POST non vengono mai ripetute,
+        per non creare record duplicati.
+
+        Returns:
+            L'ultima risposta ricevuta (lo stato va verificato dal chiamante)
+        """
+        retry = method.upper() in self.IDEMPOTENT_METHODS
+        endpoint = self._endpoint(url)
+        attempt = 0
+        while True:
+            waited = self.limiter.acquire()
+            if waited > 0:
+                self._count("throttled")
+                self.metrics.inc("ionos_ddns_api_throttle_seconds_total", waited)
+            self._count("requests")
+            start = time.monotonic()
+            try:
+                response = self.transport.request(method, url, headers=self.headers,
+                                                  timeout=self.REQUEST_TIMEOUT, **kwargs)
+            except TransportError:
+                self._observe(method, endpoint, "error", start)
+                if not retry or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                self._observe(method, endpoint, str(response.status_code), start)
+                if response.status_code == 429:
+                    self._count("rate_limited")
+                if response.status_code not in self.RETRY_STATUS or not retry or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_after(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                elif response.status_code == 429:
+                    # L'attesa avviene nel limitatore, insieme alle altre richieste in corso
+                    self.limiter.pause(delay)
+                    delay = 0
+
+            attempt += 1
+            self._count("retries")
+            self.metrics.inc("ionos_ddns_api_retries_total", method=method, endpoint=endpoint)
+            if delay:
+                time.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        """Attesa prima del tentativo successivo: esponenziale con jitter completo"""
+        return random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** attempt))
+
+    def _retry_after(self, response: HTTPResponse) -> Optional[float]:
+        """Legge l'header Retry-After (secondi o data HTTP), limitato a MAX_RETRY_AFTER"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            import email.utils
+            try:
+                delay = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(delay, 0.0), self.MAX_RETRY_AFTER)
+
+    def _load_zone_cache(self) -> Dict[str, Tuple[str, float]]:
+        """Carica la cache degli ID zona dal file, se configurato"""
+        if not self.zone_cache_file:
+            return {}
+        try:
+            with open(self.zone_cache_file, 'r') as f:
+                data = json.load(f)
+            # La cache è valida solo per l'account che l'ha scritta
+            if data.get('pub') != self.pub_key:
+                return {}
+            return {name: (entry['id'], float(entry['ts']))
+                    for name, entry in data.get('zones', {}).items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # Cache assente o corrotta: si riparte da vuota
+            return {}
+
+    def _save_zone_cache(self) -> None:
+        """Salva la cache degli ID zona sul file, se configurato (da chiamare tenendo _zone_lock)"""
+        if not self.zone_cache_file:
+            return
+        data = {
+            "pub": self.pub_key,
+            "zones": {name: {"id": zone_id, "ts": ts}
+                      for name, (zone_id, ts) in self._zone_cache.items()}
+        }
+        try:
+            write_json_atomic(self.zone_cache_file, data)
+        except OSError:
+            # La cache è solo un'ottimizzazione: un errore di scrittura non è fatale
+            pass
+
+    def _cached_zone_id(self, domain: str) -> Optional[str]:
+        """Restituisce l'ID zona in cache se ancora valido"""
+        with self._zone_lock:
+            entry = self._zone_cache.get(domain)
+        if entry is None:
+            return None
+        zone_id, ts = entry
+        if time.time() - ts > self.zone_cache_ttl:
+            return None
+        return zone_id
+
+    def invalidate_zone(self, zone_id: str) -> None:
+        """Rimuove dalla cache tutte le voci che puntano a zone_id"""
+        with self._zone_lock:
+            stale = [name for name, (cached_id, _) in self._zone_cache.items() if cached_id == zone_id]
+            if not stale:
+                return
+            for name in stale:
+                del self._zone_cache[name]
+            self._save_zone_cache()
+
+    def get_zones(self) -> list:
+        """Recupera tutte le zone DNS gestite e aggiorna la cache degli ID zona"""
+        url = f"{self.base_url}/dns/v1/zones"
+        response = self._request('GET', url)
+        response.raise_for_status()
+        zones = response.json()
+
+        now = time.time()
+        with self._zone_lock:
+            self._zone_cache = {zone['name']: (zone['id'], now) for zone in zones}
+            self._save_zone_cache()
+        return zones
+
+    def get_zone_id(self, domain: str) -> Optional[str]:
+        """
+        Trova l'ID della zona per un dominio specifico
+
+        Args:
+            domain: Nome del dominio (es. cauware.com)
+
+        Returns:
+            ID della zona o None se non trovata
+        """
+        zone_id = self._cached_zone_id(domain)
+        if zone_id:
+            return zone_id
+
+        zones = self.get_zones()
+        for zone in zones:
+            if zone['name'] == domain:
+                return zone['id']
+        return None
+
+    def get_zone(self, zone_id: str, record_name: Optional[str] = None,
+                 record_type: Optional[str] = None) -> Optional[Dict]:
+        """
+        Recupera i dettagli di una zona DNS tramite ID
+
+        Con record_name e/o record_type il filtro viene applicato lato server
+        (parametri recordName/recordType) e la risposta contiene solo i record
+        corrispondenti, qualunque sia la dimensione della zona. Se l'API
+        rifiuta i filtri si ripiega sul download completo.
+
+        Args:
+            zone_id: ID della zona
+            record_name: Nome completo dei record da restituire (es. dev01.cauware.com)
+            record_type: Tipo dei record da restituire (es. 'A')
+
+        Returns:
+            Dict con i dettagli della zona o None se non trovata
+        """
+        url = f"{self.base_url}/dns/v1/zones/{zone_id}"
+        params = {}
+        if record_name:
+            params['recordName'] = record_name
+        if record_type:
+            params['recordType'] = record_type
+        try:
+            response = self._request('GET', url, params=params or None)
+            response.raise_for_status()
+            return response.json()
+        except HTTPStatusError as e:
+            if e.response.status_code == 404:
+                self.invalidate_zone(zone_id)
+                return None
+            if params and e.response.status_code == 400:
+                # Filtri non accettati: scarica la zona completa
+                return self.get_zone(zone_id)
+            raise
+
+    def get_records(self, zone_id: str, record_name: Optional[str] = None,
+                    record_type: Optional[str] = None) -> list:
+        """Recupera i record DNS di una zona, eventualmente filtrati per nome e tipo"""
+        zone = self.get_zone(zone_id, record_name=record_name, record_type=record_type)
+        if not zone:
+            return []
+        return zone.get('records', [])
+
+    def _zone_write(self, method: str, domain: str, path: str, payload, retry_stale: bool = True):
+        """
+        Esegue una scrittura su un endpoint della zona di un dominio
+
+        Se l'endpoint risponde 404 l'ID zona viene rimosso dalla cache; se
+        l'ID proveniva dalla cache la richiesta viene ripetuta una volta con
+        l'ID appena riletto dall'API.
+
+        Args:
+            method: Metodo HTTP ('POST', 'PUT' o 'PATCH')
+            domain: Dominio base
+            path: Percorso relativo alla zona (es. /records)
+            payload: Corpo JSON della richiesta
+            retry_stale: Se False un 404 viene sollevato senza toccare la
+                cache (per le richieste in cui 404 ha un altro significato)
+        """
+        while True:
+            from_cache = self._cached_zone_id(domain) is not None
+            zone_id = self.get_zone_id(domain)
+            if not zone_id:
+                raise ValueError(f"Dominio {domain} non trovato")
+
+            url = f"{self.base_url}/dns/v1/zones/{zone_id}{path}"
+            response = self._request(method, url, json=payload)
+            if response.status_code == 404 and retry_stale:
+                self.invalidate_zone(zone_id)
+                if from_cache:
+                    continue
+            response.raise_for_status()
+            # Alcuni endpoint (es. PATCH della zona) rispondono senza corpo
+            return response.json() if response.content else None
+
+    def create_record(self, domain: str, name: str, record_type: str, content: str, ttl: int = 3600):
+        """
+        Crea un nuovo record DNS
+
+        Args:
+            domain: Dominio base (es. cauware.com)
+            name: Nome del record (es. dev01 per dev01.cauware.com)
+            record_type: Tipo di record ('A' o 'AAAA')
+            content: Indirizzo IP
+            ttl: Time to live in secondi
+        """
+        # Il nome completo deve includere il dominio
+        full_name = f"{name}.{domain}" if name else domain
+
+        new_record = {
+            "name": full_name,
+            "rootName": domain,
+            "type": record_type,
+            "content": content,
+            "ttl": ttl,
+            "disabled": False
+        }
+
+        # Crea il record usando POST
+        return self._zone_write('POST', domain, "/records", [new_record])
+
+    def update_record(self, domain: str, name: str, record_type: str, new_content: str, record_id: str):
+        """
+        Aggiorna un record DNS esistente
+
+        Args:
+            domain: Dominio base
+            name: Nome del record
+            record_type: Tipo di record
+            new_content: Nuovo indirizzo IP
+            record_id: ID del record da aggiornare
+        """
+        # Il nome completo deve includere il dominio
+        full_name = f"{name}.{domain}" if name else domain
+
+        updated_record = {
+            "name": full_name,
+            "rootName": domain,
+            "type": record_type,
+            "content": new_content,
+            "disabled": False
+        }
+
+        # Aggiorna il record usando PUT
+        return self._zone_write('PUT', domain, f"/records/{record_id}", updated_record)
+
+    def create_records(self, domain: str, records: List[Dict], ttl: int = 3600) -> list:
+        """
+        Crea più record DNS della stessa zona con un'unica POST
+
+        Args:
+            domain: Dominio base
+            records: Record da creare, ognuno con 'name' (es. dev01), 'type' e 'content'
+            ttl: Time to live in secondi
+
+        Returns:
+            Lista dei record creati restituita dall'API
+        """
+        new_records = [
+            {
+                "name": f"{record['name']}.{domain}" if record['name'] else domain,
+                "rootName": domain,
+                "type": record['type'],
+                "content": record['content'],
+                "ttl": ttl,
+                "disabled": False
+            }
+            for record in records
+        ]
+        return self._zone_write('POST', domain, "/records", new_records)
+
+    def update_records(self, domain: str, records: List[Dict]) -> Dict[str, Optional[str]]:
+        """
+        Aggiorna più record DNS della stessa zona
+
+        Usa l'endpoint PATCH della zona, che sostituisce in una sola chiamata
+        i record con lo stesso nome e tipo; se il server non lo supporta
+        (PATCH_UNSUPPORTED) o non risponde ripiega su PUT per singolo record
+        con al massimo WRITE_CONCURRENCY richieste in parallelo. Gli altri
+        errori HTTP (credenziali, payload, limiti di frequenza) vengono
+        sollevati: le PUT fallirebbero allo stesso modo.
+
+        La PATCH è solo un tentativo: un 404 significa endpoint assente, non
+        ID zona scaduto, e porta subito alle PUT. I record che condividono
+        nome e tipo con un altro record del lotto (es. A in round-robin) non
+        passano dalla PATCH, che li fonderebbe in uno solo, ma dalle PUT.
+
+        Args:
+            domain: Dominio base
+            records: Record da aggiornare, ognuno con 'id', 'name' (es. dev01),
+                'type', 'content' e opzionalmente 'ttl'
+
+        Returns:
+            Dict ID record -> None se aggiornato, altrimenti il messaggio di errore
+        """
+        shared = {key for key, count in Counter((record['name'], record['type']) for record in records).items()
+                  if count > 1}
+        patch = []
+        patch_records = []
+        put_records = []
+        for record in records:
+            if (record['name'], record['type']) in shared:
+                put_records.append(record)
+                continue
+            patch_records.append(record)
+            entry = {
+                "name": f"{record['name']}.{domain}" if record['name'] else domain,
+                "type": record['type'],
+                "content": record['content'],
+                "disabled": False
+            }
+            if record.get('ttl') is not None:
+                entry['ttl'] = record['ttl']
+            patch.append(entry)
+
+        results: Dict[str, Optional[str]] = {}
+        if patch:
+            try:
+                self._zone_write('PATCH', domain, "", patch, retry_stale=False)
+                results = {record['id']: None for record in patch_records}
+            except HTTPStatusError as e:
+                if e.response is None or e.response.status_code not in self.PATCH_UNSUPPORTED:
+                    raise
+                put_records = records
+            except TransportError:
+                # PATCH è idempotente: riprovare record per record è sicuro
+                put_records = records
+
+        def put(record: Dict) -> Optional[str]:
+            try:
+                self.update_record(domain, record['name'], record['type'], record['content'], record['id'])
+                return None
+            except (TransportError, ValueError) as e:
+                return str(e)
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.WRITE_CONCURRENCY) as executor:
+            errors = list(executor.map(put, put_records))
+        results.update({record['id']: error for record, error in zip(put_records, errors)})
+        return {record['id']: results[record['id']] for record in records}
+
+
+class DNSRecord:
+    """
+    Record DNS in forma compatta
+
+    Conserva solo i campi usati per il confronto e la scrittura; con
+    __slots__ occupa una frazione della memoria del dict JSON dell'API.
+    """
+
+    __slots__ = ('id', 'name', 'type', 'content', 'ttl')
+
+    def __init__(self, id: Optional[str], name: str, type: str, content: str, ttl: Optional[int] = None):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.content = content
+        self.ttl = ttl
+
+    @classmethod
+    def from_api(cls, data: Dict) -> 'DNSRecord':
+        """Crea il record dal dict restituito dall'API IONOS"""
+        return cls(data.get('id'), data['name'], data['type'], data.get('content', ''), data.get('ttl'))
+
+    def __repr__(self) -> str:
+        return f"DNSRecord({self.id!r}, {self.name!r}, {self.type!r}, {self.content!r}, {self.ttl!r})"
+
+
+class Zone:
+    """
+    Zona DNS indicizzata in memoria
+
+    I record sono indicizzati per (nome, tipo) e per ID, quindi le ricerche
+    costano O(1) anche su zone con migliaia di record. L'indice viene
+    costruito una volta per lettura della zona e aggiornato dopo ogni
+    scrittura riuscita.
+    """
+
+    def __init__(self, zone_id: str, records: Iterable[DNSRecord] = ()):
+        self.id = zone_id
+        self._by_key: Dict[Tuple[str, str], DNSRecord] = {}
+        self._by_id: Dict[str, DNSRecord] = {}
+        self._count = 0
+        for record in records:
+            self.add(record)
+
+    @classmethod
+    def from_api(cls, zone_id: str, data: Dict) -> 'Zone':
+        """Crea la zona dal dict restituito da IONOSClient.get_zone"""
+        return cls(zone_id, (DNSRecord.from_api(record) for record in data.get('records', [])))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, record: DNSRecord) -> None:
+        """Aggiunge un record agli indici (a parità di nome e tipo vale il primo)"""
+        self._count += 1
+        self._by_key.setdefault((record.name, record.type), record)
+        if record.id is not None:
+            self._by_id[record.id] = record
+
+    def find(self, name: str, record_type: str) -> Optional[DNSRecord]:
+        """Cerca il record con nome completo e tipo indicati"""
+        return self._by_key.get((name, record_type))
+
+    def get(self, record_id: str) -> Optional[DNSRecord]:
+        """Cerca un record per ID"""
+        return self._by_id.get(record_id)
+
+    def set_content(self, record_id: str, content: str) -> None:
+        """Aggiorna il contenuto di un record dopo una scrittura riuscita"""
+        record = self._by_id.get(record_id)
+        if record is not None:
+            record.content = content
+
+
+class StateStore:
+    """
+    Stato locale dell'ultimo IP pubblicato per ogni hostname
+
+    Il file contiene, per hostname e tipo di record, l'IP pubblicato, gli ID
+    di record e zona e il timestamp dell'ultima verifica sulle API. Le
+    scritture avvengono sotto lock esclusivo (più esecuzioni cron possono
+    sovrapporsi) e in modo atomico, quindi le letture non richiedono lock.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + '.lock')
+
+    def _locked(self):
+        """Acquisisce il lock esclusivo sul file di stato"""
+        return file_lock(self.lock_path)
+
+    def _read(self) -> Dict:
+        """Legge gli hostname dal file di stato (vuoto se assente o corrotto)"""
+        try:
+            with open(self.path, 'r') as f:
+                hosts = json.load(f).get('hosts', {})
+            return hosts if isinstance(hosts, dict) else {}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def get(self, hostname: str, record_type: str) -> Optional[Dict]:
+        """
+        Restituisce lo stato salvato per un hostname
+
+        Returns:
+            Dict con ip, record_id, zone_id, checked_at o None se assente
+        """
+        entry = self._read().get(hostname, {}).get(record_type)
+        return entry if isinstance(entry, dict) else None
+
+    def set(self, hostname: str, record_type: str, ip: str,
+            record_id: Optional[str], zone_id: Optional[str]) -> None:
+        """Registra l'IP pubblicato per un hostname con il timestamp corrente"""
+        with self._locked():
+            # Rilegge sotto lock per non perdere le scritture di altri processi
+            hosts = self._read()
+            hosts.setdefault(hostname, {})[record_type] = {
+                "ip": ip,
+                "record_id": record_id,
+                "zone_id": zone_id,
+                "checked_at": time.time()
+            }
+            write_json_atomic(self.path, {"hosts": hosts})
+
+
+class DNSUpdater:
+    """Gestisce l'aggiornamento del DNS dinamico"""
+
+    FORCE_CHECK_INTERVAL = 24 * 3600  # Secondi dopo i quali si verifica comunque il record su IONOS
+
+    # Esito di un record -> valore dell'etichetta outcome nelle metriche
+    OUTCOME_LABELS = {"invariato": "unchanged", "aggiornato": "updated", "creato": "created"}
+
+    def __init__(self, pub_key: str, secret_key: str, session=None,
+                 zone_cache_file: Optional[Path] = None, state_file: Optional[Path] = None,
+                 force_check_interval: float = FORCE_CHECK_INTERVAL,
+                 ip_detector: Optional[PublicIPDetector] = None, dual_stack: bool = False,
+                 rate_limit: Optional[float] = IONOSClient.RATE_LIMIT,
+                 transport: Optional[HTTPTransport] = None, base_url: Optional[str] = None,
+                 metrics: Optional[Metrics] = None):
+        # Le metriche sono condivise con client e rilevatore: un'unica esposizione per processo
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.client = IONOSClient(pub_key, secret_key, session=session, zone_cache_file=zone_cache_file,
+                                  rate_limit=rate_limit, transport=transport, base_url=base_url,
+                                  metrics=self.metrics)
+        self.ip_detector = ip_detector if ip_detector is not None else PublicIPDetector(metrics=self.metrics)
+        self.dual_stack = dual_stack
+        self.state = StateStore(state_file) if state_file else None
+        self.force_check_interval = force_check_interval
+        # Ultimi IP pubblicati da questa istanza, utili quando resta attiva tra più cicli
+        self._published: Dict[Tuple[str, str], Dict] = {}
+        # Indirizzi dell'ultimo rilevamento riuscito (tipo record -> IP)
+        self.last_addresses: Dict[str, str] = {}
+
+    def close(self) -> None:
+        """Chiude le connessioni verso l'API e verso i servizi di rilevamento IP"""
+        self.client.close()
+        # I rilevatori iniettati possono non avere connessioni da chiudere
+        close_detector = getattr(self.ip_detector, "close", None)
+        if close_detector is not None:
+            close_detector()
+
+    def _is_unchanged(self, hostname: str, record_type: str, current_ip: str) -> bool:
+        """Verifica se l'IP coincide con l'ultimo pubblicato e la verifica è recente"""
+        entry = self._published.get((hostname, record_type))
+        if entry is None and self.state is not None:
+            entry = self.state.get(hostname, record_type)
+        if not entry or entry.get('ip') != current_ip:
+            return False
+        try:
+            return time.time() - float(entry.get('checked_at', 0)) < self.force_check_interval
+        except (TypeError, ValueError):
+            return False
+
+    def _save_state(self, hostname: str, record_type: str, ip: str,
+                    record_id: Optional[str], zone_id: Optional[str]) -> None:
+        """Salva l'IP pubblicato in memoria e nello stato locale, se configurato"""
+        self._published[(hostname, record_type)] = {"ip": ip, "checked_at": time.time()}
+        if self.state is None:
+            return
+        try:
+            self.state.set(hostname, record_type, ip, record_id, zone_id)
+        except OSError as e:
+            # Il record è già aggiornato: un errore sullo stato non deve far fallire l'esecuzione
+            print(f"ATTENZIONE: impossibile salvare lo stato in {self.state.path}: {e}")
+
+    @contextmanager
+    def _run_metrics(self) -> Iterator[List[Tuple[str, str, str, str]]]:
+        """
+        Misura un'esecuzione completa e ne registra l'esito nelle metriche
+
+        Yields:
+            Lista a cui aggiungere gli esiti (hostname, tipo record, IP, esito)
+        """
+        results: List[Tuple[str, str, str, str]] = []
+        start = time.monotonic()
+        try:
+            yield results
+        except BaseException:
+            # Comprende sys.exit() sui domini non gestiti
+            outcome = "error"
+            raise
+        else:
+            outcomes = {result[3] for result in results}
+            if any(o.startswith("errore") for o in outcomes):
+                outcome = "error"
+            elif outcomes & {"aggiornato", "creato"}:
+                outcome = "changed"
+            else:
+                outcome = "unchanged"
+        finally:
+            now = time.time()
+            metrics = self.metrics
+            metrics.observe("ionos_ddns_phase_duration_seconds", time.monotonic() - start, phase="total")
+            for _, record_type, _, result in results:
+                label = self.OUTCOME_LABELS.get(result, "error")
+                metrics.inc("ionos_ddns_records_total", type=record_type, outcome=label)
+            metrics.inc("ionos_ddns_runs_total", result=outcome)
+            metrics.set("ionos_ddns_last_run_timestamp_seconds", now)
+            if outcome != "error":
+                metrics.set("ionos_ddns_last_success_timestamp_seconds", now)
+
+    def _phase(self, phase: str):
+        """Misura la durata di una fase dell'esecuzione"""
+        return self.metrics.timer("ionos_ddns_phase_duration_seconds", phase=phase)
+
+    def _detect_addresses(self) -> Dict[str, str]:
+        """
+        Rileva gli indirizzi da pubblicare
+
+        Returns:
+            Dict tipo record -> IP; in dual-stack contiene le famiglie rilevate
+        """
+        with self._phase("detect"):
+            self.last_addresses = self._detect_public_addresses()
+        return self.last_addresses
+
+    def _detect_public_addresses(self) -> Dict[str, str]:
+        if not self.dual_stack:
+            current_ip, record_type = self.ip_detector.get_public_ip()
+            print(f"IP pubblico rilevato: {current_ip} (tipo: {record_type})")
+            return {record_type: current_ip}
+
+        detected = self.ip_detector.get_public_ips()
+        addresses = {}
+        for record_type, ip in detected.items():
+            family = "IPv4" if record_type == 'A' else "IPv6"
+            if ip:
+                print(f"IP pubblico {family} rilevato: {ip} (tipo: {record_type})")
+                addresses[record_type] = ip
+            else:
+                print(f"ATTENZIONE: impossibile rilevare l'indirizzo {family}, record {record_type} non aggiornato")
+        if not addresses:
+            raise RuntimeError("Impossibile rilevare l'indirizzo IP pubblico")
+        return addresses
+
+    @staticmethod
+    def _split_hostname(hostname: str) -> Tuple[str, str]:
+        """
+        Separa l'hostname in nome del record e dominio
+
+        Returns:
+            Tuple[str, str]: (nome_record, dominio), es. ('dev01', 'cauware.com')
+        """
+        # Parse hostname
+        parts = hostname.split('.')
+        if len(parts) < 2:
+            raise ValueError(f"Hostname non valido: {hostname}. Deve essere completo di dominio (es. dev01.cauware.com)")
+
+        # Estrae nome e dominio
+        return parts[0], '.'.join(parts[1:])
+
+    def update_dns(self, hostname: str) -> None:
+        """
+        Aggiorna o crea il record DNS per l'hostname specificato
+
+        In modalità dual-stack aggiorna sia il record A sia il record AAAA
+        con un'unica lettura della zona.
+
+        Args:
+            hostname: Hostname completo (es. dev01.cauware.com)
+        """
+        with self._run_metrics() as results:
+            self._update_dns(hostname, results)
+
+    def _update_dns(self, hostname: str, results: List[Tuple[str, str, str, str]]) -> None:
+        """Corpo di update_dns; gli esiti dei record vengono aggiunti a results"""
+        record_name, domain = self._split_hostname(hostname)
+
+        print(f"Hostname: {hostname}")
+        print(f"Record: {record_name}")
+        print(f"Dominio: {domain}")
+        print()
+
+        # Rileva IP pubblico
+        print("Rilevamento IP pubblico...")
+        addresses = self._detect_addresses()
+        print()
+
+        # Se l'IP è quello già pubblicato non serve interrogare IONOS
+        pending = {record_type: ip for record_type, ip in addresses.items()
+                   if not self._is_unchanged(hostname, record_type, ip)}
+        results.extend((hostname, record_type, ip, "invariato") for record_type, ip in addresses.items()
+                       if record_type not in pending)
+        if not pending:
+            print("L'IP è invariato rispetto all'ultimo aggiornamento. Nessuna chiamata alle API IONOS necessaria.")
+            return
+
+        # Verifica se il dominio è gestito da IONOS
+        print(f"Verifica dominio {domain} su IONOS...")
+        with self._phase("zone_lookup"):
+            zone_id = self.client.get_zone_id(domain)
+
+        if not zone_id:
+            print(f"ERRORE: Il dominio {domain} non è gestito da IONOS")
+            sys.exit(1)
+
+        print(f"Dominio {domain} trovato su IONOS (ID: {zone_id})")
+        print()
+
+        # Recupera solo i record dell'hostname (filtro lato server)
+        record_type = next(iter(pending)) if len(pending) == 1 else None
+        with self._phase("zone_read"):
+            zone = self.client.get_zone(zone_id, record_name=f"{record_name}.{domain}", record_type=record_type)
+        if not zone:
+            print(f"ERRORE: Impossibile recuperare i dettagli della zona")
+            sys.exit(1)
+
+        zone = Zone.from_api(zone_id, zone)
+        with self._phase("write"):
+            for record_type, current_ip in pending.items():
+                outcome = self._reconcile_record(hostname, record_name, domain, zone, record_type, current_ip)
+                results.append((hostname, record_type, current_ip, outcome))
+
+    def update_hosts(self, hostnames: List[str]) -> List[Tuple[str, str, str, str]]:
+        """
+        Aggiorna più hostname in un'unica esecuzione
+
+        L'IP viene rilevato una sola volta e gli hostname sono raggruppati per
+        zona: ogni zona viene letta una volta e vengono scritti solo i record
+        che differiscono. Un errore su un hostname non interrompe gli altri.
+
+        Args:
+            hostnames: Hostname completi (es. dev01.cauware.com)
+
+        Returns:
+            Lista di (hostname, tipo record, IP, esito) riportata anche nel riepilogo finale
+        """
+        with self._run_metrics() as results:
+            groups, errors = self._group_hosts(hostnames)
+            results.extend(errors)
+
+            # Rileva IP pubblico
+            print("Rilevamento IP pubblico...")
+            addresses = self._detect_addresses()
+            print()
+
+            for domain, hosts in groups.items():
+                pending, unchanged = self._pending_records(hosts, addresses)
+                results.extend(unchanged)
+                if not pending:
+                    continue
+
+                print(f"Verifica dominio {domain} su IONOS...")
+                zone_id = None
+                try:
+                    with self._phase("zone_lookup"):
+                        zone_id = self.client.get_zone_id(domain)
+                    with self._phase("zone_read"):
+                        zone = self.client.get_zone(zone_id, **self._zone_filters(pending)) if zone_id else None
+                except Exception as e:
+                    results.extend(self._zone_errors(domain, zone_id, pending, error=e))
+                    continue
+                if not zone:
+                    results.extend(self._zone_errors(domain, zone_id, pending))
+                    continue
+
+                print(f"Dominio {domain} trovato su IONOS (ID: {zone_id})")
+                with self._phase("write"):
+                    results.extend(self._write_zone(domain, Zone.from_api(zone_id, zone), pending))
+                print()
+
+            self._print_summary(results)
+        return results
+
+    def _group_hosts(self, hostnames: List[str]) -> Tuple[Dict[str, List[Tuple[str, str]]],
+                                                          List[Tuple[str, str, str, str]]]:
+        """
+        Raggruppa gli hostname per dominio (zona)
+
+        Returns:
+            (dominio -> [(hostname, nome record)], esiti per gli hostname non validi)
+        """
+        groups: Dict[str, List[Tuple[str, str]]] = {}
+        errors = []
+        for hostname in dict.fromkeys(hostnames):
+            try:
+                record_name, domain = self._split_hostname(hostname)
+            except ValueError as e:
+                errors.append((hostname, "-", "-", f"errore: {e}"))
+                continue
+            groups.setdefault(domain, []).append((hostname, record_name))
+        return groups, errors
+
+    def _pending_records(self, hosts: List[Tuple[str, str]], addresses: Dict[str, str]):
+        """
+        Separa i record da verificare su IONOS da quelli già pubblicati
+
+        Returns:
+            ([(hostname, nome record, tipo, IP)] da verificare, esiti 'invariato')
+        """
+        pending, unchanged = [], []
+        for hostname, record_name in hosts:
+            for record_type, ip in addresses.items():
+                if self._is_unchanged(hostname, record_type, ip):
+                    unchanged.append((hostname, record_type, ip, "invariato"))
+                else:
+                    pending.append((hostname, record_name, record_type, ip))
+        return pending, unchanged
+
+    @staticmethod
+    def _zone_filters(pending: List[Tuple[str, str, str, str]]) -> Dict[str, Optional[str]]:
+        """
+        Filtri lato server per la lettura della zona
+
+        Con un solo hostname basta una lettura filtrata, con più hostname
+        conviene una sola lettura della zona completa.
+        """
+        hostnames = {hostname for hostname, _, _, _ in pending}
+        if len(hostnames) != 1:
+            return {}
+        record_types = {record_type for _, _, record_type, _ in pending}
+        return {
+            "record_name": hostnames.pop(),
+            "record_type": record_types.pop() if len(record_types) == 1 else None
+        }
+
+    @staticmethod
+    def _zone_errors(domain: str, zone_id: Optional[str], pending: List[Tuple[str, str, str, str]],
+                     error: Optional[Exception] = None) -> List[Tuple[str, str, str, str]]:
+        """Esiti di errore per tutti i record di una zona non disponibile o illeggibile"""
+        if error is not None:
+            reason = str(error)
+        elif not zone_id:
+            reason = "dominio non gestito da IONOS"
+        else:
+            reason = "impossibile recuperare la zona"
+        print(f"ERRORE: {domain}: {reason}")
+        print()
+        return [(hostname, record_type, ip, f"errore: {reason}") for hostname, _, record_type, ip in pending]
+
+    def _write_zone(self, domain: str, zone: Zone,
+                    pending: List[Tuple[str, str, str, str]]) -> List[Tuple[str, str, str, str]]:
+        """
+        Confronta gli hostname con i record di una zona e scrive le differenze in blocco
+
+        I record mancanti vengono creati con un'unica POST e quelli con IP
+        diverso aggiornati con update_records.
+
+        Returns:
+            Lista di (hostname, tipo record, IP, esito)
+        """
+        results, creates, updates = self._plan_zone(domain, zone, pending)
+
+        if creates:
+            print(f"Creazione di {len(creates)} record...")
+            try:
+                created = self.client.create_records(domain, self._create_payload(creates))
+                results.extend(self._apply_creates(zone, creates, created))
+            except Exception as e:
+                results.extend(self._apply_creates(zone, creates, error=e, domain=domain))
+
+        if updates:
+            try:
+                errors = self.client.update_records(domain, self._update_payload(updates))
+            except Exception as e:
+                print(f"ERRORE: aggiornamento record in {domain}: {e}")
+                errors = {existing.id: str(e) for _, _, _, _, existing in updates}
+            results.extend(self._apply_updates(zone, updates, errors))
+
+        return self._order_results(results, pending)
+
+    def _plan_zone(self, domain: str, zone: Zone, pending: List[Tuple[str, str, str, str]]):
+        """
+        Confronta i record attesi con la zona
+
+        Returns:
+            (esiti 'invariato', record da creare, record da aggiornare)
+        """
+        results, creates, updates = [], [], []
+        for hostname, record_name, record_type, ip in pending:
+            existing = zone.find(f"{record_name}.{domain}", record_type)
+            if existing is None:
+                creates.append((hostname, record_name, record_type, ip))
+            elif existing.content == ip:
+                self._save_state(hostname, record_type, ip, existing.id, zone.id)
+                results.append((hostname, record_type, ip, "invariato"))
+            else:
+                print(f"Aggiornamento {hostname} ({record_type}) da {existing.content} a {ip}")
+                updates.append((hostname, record_name, record_type, ip, existing))
+        return results, creates, updates
+
+    @staticmethod
+    def _create_payload(creates: list) -> List[Dict]:
+        return [{"name": record_name, "type": record_type, "content": ip}
+                for _, record_name, record_type, ip in creates]
+
+    @staticmethod
+    def _update_payload(updates: list) -> List[Dict]:
+        return [{"id": existing.id, "name": record_name, "type": record_type, "content": ip, "ttl": existing.ttl}
+                for _, record_name, record_type, ip, existing in updates]
+
+    def _apply_creates(self, zone: Zone, creates: list, created=None,
+                       error: Optional[Exception] = None, domain: str = "") -> List[Tuple[str, str, str, str]]:
+        """Registra l'esito della creazione in blocco nella zona e nello stato"""
+        if error is not None:
+            print(f"ERRORE: creazione record in {domain}: {error}")
+            return [(hostname, record_type, ip, f"errore: {error}") for hostname, _, record_type, ip in creates]
+
+        results = []
+        ids = {(record.get('name'), record.get('type')): record.get('id')
+               for record in created if isinstance(record, dict)} if isinstance(created, list) else {}
+        for hostname, _, record_type, ip in creates:
+            record_id = ids.get((hostname, record_type))
+            zone.add(DNSRecord(record_id, hostname, record_type, ip))
+            self._save_state(hostname, record_type, ip, record_id, zone.id)
+            results.append((hostname, record_type, ip, "creato"))
+        return results
+
+    def _apply_updates(self, zone: Zone, updates: list,
+                       errors: Dict[str, Optional[str]]) -> List[Tuple[str, str, str, str]]:
+        """Registra l'esito degli aggiornamenti nella zona e nello stato"""
+        results = []
+        for hostname, _, record_type, ip, existing in updates:
+            error = errors.get(existing.id)
+            if error:
+                print(f"ERRORE: {hostname}: {error}")
+                results.append((hostname, record_type, ip, f"errore: {error}"))
+            else:
+                zone.set_content(existing.id, ip)
+                self._save_state(hostname, record_type, ip, existing.id, zone.id)
+                results.append((hostname, record_type, ip, "aggiornato"))
+        return results
+
+    @staticmethod
+    def _order_results(results: list, pending: List[Tuple[str, str, str, str]]) -> list:
+        """Mantiene nel riepilogo l'ordine in cui gli hostname sono stati richiesti"""
+        order = {(hostname, record_type): index for index, (hostname, _, record_type, _) in enumerate(pending)}
+        return sorted(results, key=lambda result: order[(result[0], result[1])])
+
+    def _print_summary(self, results: List[Tuple[str, str, str, str]]) -> None:
+        """Stampa il riepilogo per hostname di un aggiornamento multiplo"""
+        print("Riepilogo:")
+        width = max((len(hostname) for hostname, _, _, _ in results), default=0)
+        for hostname, record_type, ip, outcome in results:
+            print(f"  {hostname:<{width}}  {record_type:<4}  {ip:<39}  {outcome}")
+
+        stats = self.client.stats
+        if stats["retries"] or stats["throttled"]:
+            print(f"Richieste API: {stats['requests']} (ritentate: {stats['retries']}, "
+                  f"rifiutate per frequenza: {stats['rate_limited']}, rallentate: {stats['throttled']})")
+
+    def _reconcile_record(self, hostname: str, record_name: str, domain: str, zone: Zone,
+                          record_type: str, current_ip: str) -> str:
+        """
+        Aggiorna o crea un singolo record confrontandolo con i record della zona
+
+        Returns:
+            Esito: 'invariato', 'aggiornato' o 'creato'
+        """
+        # Cerca il record esistente (il nome nel record include il dominio completo)
+        full_hostname = f"{record_name}.{domain}"
+        existing_record = zone.find(full_hostname, record_type)
+
+        # Aggiorna o crea il record
+        if existing_record:
+            existing_ip = existing_record.content
+            record_id = existing_record.id
+            print(f"Record {hostname} esistente trovato con IP: {existing_ip}")
+
+            if existing_ip == current_ip:
+                print("L'IP è già aggiornato. Nessuna modifica necessaria.")
+                outcome = "invariato"
+            else:
+                print(f"Aggiornamento IP da {existing_ip} a {current_ip}...")
+                self.client.update_record(domain, record_name, record_type, current_ip, record_id)
+                zone.set_content(record_id, current_ip)
+                print("Record aggiornato con successo!")
+                outcome = "aggiornato"
+        else:
+            print(f"Record {hostname} non trovato. Creazione nuovo record...")
+            created = self.client.create_record(domain, record_name, record_type, current_ip)
+            record_id = created[0].get('id') if isinstance(created, list) and created else None
+            zone.add(DNSRecord(record_id, full_hostname, record_type, current_ip))
+            print(f"Record {record_type} creato con successo per {hostname} -> {current_ip}")
+            outcome = "creato"
+
+        self._save_state(hostname, record_type, current_ip, record_id, zone.id)
+        return outcome
+
+
+class AsyncIONOSClient:
+    """
+    Versione asyncio di IONOSClient
+
+    Espone gli stessi metodi come coroutine. Le richieste passano dal pool
+    di connessioni del client sincrono e vengono eseguite su un pool di
+    thread dedicato, con un limite globale di richieste in volo e uno per
+    zona, così migliaia di hostname su decine di zone procedono in
+    parallelo senza sovraccaricare l'API.
+    """
+
+    DEFAULT_CONCURRENCY = 16  # Richieste HTTP contemporanee in totale
+    DEFAULT_ZONE_CONCURRENCY = 4  # Richieste HTTP contemporanee per zona
+
+    def __init__(self, client: IONOSClient, concurrency: int = DEFAULT_CONCURRENCY,
+                 zone_concurrency: int = DEFAULT_ZONE_CONCURRENCY):
+        """
+        Args:
+            client: Client sincrono di cui usare sessione e cache delle zone
+            concurrency: Limite globale di richieste contemporanee
+            zone_concurrency: Limite di richieste contemporanee sulla stessa zona
+        """
+        self.client = client
+        self.concurrency = concurrency
+        self.zone_concurrency = zone_concurrency
+        from concurrent.futures import ThreadPoolExecutor
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ionos-api")
+        # I primitivi asyncio vanno creati dentro il loop che li usa
+        self._global: "Optional[asyncio.Semaphore]" = None
+        self._zones: "Dict[str, asyncio.Semaphore]" = {}
+        self._zones_lock: "Optional[asyncio.Lock]" = None
+
+    def close(self) -> None:
+        """Chiude il pool di thread e le connessioni"""
+        self._executor.shutdown(wait=True)
+        self.client.close()
+
+    async def _call(self, zone: Optional[str], func, *args, **kwargs):
+        """Esegue una chiamata del client sincrono rispettando i limiti di concorrenza"""
+        import asyncio
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.concurrency)
+        zone_limit = None
+        if zone is not None:
+            zone_limit = self._zones.get(zone)
+            if zone_limit is None:
+                zone_limit = self._zones[zone] = asyncio.Semaphore(self.zone_concurrency)
+
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        if zone_limit is None:
+            async with self._global:
+                return await loop.run_in_executor(self._executor, call)
+        async with zone_limit, self._global:
+            return await loop.run_in_executor(self._executor, call)
 
-        Returns:
-            Tuple[str, str]: (indirizzo_ip, tipo) dove tipo è 'A' per IPv4 o 'AAAA' per IPv6
-        """
-        # Prova prima con IPv4
-        for service in PublicIPDetector.IPV4_SERVICES:
-            try:
-                response = requests.get(service, timeout=5)
-                if response.status_code == 200:
-                    ip = response.text.strip()
-                    # Verifica che sia un IPv4 valido
-                    ipaddress.IPv4Address(ip)
-                    return ip, 'A'
-            except (requests.exceptions.RequestException, ValueError, ipaddress.AddressValueError):
-                # Ignora errori di rete o IP non validi e prova il prossimo servizio
-                continue
+    def _zone_key(self, domain: str) -> str:
+        """Chiave del limite per zona: l'ID se noto, così letture e scritture condividono il limite"""
+        return self.client._cached_zone_id(domain) or domain
 
-        # Se IPv4 fallisce, prova con IPv6
-        for service in PublicIPDetector.IPV6_SERVICES:
-            try:
-                response = requests.get(service, timeout=5)
-                if response.status_code == 200:
-                    ip = response.text.strip()
-                    # Verifica che sia un IPv6 valido
-                    ipaddress.IPv6Address(ip)
-                    return ip, 'AAAA'
-            except (requests.exceptions.RequestException, ValueError, ipaddress.AddressValueError):
-                # Ignora errori di rete o IP non validi e prova il prossimo servizio
-                continue
+    async def get_zones(self) -> list:
+        """Recupera tutte le zone DNS gestite"""
+        return await self._call(None, self.client.get_zones)
 
-        raise RuntimeError("Impossibile rilevare l'indirizzo IP pubblico")
+    async def get_zone_id(self, domain: str) -> Optional[str]:
+        """Trova l'ID della zona; la lista zone viene scaricata al più una volta"""
+        import asyncio
+        if self._zones_lock is None:
+            self._zones_lock = asyncio.Lock()
+        zone_id = self.client._cached_zone_id(domain)
+        if zone_id:
+            return zone_id
+        # Le ricerche concorrenti attendono la prima, che riempie la cache
+        async with self._zones_lock:
+            return await self._call(None, self.client.get_zone_id, domain)
 
+    async def get_zone(self, zone_id: str, record_name: Optional[str] = None,
+                       record_type: Optional[str] = None) -> Optional[Dict]:
+        """Recupera i dettagli di una zona DNS tramite ID"""
+        return await self._call(zone_id, self.client.get_zone, zone_id,
+                                record_name=record_name, record_type=record_type)
 
-class IONOSClient:
-    """Client per le API IONOS"""
+    async def create_record(self, domain: str, name: str, record_type: str, content: str, ttl: int = 3600):
+        """Crea un nuovo record DNS"""
+        return await self._call(self._zone_key(domain), self.client.create_record, domain, name, record_type, content, ttl)
 
-    BASE_URL = "https://api.hosting.ionos.com"
-    REQUEST_TIMEOUT = 30  # Timeout in secondi per le richieste HTTP
+    async def update_record(self, domain: str, name: str, record_type: str, new_content: str, record_id: str):
+        """Aggiorna un record DNS esistente"""
+        return await self._call(self._zone_key(domain), self.client.update_record, domain, name, record_type,
+                                new_content, record_id)
 
-    def __init__(self, pub_key: str, secret_key: str):
-        self.pub_key = pub_key
-        self.secret_key = secret_key
-        self.headers = {
-            "X-API-Key": f"{pub_key}.{secret_key}",
-            "Accept": "application/json",
-            "Content-Type": "application/json"
-        }
+    async def create_records(self, domain: str, records: List[Dict], ttl: int = 3600) -> list:
+        """Crea più record DNS della stessa zona con un'unica POST"""
+        return await self._call(self._zone_key(domain), self.client.create_records, domain, records, ttl)
 
-    def get_zones(self) -> list:
-        """Recupera tutte le zone DNS gestite"""
-        url = f"{self.BASE_URL}/dns/v1/zones"
-        response = requests.get(url, headers=self.headers, timeout=self.REQUEST_TIMEOUT)
-        response.raise_for_status()
-        return response.json()
+    async def update_records(self, domain: str, records: List[Dict]) -> Dict[str, Optional[str]]:
+        """Aggiorna più record DNS della stessa zona"""
+        return await self._call(self._zone_key(domain), self.client.update_records, domain, records)
 
-    def get_zone_id(self, domain: str) -> Optional[str]:
-        """
-        Trova l'ID della zona per un dominio specifico
 
-        Args:
-            domain: Nome del dominio (es. cauware.com)
+class AsyncDNSUpdater:
+    """
+    Versione asyncio di DNSUpdater.update_hosts
 
-        Returns:
-            ID della zona o None se non trovata
-        """
-        zones = self.get_zones()
-        for zone in zones:
-            if zone['name'] == domain:
-                return zone['id']
-        return None
+    Stesso comportamento e stessi esiti del metodo sincrono (rilevamento
+    unico dell'IP, raggruppamento per zona, scritture in blocco, stato
+    locale), ma le zone vengono lette e scritte in parallelo.
+    """
 
-    def get_zone(self, zone_id: str) -> Optional[Dict]:
+    def __init__(self, pub_key: str, secret_key: str,
+                 concurrency: int = AsyncIONOSClient.DEFAULT_CONCURRENCY,
+                 zone_concurrency: int = AsyncIONOSClient.DEFAULT_ZONE_CONCURRENCY,
+                 **updater_options):
         """
-        Recupera i dettagli di una zona DNS tramite ID
-
         Args:
-            zone_id: ID della zona
+            pub_key: Chiave pubblica API IONOS
+            secret_key: Chiave segreta API IONOS
+            concurrency: Limite globale di richieste contemporanee
+            zone_concurrency: Limite di richieste contemporanee sulla stessa zona
+            updater_options: Altre opzioni di DNSUpdater (state_file, ip_detector, base_url, ...)
+        """
+        # Il pool HTTP deve poter servire tutte le richieste in volo
+        if updater_options.get('transport') is None and updater_options.get('session') is None:
+            updater_options['transport'] = create_transport(pool_size=concurrency)
+        self.updater = DNSUpdater(pub_key, secret_key, **updater_options)
+        self.client = AsyncIONOSClient(self.updater.client, concurrency, zone_concurrency)
 
-        Returns:
-            Dict con i dettagli della zona o None se non trovata
+    @classmethod
+    def from_updater(cls, updater: DNSUpdater, concurrency: int = AsyncIONOSClient.DEFAULT_CONCURRENCY,
+                     zone_concurrency: int = AsyncIONOSClient.DEFAULT_ZONE_CONCURRENCY) -> 'AsyncDNSUpdater':
         """
-        url = f"{self.BASE_URL}/dns/v1/zones/{zone_id}"
-        try:
-            response = requests.get(url, headers=self.headers, timeout=self.REQUEST_TIMEOUT)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 404:
-                return None
-            raise
+        Crea la versione asyncio di un DNSUpdater già configurato
 
-    def get_records(self, zone_id: str) -> list:
-        """Recupera tutti i record DNS per una zona"""
-        zone = self.get_zone(zone_id)
-        if not zone:
-            return []
-        return zone.get('records', [])
+        Client, rilevatore, stato e metriche sono quelli di updater; il suo
+        pool HTTP dovrebbe avere almeno concurrency connessioni.
+        """
+        self = cls.__new__(cls)
+        self.updater = updater
+        self.client = AsyncIONOSClient(updater.client, concurrency, zone_concurrency)
+        return self
 
-    def create_record(self, domain: str, name: str, record_type: str, content: str, ttl: int = 3600):
+    def close(self) -> None:
+        self.client.close()
+        self.updater.close()
+
+    async def update_dns(self, hostname: str) -> List[Tuple[str, str, str, str]]:
+        """Aggiorna o crea i record DNS per un singolo hostname"""
+        return await self.update_hosts([hostname])
+
+    async def update_hosts(self, hostnames: List[str]) -> List[Tuple[str, str, str, str]]:
         """
-        Crea un nuovo record DNS
+        Aggiorna più hostname elaborando le zone in parallelo
 
-        Args:
-            domain: Dominio base (es. cauware.com)
-            name: Nome del record (es. dev01 per dev01.cauware.com)
-            record_type: Tipo di record ('A' o 'AAAA')
-            content: Indirizzo IP
-            ttl: Time to live in secondi
+        Returns:
+            Lista di (hostname, tipo record, IP, esito), come DNSUpdater.update_hosts
         """
-        # Trova l'ID della zona
-        zone_id = self.get_zone_id(domain)
-        if not zone_id:
-            raise ValueError(f"Dominio {domain} non trovato")
+        import asyncio
+        updater = self.updater
+        with updater._run_metrics() as results:
+            groups, errors = updater._group_hosts(hostnames)
+            results.extend(errors)
 
-        url = f"{self.BASE_URL}/dns/v1/zones/{zone_id}/records"
+            print("Rilevamento IP pubblico...")
+            loop = asyncio.get_running_loop()
+            addresses = await loop.run_in_executor(None, updater._detect_addresses)
+            print()
 
-        # Il nome completo deve includere il dominio
-        full_name = f"{name}.{domain}" if name else domain
+            zone_results = await asyncio.gather(*(
+                self._update_zone(domain, hosts, addresses) for domain, hosts in groups.items()
+            ))
+            for zone_result in zone_results:
+                results.extend(zone_result)
 
-        new_record = {
-            "name": full_name,
-            "rootName": domain,
-            "type": record_type,
-            "content": content,
-            "ttl": ttl,
-            "disabled": False
-        }
+            updater._print_summary(results)
+        return results
 
-        # Crea il record usando POST
-        response = requests.post(url, headers=self.headers, json=[new_record], timeout=self.REQUEST_TIMEOUT)
-        response.raise_for_status()
-        return response.json()
+    async def _update_zone(self, domain: str, hosts: List[Tuple[str, str]],
+                           addresses: Dict[str, str]) -> List[Tuple[str, str, str, str]]:
+        """Legge una zona e scrive in parallelo creazioni e aggiornamenti"""
+        import asyncio
+        updater = self.updater
+        pending, unchanged = updater._pending_records(hosts, addresses)
+        if not pending:
+            return unchanged
 
-    def update_record(self, domain: str, name: str, record_type: str, new_content: str, record_id: str):
-        """
-        Aggiorna un record DNS esistente
+        try:
+            zone_id = await self.client.get_zone_id(domain)
+            zone = await self.client.get_zone(zone_id, **updater._zone_filters(pending)) if zone_id else None
+        except Exception as e:
+            return unchanged + updater._zone_errors(domain, None, pending, error=e)
+        if not zone:
+            return unchanged + updater._zone_errors(domain, zone_id, pending)
 
-        Args:
-            domain: Dominio base
-            name: Nome del record
-            record_type: Tipo di record
-            new_content: Nuovo indirizzo IP
-            record_id: ID del record da aggiornare
-        """
-        # Trova l'ID della zona
-        zone_id = self.get_zone_id(domain)
-        if not zone_id:
-            raise ValueError(f"Dominio {domain} non trovato")
+        zone = Zone.from_api(zone_id, zone)
+        results, creates, updates = updater._plan_zone(domain, zone, pending)
+
+        async def create() -> list:
+            try:
+                created = await self.client.create_records(domain, updater._create_payload(creates))
+                return updater._apply_creates(zone, creates, created)
+            except Exception as e:
+                return updater._apply_creates(zone, creates, error=e, domain=domain)
 
-        url = f"{self.BASE_URL}/dns/v1/zones/{zone_id}/records/{record_id}"
+        async def update() -> list:
+            try:
+                errors = await self.client.update_records(domain, updater._update_payload(updates))
+            except Exception as e:
+                print(f"ERRORE: aggiornamento record in {domain}: {e}")
+                errors = {existing.id: str(e) for _, _, _, _, existing in updates}
+            return updater._apply_updates(zone, updates, errors)
 
-        # Il nome completo deve includere il dominio
-        full_name = f"{name}.{domain}" if name else domain
+        writes = ([create()] if creates else []) + ([update()] if updates else [])
+        for write_results in await asyncio.gather(*writes):
+            results.extend(write_results)
+        return unchanged + updater._order_results(results, pending)
 
-        updated_record = {
-            "name": full_name,
-            "rootName": domain,
-            "type": record_type,
-            "content": new_content,
-            "disabled": False
-        }
 
-        # Aggiorna il record usando PUT
-        response = requests.put(url, headers=self.headers, json=updated_record, timeout=self.REQUEST_TIMEOUT)
-        response.raise_for_status()
-        return response.json()
+class Daemon:
+    """
+    Esegue ciclicamente l'aggiornamento DNS in un unico processo
 
+    A differenza di cron, lo stesso DNSUpdater resta in vita tra un ciclo e
+    l'altro: pool HTTP, cache delle zone e ultimo IP pubblicato restano
+    caldi. SIGHUP ricarica la configurazione, SIGTERM/SIGINT terminano il
+    processo al termine del ciclo in corso.
+    """
 
-class DNSUpdater:
-    """Gestisce l'aggiornamento del DNS dinamico"""
+    DEFAULT_INTERVAL = 300  # Secondi tra un ciclo e l'altro
+    WATCH_INTERVAL = 3600  # Intervallo di sicurezza quando i cicli sono guidati dagli eventi netlink
+    DEFAULT_JITTER = 30  # Ritardo casuale massimo in secondi aggiunto all'intervallo
+    INTERVAL_GROWTH = 2.0  # Fattore di allungamento dell'intervallo a ogni ciclo con IP stabile
 
-    def __init__(self, pub_key: str, secret_key: str):
-        self.client = IONOSClient(pub_key, secret_key)
-        self.ip_detector = PublicIPDetector()
+    # Motivo dell'intervallo corrente -> descrizione nei log
+    INTERVAL_REASONS = {
+        "fixed": "intervallo fisso",
+        "start": "primo ciclo",
+        "stable": "IP stabile",
+        "changed": "IP cambiato",
+        "error": "errore nell'ultimo ciclo",
+    }
 
-    def update_dns(self, hostname: str) -> None:
+    def __init__(self, updater_factory: Callable[[], DNSUpdater], hostnames: List[str],
+                 interval: float = DEFAULT_INTERVAL, jitter: float = DEFAULT_JITTER,
+                 metrics_file: Optional[Path] = None, max_interval: Optional[float] = None,
+                 hostnames_factory: Optional[Callable[[], List[str]]] = None):
         """
-        Aggiorna o crea il record DNS per l'hostname specificato
-
         Args:
-            hostname: Hostname completo (es. dev01.cauware.com)
+            updater_factory: Funzione che legge la configurazione e crea il DNSUpdater
+            hostnames: Hostname completi da aggiornare
+            interval: Secondi tra un ciclo e l'altro (il minimo con max_interval)
+            jitter: Ritardo casuale massimo aggiunto a ogni intervallo
+            metrics_file: File textfile di node_exporter da riscrivere dopo ogni ciclo
+            max_interval: Se maggiore di interval, l'intervallo si allunga fino a
+                questo valore finché l'IP rilevato resta stabile e torna a interval
+                dopo un cambio o un errore
+            hostnames_factory: Funzione che rilegge gli hostname dalla configurazione a ogni
+                ricarica; se None restano quelli indicati in hostnames
         """
-        # Parse hostname
-        parts = hostname.split('.')
-        if len(parts) < 2:
-            raise ValueError(f"Hostname non valido: {hostname}. Deve essere completo di dominio (es. dev01.cauware.com)")
+        self.updater_factory = updater_factory
+        self.hostnames_factory = hostnames_factory
+        self.hostnames = list(hostnames)
+        self.interval = interval
+        self.jitter = jitter
+        self.metrics_file = metrics_file
+        self.max_interval = max(max_interval or interval, interval)
+        self.current_interval = interval
+        self.interval_reason = "start" if self.adaptive else "fixed"
+        self._last_addresses: Optional[Dict[str, str]] = None
+        self.updater: Optional[DNSUpdater] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._reload = False
 
-        # Estrae nome e dominio
-        record_name = parts[0]
-        domain = '.'.join(parts[1:])
+    def stop(self) -> None:
+        """Richiede la terminazione del daemon"""
+        self._stop.set()
+        self._wake.set()
 
-        print(f"Hostname: {hostname}")
-        print(f"Record: {record_name}")
-        print(f"Dominio: {domain}")
-        print()
+    def reload(self) -> None:
+        """Richiede la rilettura della configurazione prima del prossimo ciclo"""
+        self._reload = True
+        self._wake.set()
 
-        # Rileva IP pubblico
-        print("Rilevamento IP pubblico...")
-        current_ip, record_type = self.ip_detector.get_public_ip()
-        print(f"IP pubblico rilevato: {current_ip} (tipo: {record_type})")
-        print()
+    def trigger(self) -> None:
+        """Anticipa il prossimo ciclo senza attendere l'intervallo (es. su variazione degli indirizzi)"""
+        self._wake.set()
 
-        # Verifica se il dominio è gestito da IONOS
-        print(f"Verifica dominio {domain} su IONOS...")
-        zone_id = self.client.get_zone_id(domain)
+    def _handle_signal(self, signum, frame) -> None:
+        if signum == signal.SIGHUP:
+            print("Ricevuto SIGHUP: ricarico la configurazione", flush=True)
+            self.reload()
+        else:
+            print(f"Ricevuto segnale {signal.Signals(signum).name}: arresto in corso", flush=True)
+            self.stop()
 
-        if not zone_id:
-            print(f"ERRORE: Il dominio {domain} non è gestito da IONOS")
-            sys.exit(1)
+    def install_signal_handlers(self) -> None:
+        """Installa i gestori di SIGHUP, SIGTERM e SIGINT (solo dal thread principale)"""
+        signal.signal(signal.SIGHUP, self._handle_signal)
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
 
-        print(f"Dominio {domain} trovato su IONOS (ID: {zone_id})")
-        print()
+    def _reload_updater(self) -> None:
+        """
+        Ricrea il DNSUpdater e rilegge gli hostname
 
-        # Recupera la zona e i record
-        zone = self.client.get_zone(zone_id)
-        if not zone:
-            print(f"ERRORE: Impossibile recuperare i dettagli della zona")
-            sys.exit(1)
+        In caso di configurazione non valida mantiene quella attuale.
+        """
+        self._reload = False
+        try:
+            hostnames = self.hostnames
+            # Al primo avvio gli hostname sono già quelli letti dalla configurazione
+            if self.hostnames_factory is not None and self.updater is not None:
+                hostnames = list(self.hostnames_factory())
+                if not hostnames:
+                    raise ValueError("nessun hostname configurato")
+            updater = self.updater_factory()
+        except (Exception, SystemExit) as e:
+            if self.updater is None:
+                raise
+            print(f"ERRORE: configurazione non ricaricata, continuo con quella precedente ({e})", flush=True)
+            return
+        if self.updater is not None:
+            self.updater.close()
+            if hostnames != self.hostnames:
+                print(f"Hostname da aggiornare: {', '.join(hostnames)}", flush=True)
+        self.updater = updater
+        self.hostnames = hostnames
 
-        # Cerca il record esistente
-        records = zone.get('records', [])
-        existing_record = None
+    @property
+    def adaptive(self) -> bool:
+        """True se l'intervallo si adatta alla stabilità dell'IP"""
+        return self.max_interval > self.interval
 
-        # Il nome nel record include il dominio completo
-        full_hostname = f"{record_name}.{domain}"
+    def next_delay(self) -> float:
+        """Secondi di attesa prima del prossimo ciclo"""
+        return self.current_interval + random.uniform(0, self.jitter)
 
-        for record in records:
-            if record['name'] == full_hostname and record['type'] == record_type:
-                existing_record = record
-                break
+    def adapt_interval(self, succeeded: bool, addresses: Optional[Dict[str, str]]) -> None:
+        """
+        Aggiorna l'intervallo in base all'esito del ciclo appena concluso
 
-        # Aggiorna o crea il record
-        if existing_record:
-            existing_ip = existing_record['content']
-            record_id = existing_record['id']
-            print(f"Record {hostname} esistente trovato con IP: {existing_ip}")
+        Con IP stabile l'intervallo cresce di INTERVAL_GROWTH fino a
+        max_interval; un cambio di IP o un errore (es. rilevamento fallito)
+        lo riportano subito al minimo.
 
-            if existing_ip == current_ip:
-                print("L'IP è già aggiornato. Nessuna modifica necessaria.")
-            else:
-                print(f"Aggiornamento IP da {existing_ip} a {current_ip}...")
-                self.client.update_record(domain, record_name, record_type, current_ip, record_id)
-                print("Record aggiornato con successo!")
+        Args:
+            succeeded: False se il ciclo è terminato con un errore
+            addresses: Indirizzi rilevati nel ciclo (tipo record -> IP)
+        """
+        if not self.adaptive:
+            return
+        if not succeeded:
+            self.current_interval, self.interval_reason = self.interval, "error"
+            return
+        if self._last_addresses is None:
+            self.interval_reason = "start"
+        elif addresses != self._last_addresses:
+            self.current_interval, self.interval_reason = self.interval, "changed"
         else:
-            print(f"Record {hostname} non trovato. Creazione nuovo record...")
-            self.client.create_record(domain, record_name, record_type, current_ip)
-            print(f"Record {record_type} creato con successo per {hostname} -> {current_ip}")
+            self.current_interval = min(self.current_interval * self.INTERVAL_GROWTH, self.max_interval)
+            self.interval_reason = "stable"
+        self._last_addresses = addresses
+
+    def _record_interval(self) -> None:
+        """Espone nelle metriche l'intervallo corrente e il suo motivo"""
+        metrics = self.updater.metrics
+        metrics.set("ionos_ddns_poll_interval_seconds", self.current_interval)
+        for reason in self.INTERVAL_REASONS:
+            metrics.set("ionos_ddns_poll_interval_reason", 1 if reason == self.interval_reason else 0,
+                        reason=reason)
+
+    def run_cycle(self) -> None:
+        """Esegue un ciclo di aggiornamento; gli errori vengono registrati senza fermare il daemon"""
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Avvio ciclo di aggiornamento", flush=True)
+        succeeded = False
+        try:
+            if len(self.hostnames) == 1:
+                self.updater.update_dns(self.hostnames[0])
+                succeeded = True
+            else:
+                results = self.updater.update_hosts(self.hostnames)
+                succeeded = not any(outcome.startswith("errore") for _, _, _, outcome in results)
+        except (Exception, SystemExit) as e:
+            print(f"ERRORE: {e}")
+        if self.adaptive:
+            self.adapt_interval(succeeded, dict(self.updater.last_addresses))
+        self._record_interval()
+        if self.metrics_file:
+            self.updater.metrics.write_textfile(self.metrics_file)
+        sys.stdout.flush()
+
+    def run(self) -> None:
+        """Ciclo principale del daemon, termina dopo stop()"""
+        self._reload_updater()
+        while not self._stop.is_set():
+            if self._reload:
+                self._reload_updater()
+            # Le richieste arrivate durante il ciclo anticipano il successivo
+            self._wake.clear()
+            self.run_cycle()
+
+            if self._stop.is_set():
+                break
+            delay = self.next_delay()
+            print(f"Prossimo ciclo tra {delay:.0f} secondi "
+                  f"({self.INTERVAL_REASONS[self.interval_reason]})", flush=True)
+            self._wake.wait(delay)
+
+        if self.updater is not None:
+            self.updater.close()
 
 
 def load_config(config_path: Path) -> Dict:
@@ -296,6 +3653,19 @@ def load_config(config_path: Path) -> Dict:
         print("ERRORE: Chiavi 'pub' e 'secret' non trovate nel file dns.json")
         sys.exit(1)
 
+    # Servizi di rilevamento IP aggiuntivi, in coda a quelli predefiniti
+    for key in ('ipv4_services', 'ipv6_services'):
+        services = config.get(key, [])
+        if not isinstance(services, list) or not all(isinstance(service, str) for service in services):
+            print(f"ERRORE: La chiave '{key}' del file dns.json deve essere una lista di URL")
+            sys.exit(1)
+        for service in services:
+            try:
+                PublicIPDetector._check_service(service)
+            except ValueError as e:
+                print(f"ERRORE: {e}")
+                sys.exit(1)
+
     return config
 
 
@@ -308,31 +3678,357 @@ def main():
 Esempi:
   %(prog)s dev01.cauware.com
   %(prog)s server.example.com --config /path/to/dns.json
+  %(prog)s dev01.cauware.com dev02.cauware.com www.example.com
         """
     )
     parser.add_argument(
-        'hostname',
-        help='Hostname completo da aggiornare (es. dev01.cauware.com)'
+        'hostnames',
+        nargs='*',
+        metavar='hostname',
+        help='Hostname completi da aggiornare (es. dev01.cauware.com); '
+             'se omessi si usa la chiave "hostnames" del file di configurazione'
     )
     parser.add_argument(
         '--config',
         default='dns.json',
         help='Percorso del file di configurazione (default: dns.json)'
     )
+    parser.add_argument(
+        '--zone-cache',
+        metavar='FILE',
+        help='File in cui memorizzare gli ID delle zone tra un\'esecuzione e l\'altra'
+    )
+    parser.add_argument(
+        '--state-file',
+        metavar='FILE',
+        help='File di stato con l\'ultimo IP pubblicato: se l\'IP non cambia non si contatta IONOS'
+    )
+    parser.add_argument(
+        '--force-check-hours',
+        type=float,
+        default=DNSUpdater.FORCE_CHECK_INTERVAL / 3600,
+        metavar='N',
+        help='Verifica comunque il record su IONOS ogni N ore anche con IP invariato (default: 24)'
+    )
+    parser.add_argument(
+        '--detection-cache',
+        metavar='FILE',
+        help='Cache dell\'IP rilevato condivisa tra processi: più esecuzioni ravvicinate lo rilevano una volta sola'
+    )
+    parser.add_argument(
+        '--detection-cache-ttl',
+        type=float,
+        default=DetectionCache.TTL,
+        metavar='SECONDI',
+        help=f'Con --detection-cache, validità dell\'IP in cache (default: {DetectionCache.TTL})'
+    )
+    parser.add_argument(
+        '--service-stats',
+        metavar='FILE',
+        help='File con le statistiche dei servizi di rilevamento IP, usate per interrogare prima i più rapidi e affidabili'
+    )
+    parser.add_argument(
+        '--race',
+        action='store_true',
+        help='Interroga in parallelo tutti i servizi di rilevamento IP e usa la prima risposta valida'
+    )
+    parser.add_argument(
+        '--quorum',
+        type=int,
+        metavar='M',
+        help='Accetta l\'IP solo se almeno M servizi di rilevamento concordano (interrogati in parallelo)'
+    )
+    parser.add_argument(
+        '--quorum-size',
+        type=int,
+        metavar='K',
+        help='Con --quorum, servizi interrogati in parallelo (default: 2M-1)'
+    )
+    parser.add_argument(
+        '--dual-stack',
+        action='store_true',
+        help='Aggiorna sia il record A (IPv4) sia il record AAAA (IPv6)'
+    )
+    parser.add_argument(
+        '--local',
+        action='store_true',
+        help='Cerca l\'IP pubblico tra gli indirizzi delle interfacce locali prima dei servizi HTTP'
+    )
+    parser.add_argument(
+        '--interface',
+        action='append',
+        metavar='NOME',
+        help='Con --local o --watch, considera solo questa interfaccia (ripetibile, ammette ppp*)'
+    )
+    parser.add_argument(
+        '--prefix',
+        action='append',
+        metavar='CIDR',
+        help='Con --local o --watch, considera solo indirizzi in questa rete (ripetibile)'
+    )
+    parser.add_argument(
+        '--router',
+        action='store_true',
+        help='Chiede l\'IPv4 pubblico al router (UPnP IGD o NAT-PMP) prima dei servizi HTTP'
+    )
+    parser.add_argument(
+        '--router-cache',
+        metavar='FILE',
+        help='File in cui ricordare il router trovato tra un\'esecuzione e l\'altra (implica --router)'
+    )
+    parser.add_argument(
+        '--stun',
+        action='store_true',
+        help='Interroga server STUN pubblici (UDP, una sola richiesta) prima dei servizi HTTP'
+    )
+    parser.add_argument(
+        '--stun-server',
+        action='append',
+        metavar='HOST[:PORTA]',
+        help='Server STUN da usare al posto di quelli predefiniti (ripetibile, implica --stun)'
+    )
+    parser.add_argument(
+        '--dns',
+        choices=sorted(DNSDetector.PROVIDERS),
+        help='Rileva l\'IP con una query DNS su UDP (OpenDNS o Google) prima dei servizi HTTP'
+    )
+    parser.add_argument(
+        '--dns-resolver',
+        action='append',
+        metavar='IP',
+        help='Con --dns, resolver da interrogare al posto di quello del provider (uno per famiglia, ripetibile)'
+    )
+    parser.add_argument(
+        '--dns-name',
+        metavar='NOME',
+        help='Con --dns, nome da interrogare al posto di quello del provider'
+    )
+    parser.add_argument(
+        '--dns-type',
+        choices=sorted(DNS_TYPES),
+        help='Con --dns, tipo di record da chiedere (default: A/AAAA per OpenDNS, TXT per Google)'
+    )
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='Resta in esecuzione e aggiorna il DNS periodicamente (SIGHUP ricarica la configurazione)'
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Come --daemon, ma aggiorna subito quando cambiano gli indirizzi delle interfacce locali'
+    )
+    parser.add_argument(
+        '--interval',
+        type=float,
+        metavar='SECONDI',
+        help='Con --daemon, intervallo tra due aggiornamenti (default: 300; 3600 con --watch)'
+    )
+    parser.add_argument(
+        '--max-interval',
+        type=float,
+        metavar='SECONDI',
+        help='Con --daemon, allunga l\'intervallo fino a SECONDI finché l\'IP resta stabile; '
+             'dopo un cambio di IP o un errore torna a --interval'
+    )
+    parser.add_argument(
+        '--jitter',
+        type=float,
+        default=Daemon.DEFAULT_JITTER,
+        metavar='SECONDI',
+        help='Con --daemon, ritardo casuale massimo aggiunto all\'intervallo (default: 30)'
+    )
+    parser.add_argument(
+        '--transport',
+        choices=sorted(TRANSPORTS),
+        default=DEFAULT_TRANSPORT,
+        help='Libreria HTTP da usare: urllib (solo libreria standard, avvio più rapido) o requests (default: urllib)'
+    )
+    parser.add_argument(
+        '--rate-limit',
+        type=float,
+        default=IONOSClient.RATE_LIMIT,
+        metavar='RICHIESTE',
+        help='Richieste al secondo inviate al massimo alle API IONOS (default: 10; 0 per nessun limite)'
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        metavar='N',
+        help='Con più hostname, elabora le zone in parallelo con al massimo N richieste contemporanee'
+    )
+    parser.add_argument(
+        '--zone-concurrency',
+        type=int,
+        default=AsyncIONOSClient.DEFAULT_ZONE_CONCURRENCY,
+        metavar='N',
+        help='Con --concurrency, richieste contemporanee massime sulla stessa zona (default: 4)'
+    )
+    parser.add_argument(
+        '--metrics-file',
+        metavar='FILE',
+        help='Scrive le metriche in formato Prometheus in FILE (collector textfile di node_exporter, es. '
+             '/var/lib/node_exporter/textfile_collector/ionos_ddns.prom)'
+    )
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        metavar='PORTA',
+        help='Con --daemon, espone le metriche su http://INDIRIZZO:PORTA/metrics'
+    )
+    parser.add_argument(
+        '--metrics-address',
+        default='127.0.0.1',
+        metavar='INDIRIZZO',
+        help='Con --metrics-port, indirizzo su cui ascoltare (default: 127.0.0.1)'
+    )
 
     args = parser.parse_args()
-
-    # Carica configurazione
     config_path = Path(args.config)
-    config = load_config(config_path)
+
+    def load_hostnames() -> List[str]:
+        return load_config(config_path).get('hostnames', [])
+
+    hostnames = args.hostnames or load_hostnames()
+    if not hostnames:
+        parser.error("specificare almeno un hostname (da riga di comando o con la chiave \"hostnames\" nel file di configurazione)")
+    if args.metrics_port is not None and not (args.daemon or args.watch):
+        parser.error("--metrics-port richiede --daemon o --watch")
+
+    # Un solo registro per processo: in modalità daemon sopravvive alle ricariche della configurazione
+    metrics = Metrics()
+    # Come le metriche, le statistiche dei servizi sopravvivono tra i cicli del daemon
+    service_stats = ServiceStats(args.service_stats)
+    detection_cache = DetectionCache(args.detection_cache, args.detection_cache_ttl) if args.detection_cache else None
+
+    backends = []
+    if args.local or args.interface or args.prefix:
+        backends.append(LocalInterfaceDetector(interfaces=args.interface, prefixes=args.prefix))
+    if args.router or args.router_cache:
+        backends.append(RouterDetector(cache_file=args.router_cache))
+    if args.dns:
+        try:
+            backends.append(DNSDetector(args.dns, resolvers=args.dns_resolver,
+                                        query_name=args.dns_name, record_type=args.dns_type))
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.dns_resolver or args.dns_name or args.dns_type:
+        parser.error("--dns-resolver, --dns-name e --dns-type richiedono --dns")
+
+    if args.quorum is not None:
+        if args.race:
+            parser.error("--quorum e --race non possono essere usati insieme")
+        if backends:
+            parser.error("--quorum non può essere usato con --local, --interface, --prefix, --router o --dns")
+        quorum_size = args.quorum_size if args.quorum_size is not None else 2 * args.quorum - 1
+        if args.quorum < 1 or quorum_size < args.quorum:
+            parser.error("--quorum deve essere almeno 1 e non superiore a --quorum-size")
+    elif args.quorum_size is not None:
+        parser.error("--quorum-size richiede --quorum")
+
+    stun_servers = None
+    if args.stun_server:
+        stun_servers = [server if server.startswith("stun:") else f"stun:{server}" for server in args.stun_server]
+        for server in stun_servers:
+            try:
+                parse_stun_uri(server)
+            except ValueError as e:
+                parser.error(str(e))
+    elif args.stun:
+        stun_servers = PublicIPDetector.STUN_SERVERS
+
+    def make_updater(pool_size: int = IONOSClient.POOL_SIZE) -> DNSUpdater:
+        # Carica configurazione
+        config = load_config(config_path)
+        return DNSUpdater(
+            config['pub'], config['secret'],
+            zone_cache_file=args.zone_cache,
+            state_file=args.state_file,
+            force_check_interval=args.force_check_hours * 3600,
+            ip_detector=PublicIPDetector(race=args.race, quorum=args.quorum, quorum_size=args.quorum_size,
+                                         backends=backends, stun_servers=stun_servers,
+                                         ipv4_services=config.get('ipv4_services'),
+                                         ipv6_services=config.get('ipv6_services'), stats=service_stats,
+                                         cache=detection_cache,
+                                         transport=create_transport(args.transport), metrics=metrics),
+            dual_stack=args.dual_stack,
+            rate_limit=args.rate_limit,
+            transport=create_transport(args.transport, pool_size=pool_size),
+            metrics=metrics
+        )
+
+    if args.daemon or args.watch:
+        interval = args.interval
+        if interval is None:
+            interval = Daemon.WATCH_INTERVAL if args.watch else Daemon.DEFAULT_INTERVAL
+        if args.max_interval is not None and args.max_interval < interval:
+            parser.error("--max-interval deve essere maggiore o uguale all'intervallo")
+        # Gli hostname indicati da riga di comando non cambiano alla ricarica della configurazione
+        daemon = Daemon(make_updater, hostnames, interval=interval, jitter=args.jitter,
+                        metrics_file=args.metrics_file, max_interval=args.max_interval,
+                        hostnames_factory=None if args.hostnames else load_hostnames)
+        daemon.install_signal_handlers()
+
+        metrics_server = None
+        if args.metrics_port is not None:
+            try:
+                metrics_server = MetricsServer(metrics, args.metrics_address, args.metrics_port).start()
+                print(f"Metriche disponibili su http://{args.metrics_address}:{metrics_server.port}/metrics")
+            except OSError as e:
+                print(f"ATTENZIONE: impossibile esporre le metriche sulla porta {args.metrics_port}: {e}")
+
+        watcher = None
+        if args.watch:
+            watcher = AddressWatcher(
+                daemon.trigger,
+                detector=LocalInterfaceDetector(interfaces=args.interface, prefixes=args.prefix)
+            )
+            try:
+                watcher.start()
+            except OSError as e:
+                print(f"ATTENZIONE: notifiche netlink non disponibili ({e}), uso solo il polling")
+                watcher = None
+
+        daemon.run()
+        if watcher is not None:
+            watcher.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        return
+
+    if args.concurrency and len(hostnames) > 1:
+        # Il pool HTTP deve poter servire tutte le richieste in volo
+        async_updater = AsyncDNSUpdater.from_updater(make_updater(pool_size=args.concurrency),
+                                                     args.concurrency, args.zone_concurrency)
+        import asyncio
+        try:
+            results = asyncio.run(async_updater.update_hosts(hostnames))
+        except Exception as e:
+            print(f"ERRORE: {e}")
+            sys.exit(1)
+        finally:
+            async_updater.close()
+            if args.metrics_file:
+                metrics.write_textfile(args.metrics_file)
+        if any(outcome.startswith("errore") for _, _, _, outcome in results):
+            sys.exit(1)
+        return
 
     try:
         # Esegue l'aggiornamento
-        updater = DNSUpdater(config['pub'], config['secret'])
-        updater.update_dns(args.hostname)
+        updater = make_updater()
+        if len(hostnames) == 1:
+            updater.update_dns(hostnames[0])
+        else:
+            results = updater.update_hosts(hostnames)
+            if any(outcome.startswith("errore") for _, _, _, outcome in results):
+                sys.exit(1)
     except Exception as e:
         print(f"ERRORE: {e}")
         sys.exit(1)
+    finally:
+        if args.metrics_file:
+            metrics.write_textfile(args.metrics_file)
 
 
 if __name__ == '__main__':
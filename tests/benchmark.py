@@ -0,0 +1,225 @@
+"""
+Benchmark di DNSUpdater su scenari fissi, confrontati con una baseline
+
+Ogni scenario esegue DNSUpdater dall'inizio alla fine contro i server finti
+di tests/fake_ionos.py (API IONOS e servizi IP) e misura:
+    - tempo totale
+    - richieste HTTP per endpoint (API e servizi IP)
+    - byte trasferiti (corpi di richieste e risposte)
+    - picco di memoria (tracemalloc; include il server finto, che gira nello stesso processo)
+
+I risultati vengono confrontati con tests/benchmark_baseline.json: una
+richiesta in più su un endpoint, o una crescita oltre la tolleranza di
+byte, memoria o tempo, è una regressione. Tempo e memoria dipendono dal
+carico della macchina: vengono confrontati solo da questo comando, mentre
+test_benchmark.py verifica le sole misure deterministiche (richieste e byte).
+
+Uso:
+    python -m tests.benchmark                     # esegue e confronta
+    python -m tests.benchmark --update-baseline   # riscrive la baseline
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple
+
+from ionos_ddns import DNSUpdater, PublicIPDetector, StateStore, UrllibTransport
+from tests.fake_ionos import FakeIONOSServer, FakeIPEchoServer
+
+BASELINE_FILE = Path(__file__).with_name("benchmark_baseline.json")
+
+NEW_IP = "203.0.113.42"
+NEW_IPV6 = "2001:db8::42"
+
+# Tolleranze rispetto alla baseline: (fattore, margine assoluto)
+TOLERANCES = {
+    "bytes": (1.10, 512),
+}
+
+# Tolleranze delle misure che dipendono dal carico della macchina (solo da riga di comando)
+RESOURCE_TOLERANCES = {
+    "peak_memory": (1.50, 256 * 1024),
+    "wall_time": (3.0, 0.25),
+}
+
+
+class BenchmarkEnv(NamedTuple):
+    """Server finti e directory di lavoro di uno scenario"""
+    api: FakeIONOSServer
+    ipv4: FakeIPEchoServer
+    ipv6: FakeIPEchoServer
+    workdir: Path
+
+    def updater(self, **options) -> DNSUpdater:
+        detector = PublicIPDetector(transport=UrllibTransport())
+        detector.IPV4_SERVICES = [self.ipv4.url]
+        detector.IPV6_SERVICES = [self.ipv6.url]
+        options.setdefault("rate_limit", None)
+        return DNSUpdater("pub", "secret", base_url=self.api.url, transport=UrllibTransport(),
+                          ip_detector=detector, **options)
+
+
+# Ogni scenario prepara i server e restituisce la funzione da misurare
+
+def unchanged_ip(env: BenchmarkEnv) -> Callable[[], None]:
+    """IP invariato rispetto allo stato locale: nessuna chiamata all'API"""
+    env.api.populate(1, 1, content=NEW_IP)
+    state_file = env.workdir / "state.json"
+    StateStore(state_file).set("host0.example0.com", "A", NEW_IP, "record-0-0", "zone-0")
+    return lambda: env.updater(state_file=state_file).update_dns("host0.example0.com")
+
+
+def changed_ip(env: BenchmarkEnv) -> Callable[[], None]:
+    """Record esistente con IP diverso"""
+    env.api.populate(1, 10)
+    return lambda: env.updater().update_dns("host0.example0.com")
+
+
+def new_record(env: BenchmarkEnv) -> Callable[[], None]:
+    """Record da creare"""
+    env.api.populate(1, 10)
+    return lambda: env.updater().update_dns("new.example0.com")
+
+
+def large_zone(env: BenchmarkEnv) -> Callable[[], None]:
+    """Un hostname in una zona da 20000 record"""
+    env.api.populate(1, 20_000)
+    return lambda: env.updater().update_dns("host123.example0.com")
+
+
+def many_hosts(env: BenchmarkEnv) -> Callable[[], None]:
+    """200 hostname su 20 zone, tutti da aggiornare"""
+    env.api.populate(20, 10)
+    hostnames = [f"host{j}.example{i}.com" for i in range(20) for j in range(10)]
+    return lambda: env.updater().update_hosts(hostnames)
+
+
+def dual_stack(env: BenchmarkEnv) -> Callable[[], None]:
+    """Dual-stack: record A da aggiornare e AAAA da creare"""
+    env.api.populate(1, 10)
+    return lambda: env.updater(dual_stack=True).update_dns("host0.example0.com")
+
+
+SCENARIOS: Dict[str, Callable[[BenchmarkEnv], Callable[[], None]]] = {
+    "unchanged_ip": unchanged_ip,
+    "changed_ip": changed_ip,
+    "new_record": new_record,
+    "large_zone": large_zone,
+    "many_hosts": many_hosts,
+    "dual_stack": dual_stack,
+}
+
+
+def run_scenario(name: str) -> Dict:
+    """
+    Esegue uno scenario e ne restituisce le misure
+
+    Returns:
+        Dict con wall_time (s), requests ("api|ip METODO endpoint" -> numero),
+        bytes e peak_memory (byte)
+    """
+    with contextlib.ExitStack() as stack:
+        api = stack.enter_context(FakeIONOSServer())
+        ipv4 = stack.enter_context(FakeIPEchoServer(NEW_IP))
+        ipv6 = stack.enter_context(FakeIPEchoServer(NEW_IPV6))
+        workdir = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+        run = SCENARIOS[name](BenchmarkEnv(api, ipv4, ipv6, workdir))
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run()
+        wall_time = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        requests = {f"api {key}": count for key, count in api.by_endpoint().items()}
+        for label, server in (("ip", ipv4), ("ip", ipv6)):
+            for key, count in server.by_endpoint().items():
+                requests[f"{label} {key}"] = requests.get(f"{label} {key}", 0) + count
+        servers = (api, ipv4, ipv6)
+        return {
+            "wall_time": round(wall_time, 4),
+            "requests": dict(sorted(requests.items())),
+            "bytes": sum(server.bytes_in + server.bytes_out for server in servers),
+            "peak_memory": peak_memory,
+        }
+
+
+def compare(result: Dict, baseline: Dict, resources: bool = False) -> List[str]:
+    """
+    Confronta le misure di uno scenario con la baseline
+
+    Args:
+        result: Misure restituite da run_scenario
+        baseline: Misure di riferimento dello scenario
+        resources: Se True confronta anche tempo e memoria, che variano con il carico della macchina
+
+    Returns:
+        Descrizione delle regressioni (lista vuota se nessuna)
+    """
+    regressions = []
+    for endpoint, count in result["requests"].items():
+        expected = baseline["requests"].get(endpoint, 0)
+        if count > expected:
+            regressions.append(f"{endpoint}: {count} richieste (baseline {expected})")
+    tolerances = {**TOLERANCES, **RESOURCE_TOLERANCES} if resources else TOLERANCES
+    for metric, (factor, margin) in tolerances.items():
+        limit = baseline[metric] * factor + margin
+        if result[metric] > limit:
+            regressions.append(f"{metric}: {result[metric]} oltre il limite {limit:g} (baseline {baseline[metric]})")
+    return regressions
+
+
+def load_baseline(path: Path = BASELINE_FILE) -> Dict[str, Dict]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark di DNSUpdater contro server finti")
+    parser.add_argument("scenarios", nargs="*", metavar="SCENARIO",
+                        help=f"Scenari da eseguire (default: tutti): {', '.join(SCENARIOS)}")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Salva i risultati come nuova baseline invece di confrontarli")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"scenari sconosciuti: {', '.join(unknown)}")
+
+    names = args.scenarios or list(SCENARIOS)
+    results = {name: run_scenario(name) for name in names}
+    baseline = load_baseline(args.baseline) if args.baseline.exists() else {}
+
+    failed = False
+    for name, result in results.items():
+        requests = sum(result["requests"].values())
+        print(f"{name:<14} {result['wall_time'] * 1000:8.1f} ms  {requests:4d} richieste  "
+              f"{result['bytes']:9d} byte  {result['peak_memory'] / 1024:8.0f} KiB")
+        if args.update_baseline:
+            continue
+        if name not in baseline:
+            print("  nessuna baseline per questo scenario")
+            continue
+        for regression in compare(result, baseline[name], resources=True):
+            failed = True
+            print(f"  REGRESSIONE {regression}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            # Indentata per rendere leggibili le differenze in revisione
+            json.dump({**baseline, **results}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline aggiornata: {args.baseline}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,44 @@
 """Configurazione pytest"""
+import time
+
 import pytest
+import ionos_ddns
+from ionos_ddns import HTTPResponse, TransportError
+
+
+@pytest.fixture(autouse=True)
+def requests_transport(monkeypatch):
+    """
+    Usa il trasporto requests come predefinito
+
+    I test simulano le API con la libreria responses, che intercetta solo
+    le richieste fatte con requests; il trasporto urllib ha test dedicati.
+    """
+    monkeypatch.setattr(ionos_ddns, "DEFAULT_TRANSPORT", "requests")
+
+
+@pytest.fixture
+def ip_service_transport(mocker):
+    """
+    Crea trasporti finti per i servizi di rilevamento IP
+
+    make(answers, delays) restituisce un trasporto che per ogni URL risponde
+    con l'IP indicato in answers (None per un errore di rete), dopo il
+    ritardo opzionale indicato in delays.
+    """
+    def make(answers, delays=None):
+        transport = mocker.Mock()
+
+        def request(method, url, **kwargs):
+            time.sleep((delays or {}).get(url, 0))
+            if answers.get(url) is None:
+                raise TransportError(f"{url}: connessione rifiutata")
+            return HTTPResponse(200, {}, answers[url].encode(), url)
+
+        transport.request.side_effect = request
+        return transport
+
+    return make
 
 
 @pytest.fixture
@@ -0,0 +1,502 @@
+"""
+Server finti per test di carico e benchmark offline
+
+FakeIONOSServer imita gli endpoint /dns/v1/zones usati da IONOSClient con
+un archivio delle zone in memoria; FakeIPEchoServer imita i servizi che
+restituiscono l'IP pubblico. Entrambi girano su localhost e permettono di
+simulare latenza, errori e limiti di frequenza, tenendo il conto delle
+richieste ricevute e dei byte trasferiti.
+
+Uso da riga di comando:
+    python -m tests.fake_ionos --zones 500 --records 100 --latency 0.05 --rate-limit 20
+"""
+import argparse
+import itertools
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+
+class RequestRecord(NamedTuple):
+    """Richiesta ricevuta da un server finto"""
+    method: str
+    endpoint: str  # Percorso normalizzato, es. /dns/v1/zones/{zoneId}
+    path: str
+    status: int
+    bytes_in: int
+    bytes_out: int
+    duration: float
+
+
+class FakeResponse(NamedTuple):
+    status: int
+    body: Union[bytes, dict, list, None] = None
+    headers: Dict[str, str] = {}
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Header e corpo partono con scritture separate: senza TCP_NODELAY il delayed ACK
+    # del client aggiungerebbe ~40 ms a ogni risposta su una connessione keep-alive
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        self.server.dispatch(self)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    """
+    Base dei server finti: latenza, errori, limite di frequenza e contabilità
+
+    Le sottoclassi implementano endpoint() e route().
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency: Union[float, Tuple[float, float]] = 0.0, error_rate: float = 0.0,
+                 rate_limit: Optional[float] = None, burst: Optional[float] = None,
+                 retry_after: Optional[float] = 1.0, seed: Optional[int] = None, port: int = 0):
+        """
+        Args:
+            latency: Ritardo in secondi per ogni risposta, o intervallo (min, max)
+            error_rate: Probabilità che una richiesta fallisca con 503
+            rate_limit: Richieste al secondo accettate (token bucket); oltre si risponde 429
+            burst: Richieste consecutive accettate senza attesa (default: max(1, rate_limit))
+            retry_after: Valore dell'header Retry-After sulle risposte 429 (None per ometterlo)
+            seed: Seme per la casualità di latenza ed errori (risultati riproducibili)
+            port: Porta su cui ascoltare (0 per una porta libera)
+        """
+        super().__init__(("127.0.0.1", port), _FakeHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.burst = burst if burst is not None else max(1.0, rate_limit or 1.0)
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self._tokens = self.burst
+        self._refilled = time.monotonic()
+        self._failures: List[list] = []
+        self._thread: Optional[threading.Thread] = None
+        self._connections = set()
+        self.reset_stats()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "FakeHTTPServer":
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05},
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self.shutdown()
+            self._thread = None
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self._connections.add(request)
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request):
+        with self.lock:
+            self._connections.discard(request)
+        super().shutdown_request(request)
+
+    def close_connections(self) -> int:
+        """
+        Chiude le connessioni keep-alive aperte senza avvisare i client
+
+        Simula la scadenza del keep-alive lato server, ad esempio durante
+        la pausa tra due cicli del daemon. Restituisce le connessioni chiuse.
+        """
+        with self.lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        return len(connections)
+
+    # Contabilità
+
+    def reset_stats(self) -> None:
+        """Azzera il registro delle richieste e i contatori"""
+        with self.lock:
+            self.log: List[RequestRecord] = []
+            self.in_flight = 0
+            self.max_in_flight = 0
+            self.zone_in_flight: Dict[str, int] = {}
+            self.max_zone_in_flight: Dict[str, int] = {}
+
+    def count(self, method: Optional[str] = None, endpoint: Optional[str] = None,
+              status: Optional[int] = None) -> int:
+        """Numero di richieste ricevute, eventualmente filtrate per metodo, endpoint e stato"""
+        with self.lock:
+            return sum(1 for r in self.log
+                       if (method is None or r.method == method)
+                       and (endpoint is None or r.endpoint == endpoint)
+                       and (status is None or r.status == status))
+
+    def by_endpoint(self) -> Dict[str, int]:
+        """Richieste per "METODO endpoint" """
+        counts: Dict[str, int] = {}
+        with self.lock:
+            for r in self.log:
+                key = f"{r.method} {r.endpoint}"
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    @property
+    def bytes_in(self) -> int:
+        with self.lock:
+            return sum(r.bytes_in for r in self.log)
+
+    @property
+    def bytes_out(self) -> int:
+        with self.lock:
+            return sum(r.bytes_out for r in self.log)
+
+    # Iniezione di errori
+
+    def fail(self, status: int = 500, method: Optional[str] = None, endpoint: Optional[str] = None,
+             times: int = 1, headers: Optional[Dict[str, str]] = None, body=None) -> None:
+        """
+        Fa fallire le prossime `times` richieste corrispondenti
+
+        Args:
+            status: Stato HTTP da restituire
+            method: Metodo a cui applicare l'errore (None per tutti)
+            endpoint: Endpoint normalizzato a cui applicare l'errore (None per tutti)
+            times: Numero di richieste da far fallire
+            headers: Header aggiuntivi della risposta (es. Retry-After)
+        """
+        with self.lock:
+            self._failures.append([method, endpoint, times, FakeResponse(status, body, headers or {})])
+
+    def _injected(self, method: str, endpoint: str) -> Optional[FakeResponse]:
+        with self.lock:
+            for failure in self._failures:
+                fail_method, fail_endpoint, times, response = failure
+                if (fail_method in (None, method)) and (fail_endpoint in (None, endpoint)):
+                    failure[2] -= 1
+                    if failure[2] <= 0:
+                        self._failures.remove(failure)
+                    return response
+            if self.error_rate and self.random.random() < self.error_rate:
+                return FakeResponse(503, {"message": "injected error"})
+            if self.rate_limit and not self._take_token():
+                headers = {"Retry-After": f"{self.retry_after:g}"} if self.retry_after is not None else {}
+                return FakeResponse(429, {"message": "rate limit exceeded"}, headers)
+        return None
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate_limit)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _delay(self) -> float:
+        if isinstance(self.latency, tuple):
+            with self.lock:
+                return self.random.uniform(*self.latency)
+        return self.latency
+
+    # Gestione delle richieste
+
+    def endpoint(self, path: str) -> Tuple[str, Optional[str]]:
+        """Restituisce (endpoint normalizzato, chiave di concorrenza o None)"""
+        return path, None
+
+    def route(self, method: str, path: str, query: Dict[str, List[str]], body, headers) -> FakeResponse:
+        raise NotImplementedError
+
+    def dispatch(self, handler: BaseHTTPRequestHandler) -> None:
+        start = time.monotonic()
+        parts = urlsplit(handler.path)
+        length = int(handler.headers.get("Content-Length") or 0)
+        raw = handler.rfile.read(length) if length else b""
+        endpoint, key = self.endpoint(parts.path)
+
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            if key is not None:
+                self.zone_in_flight[key] = self.zone_in_flight.get(key, 0) + 1
+                self.max_zone_in_flight[key] = max(self.max_zone_in_flight.get(key, 0),
+                                                   self.zone_in_flight[key])
+        try:
+            delay = self._delay()
+            if delay:
+                time.sleep(delay)
+            response = self._injected(handler.command, endpoint)
+            if response is None:
+                try:
+                    body = json.loads(raw) if raw else None
+                except ValueError:
+                    response = FakeResponse(400, {"message": "invalid JSON"})
+                else:
+                    response = self.route(handler.command, parts.path, parse_qs(parts.query),
+                                          body, handler.headers)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+                if key is not None:
+                    self.zone_in_flight[key] -= 1
+
+        data = response.body
+        content_type = "application/json"
+        if isinstance(data, bytes):
+            content_type = "text/plain"
+        elif data is not None:
+            data = json.dumps(data).encode()
+        data = data or b""
+        # Registra prima di rispondere: il client non deve vedere la risposta prima del log
+        with self.lock:
+            self.log.append(RequestRecord(handler.command, endpoint, handler.path, response.status,
+                                          length, len(data), time.monotonic() - start))
+        handler.send_response(response.status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(data)))
+        for name, value in response.headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+class FakeIONOSServer(FakeHTTPServer):
+    """
+    Finto server dell'API DNS di IONOS
+
+    Implementa gli endpoint usati da IONOSClient:
+        GET   /dns/v1/zones
+        GET   /dns/v1/zones/{zoneId}                       (filtri recordName, recordType)
+        PATCH /dns/v1/zones/{zoneId}
+        POST  /dns/v1/zones/{zoneId}/records
+        PUT   /dns/v1/zones/{zoneId}/records/{recordId}
+    """
+
+    ZONES = "/dns/v1/zones"
+
+    def __init__(self, api_key: Optional[str] = None, **options):
+        """
+        Args:
+            api_key: Se indicata, le richieste senza X-API-Key uguale ricevono 401
+            options: Opzioni di FakeHTTPServer (latency, error_rate, rate_limit, ...)
+        """
+        super().__init__(**options)
+        self.api_key = api_key
+        # zone_id -> {"id", "name", "type", "records": {record_id: record}}
+        self.zones: Dict[str, Dict] = {}
+        self._ids = itertools.count(1)
+
+    # Archivio delle zone
+
+    def _next_id(self, prefix: str) -> str:
+        return f"{prefix}-{next(self._ids)}"
+
+    def add_zone(self, name: str, records=(), zone_id: Optional[str] = None) -> str:
+        """
+        Aggiunge una zona
+
+        Args:
+            name: Dominio della zona (es. example.com)
+            records: Record iniziali, come tuple (nome, tipo, contenuto) o dict
+            zone_id: ID della zona (default: generato)
+        """
+        with self.lock:
+            zone_id = zone_id or self._next_id("zone")
+            self.zones[zone_id] = {"id": zone_id, "name": name, "type": "NATIVE", "records": {}}
+        for record in records:
+            if isinstance(record, dict):
+                self.add_record(zone_id, **record)
+            else:
+                self.add_record(zone_id, *record)
+        return zone_id
+
+    def add_record(self, zone_id: str, name: str, type: str, content: str, ttl: int = 3600,
+                   id: Optional[str] = None, **extra) -> str:
+        """Aggiunge un record a una zona e ne restituisce l'ID"""
+        with self.lock:
+            zone = self.zones[zone_id]
+            record_id = id or self._next_id("record")
+            zone["records"][record_id] = {
+                "id": record_id, "name": name, "rootName": zone["name"], "type": type,
+                "content": content, "ttl": ttl, "disabled": False, **extra
+            }
+            return record_id
+
+    def populate(self, zones: int, records_per_zone: int, content: str = "198.51.100.1",
+                 record_type: str = "A") -> List[str]:
+        """
+        Crea zone example{i}.com con i record host{j}.example{i}.com
+
+        Returns:
+            Domini creati
+        """
+        domains = []
+        for i in range(zones):
+            domain = f"example{i}.com"
+            zone_id = self.add_zone(domain, zone_id=f"zone-{i}")
+            for j in range(records_per_zone):
+                self.add_record(zone_id, f"host{j}.{domain}", record_type, content, id=f"record-{i}-{j}")
+            domains.append(domain)
+        return domains
+
+    def records(self, zone_id: str) -> List[Dict]:
+        """Copia dei record di una zona"""
+        with self.lock:
+            return [dict(record) for record in self.zones[zone_id]["records"].values()]
+
+    def find_record(self, name: str, type: str) -> Optional[Dict]:
+        """Cerca un record per nome completo e tipo in tutte le zone"""
+        with self.lock:
+            for zone in self.zones.values():
+                for record in zone["records"].values():
+                    if record["name"] == name and record["type"] == type:
+                        return dict(record)
+        return None
+
+    # Routing
+
+    def endpoint(self, path: str) -> Tuple[str, Optional[str]]:
+        if not path.startswith(self.ZONES):
+            return path, None
+        parts = path.rstrip("/").split("/")[4:]  # dopo /dns/v1/zones
+        templates = [self.ZONES, f"{self.ZONES}/{{zoneId}}", f"{self.ZONES}/{{zoneId}}/records",
+                     f"{self.ZONES}/{{zoneId}}/records/{{recordId}}"]
+        template = templates[len(parts)] if len(parts) < len(templates) else path
+        return template, parts[0] if parts else None
+
+    def route(self, method, path, query, body, headers) -> FakeResponse:
+        if self.api_key is not None and headers.get("X-API-Key") != self.api_key:
+            return FakeResponse(401, {"message": "unauthorized"})
+        if not path.startswith(self.ZONES):
+            return FakeResponse(404, {"message": "not found"})
+        parts = path.rstrip("/").split("/")[4:]
+
+        with self.lock:
+            if not parts:
+                if method != "GET":
+                    return FakeResponse(405)
+                return FakeResponse(200, [{"id": z["id"], "name": z["name"], "type": z["type"]}
+                                          for z in self.zones.values()])
+
+            zone = self.zones.get(parts[0])
+            if zone is None:
+                return FakeResponse(404, {"message": "zone not found"})
+
+            if len(parts) == 1 and method == "GET":
+                names = query.get("recordName")
+                types = query.get("recordType")
+                records = [dict(r) for r in zone["records"].values()
+                           if (names is None or r["name"] in names) and (types is None or r["type"] in types)]
+                return FakeResponse(200, {"id": zone["id"], "name": zone["name"], "type": zone["type"],
+                                          "records": records})
+            if len(parts) == 1 and method == "PATCH":
+                return self._patch_zone(zone, body)
+            if len(parts) == 2 and parts[1] == "records" and method == "POST":
+                created = [self._create(zone, record) for record in body or []]
+                return FakeResponse(201, created)
+            if len(parts) == 3 and parts[1] == "records" and method == "PUT":
+                record = zone["records"].get(parts[2])
+                if record is None:
+                    return FakeResponse(404, {"message": "record not found"})
+                record.update({k: body[k] for k in ("content", "ttl", "disabled") if k in (body or {})})
+                return FakeResponse(200, dict(record))
+        return FakeResponse(405)
+
+    def _create(self, zone: Dict, record: Dict) -> Dict:
+        record_id = self._next_id("record")
+        zone["records"][record_id] = {
+            "id": record_id, "name": record["name"], "rootName": zone["name"], "type": record["type"],
+            "content": record["content"], "ttl": record.get("ttl", 3600),
+            "disabled": record.get("disabled", False)
+        }
+        return dict(zone["records"][record_id])
+
+    def _patch_zone(self, zone: Dict, body) -> FakeResponse:
+        """Sostituisce i record con lo stesso nome e tipo di quelli inviati"""
+        for record in body or []:
+            existing = [r for r in zone["records"].values()
+                        if (r["name"], r["type"]) == (record["name"], record["type"])]
+            if not existing:
+                self._create(zone, record)
+                continue
+            existing[0].update({k: record[k] for k in ("content", "ttl", "disabled") if k in record})
+            for duplicate in existing[1:]:
+                del zone["records"][duplicate["id"]]
+        return FakeResponse(200)
+
+
+class FakeIPEchoServer(FakeHTTPServer):
+    """Finto servizio di rilevamento IP: risponde a ogni GET con l'indirizzo configurato"""
+
+    def __init__(self, ip: str = "203.0.113.42", **options):
+        """
+        Args:
+            ip: Indirizzo restituito (modificabile durante il test)
+            options: Opzioni di FakeHTTPServer (latency, error_rate, rate_limit, ...)
+        """
+        super().__init__(**options)
+        self.ip = ip
+
+    def route(self, method, path, query, body, headers) -> FakeResponse:
+        if method != "GET":
+            return FakeResponse(405)
+        return FakeResponse(200, f"{self.ip}\n".encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finto server API DNS IONOS per test di carico")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--zones", type=int, default=10)
+    parser.add_argument("--records", type=int, default=10, help="Record per zona")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float)
+    parser.add_argument("--echo-ip", default="203.0.113.42", help="IP restituito dal servizio IP (porta+1)")
+    args = parser.parse_args()
+
+    server = FakeIONOSServer(port=args.port, latency=args.latency, error_rate=args.error_rate,
+                             rate_limit=args.rate_limit)
+    server.populate(args.zones, args.records)
+    echo = FakeIPEchoServer(args.echo_ip, port=args.port + 1).start()
+    print(f"API IONOS finta su {server.url} ({args.zones} zone, {args.zones * args.records} record)")
+    print(f"Servizio IP finto su {echo.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.by_endpoint(), indent=2))
+        echo.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Router finto per i test di RouterDetector
+
+FakeRouter risponde su localhost come un router domestico:
+    - SSDP: alle M-SEARCH risponde con l'URL della descrizione del dispositivo
+    - HTTP: descrizione IGD e azione SOAP GetExternalIPAddress
+    - NAT-PMP: richiesta dell'indirizzo esterno (opcode 0)
+Ogni protocollo può essere disattivato e tiene il conto delle richieste ricevute.
+
+Uso da riga di comando:
+    python -m tests.fake_router --external-ip 93.184.216.34
+"""
+import argparse
+import socket
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+DESCRIPTION = """<?xml version="1.0"?>
+<root xmlns="urn:schemas-upnp-org:device-1-0">
+  <specVersion><major>1</major><minor>0</minor></specVersion>
+  <device>
+    <deviceType>urn:schemas-upnp-org:device:InternetGatewayDevice:1</deviceType>
+    <friendlyName>Fake Router</friendlyName>
+    <serviceList>
+      <service>
+        <serviceType>urn:schemas-upnp-org:service:Layer3Forwarding:1</serviceType>
+        <controlURL>/ctl/L3F</controlURL>
+      </service>
+    </serviceList>
+    <deviceList>
+      <device>
+        <deviceType>urn:schemas-upnp-org:device:WANDevice:1</deviceType>
+        <deviceList>
+          <device>
+            <deviceType>urn:schemas-upnp-org:device:WANConnectionDevice:1</deviceType>
+            <serviceList>
+              <service>
+                <serviceType>{service_type}</serviceType>
+                <controlURL>/ctl/IPConn</controlURL>
+              </service>
+            </serviceList>
+          </device>
+        </deviceList>
+      </device>
+    </deviceList>
+  </device>
+</root>
+"""
+
+SOAP_RESPONSE = """<?xml version="1.0"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">
+<s:Body><u:GetExternalIPAddressResponse xmlns:u="{service_type}">
+<NewExternalIPAddress>{ip}</NewExternalIPAddress>
+</u:GetExternalIPAddressResponse></s:Body></s:Envelope>
+"""
+
+
+class _RouterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: str = "") -> None:
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", 'text/xml; charset="utf-8"')
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        router = self.server.router
+        router.count("description")
+        if self.path != "/rootDesc.xml":
+            return self._reply(404)
+        self._reply(200, DESCRIPTION.format(service_type=router.service_type))
+
+    def do_POST(self):
+        router = self.server.router
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode()
+        router.count("soap")
+        action = f'"{router.service_type}#GetExternalIPAddress"'
+        if (self.path != "/ctl/IPConn" or self.headers.get("SOAPAction") != action
+                or "GetExternalIPAddress" not in body):
+            return self._reply(500)
+        self._reply(200, SOAP_RESPONSE.format(service_type=router.service_type, ip=router.external_ip))
+
+
+class FakeRouter:
+    """Router finto con SSDP, IGD su HTTP e NAT-PMP su localhost"""
+
+    def __init__(self, external_ip: str = "93.184.216.34",
+                 service_type: str = "urn:schemas-upnp-org:service:WANIPConnection:1",
+                 upnp: bool = True, natpmp: bool = True):
+        """
+        Args:
+            external_ip: Indirizzo WAN restituito da UPnP e NAT-PMP
+            service_type: Tipo del servizio WAN pubblicato nella descrizione
+            upnp: Se False non risponde alle ricerche SSDP
+            natpmp: Se False ignora le richieste NAT-PMP
+        """
+        self.external_ip = external_ip
+        self.service_type = service_type
+        self.upnp = upnp
+        self.natpmp = natpmp
+        self.natpmp_result = 0  # Codice di risultato NAT-PMP (0 = successo)
+        self.natpmp_drop = 0  # Richieste NAT-PMP da ignorare prima di rispondere
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), _RouterHandler)
+        self.http.daemon_threads = True
+        self.http.router = self
+        self.ssdp = self._udp_socket()
+        self.natpmp_socket = self._udp_socket()
+        self._threads = [
+            threading.Thread(target=self.http.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True),
+            threading.Thread(target=self._serve_udp, args=(self.ssdp, self._ssdp_reply), daemon=True),
+            threading.Thread(target=self._serve_udp, args=(self.natpmp_socket, self._natpmp_reply),
+                             daemon=True),
+        ]
+
+    @staticmethod
+    def _udp_socket() -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        sock.settimeout(0.05)
+        return sock
+
+    @property
+    def ssdp_address(self):
+        return self.ssdp.getsockname()
+
+    @property
+    def natpmp_port(self) -> int:
+        return self.natpmp_socket.getsockname()[1]
+
+    @property
+    def location(self) -> str:
+        return f"http://127.0.0.1:{self.http.server_address[1]}/rootDesc.xml"
+
+    def count(self, kind: str) -> None:
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def start(self) -> "FakeRouter":
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.http.shutdown()
+        for thread in self._threads:
+            thread.join()
+        self.http.server_close()
+        self.ssdp.close()
+        self.natpmp_socket.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _serve_udp(self, sock: socket.socket, reply) -> None:
+        while not self._stop.is_set():
+            try:
+                data, client = sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            response = reply(data)
+            if response is not None:
+                sock.sendto(response, client)
+
+    def _ssdp_reply(self, data: bytes) -> Optional[bytes]:
+        if not data.startswith(b"M-SEARCH * HTTP/1.1\r\n"):
+            return None
+        self.count("ssdp")
+        if not self.upnp:
+            return None
+        return ("HTTP/1.1 200 OK\r\n"
+                "CACHE-CONTROL: max-age=120\r\n"
+                "ST: urn:schemas-upnp-org:device:InternetGatewayDevice:1\r\n"
+                "USN: uuid:00000000-0000-0000-0000-000000000000::"
+                "urn:schemas-upnp-org:device:InternetGatewayDevice:1\r\n"
+                "EXT:\r\n"
+                "SERVER: Linux UPnP/1.1 FakeRouter/1.0\r\n"
+                f"LOCATION: {self.location}\r\n"
+                "\r\n").encode()
+
+    def _natpmp_reply(self, data: bytes) -> Optional[bytes]:
+        if data[:2] != b"\x00\x00":
+            return None
+        self.count("natpmp")
+        if not self.natpmp:
+            return None
+        if self.natpmp_drop:
+            self.natpmp_drop -= 1
+            return None
+        return struct.pack("!BBHI4s", 0, 128, self.natpmp_result, 3600,
+                           socket.inet_aton(self.external_ip))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Router finto (SSDP, UPnP IGD, NAT-PMP) su localhost")
+    parser.add_argument("--external-ip", default="93.184.216.34")
+    args = parser.parse_args(argv)
+    with FakeRouter(args.external_ip) as router:
+        print(f"SSDP:    127.0.0.1:{router.ssdp_address[1]}")
+        print(f"UPnP:    {router.location}")
+        print(f"NAT-PMP: 127.0.0.1:{router.natpmp_port}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
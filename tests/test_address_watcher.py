@@ -0,0 +1,85 @@
+"""Test per AddressWatcher"""
+import socket
+from unittest.mock import Mock
+from ionos_ddns import AddressWatcher, LocalInterfaceDetector
+from tests.test_local_interface_detector import netlink_addr_message
+
+
+class FakeNetlinkSocket:
+    """Socket netlink simulato: restituisce in ordine i buffer o le eccezioni indicate"""
+
+    def __init__(self, watcher_ref, events):
+        self.watcher_ref = watcher_ref
+        self.events = list(events)
+        self.timeouts = []
+        self.closed = False
+
+    def settimeout(self, timeout):
+        self.timeouts.append(timeout)
+
+    def recv(self, size):
+        if not self.events:
+            self.watcher_ref[0].stop()
+            raise socket.timeout()
+        event = self.events.pop(0)
+        if isinstance(event, Exception):
+            raise event
+        return event
+
+    def close(self):
+        self.closed = True
+
+
+def run_watcher(events, **kwargs):
+    """Esegue un AddressWatcher sugli eventi indicati e restituisce (callback, socket)"""
+    on_change = Mock()
+    ref = []
+    sock = FakeNetlinkSocket(ref, events)
+    watcher = AddressWatcher(on_change, sock=sock, **kwargs)
+    ref.append(watcher)
+    watcher.run()
+    return on_change, sock
+
+
+class TestAddressWatcher:
+    """Test suite per AddressWatcher"""
+
+    def test_relevant_change_triggers_after_debounce(self):
+        """Test che più eventi ravvicinati producano una sola notifica"""
+        event = netlink_addr_message(socket.AF_INET, "93.184.216.34", label="ppp0")
+
+        on_change, sock = run_watcher([event, event, socket.timeout()], debounce=0.5)
+
+        on_change.assert_called_once()
+        # Dopo il primo evento l'attesa si riduce alla finestra di debounce
+        assert sock.timeouts[1] == 0.5
+        assert sock.closed
+
+    def test_irrelevant_change_ignored(self):
+        """Test che variazioni di indirizzi privati o link-local non notifichino"""
+        events = [
+            netlink_addr_message(socket.AF_INET, "192.168.1.10", label="eth0"),
+            netlink_addr_message(socket.AF_INET6, "fe80::1", prefixlen=64, scope=253),
+            socket.timeout(),
+        ]
+
+        on_change, _ = run_watcher(events)
+
+        on_change.assert_not_called()
+
+    def test_interface_filter(self):
+        """Test che vengano considerate solo le interfacce richieste"""
+        events = [
+            netlink_addr_message(socket.AF_INET, "93.184.216.34", label="eth1"),
+            socket.timeout(),
+        ]
+
+        on_change, _ = run_watcher(events, detector=LocalInterfaceDetector(interfaces=["ppp*"]))
+
+        on_change.assert_not_called()
+
+    def test_overflow_forces_check(self):
+        """Test che un overflow del buffer netlink provochi comunque una verifica"""
+        on_change, _ = run_watcher([OSError(105, "No buffer space available"), socket.timeout()])
+
+        on_change.assert_called_once()
@@ -0,0 +1,169 @@
+"""Test per AsyncIONOSClient e AsyncDNSUpdater contro un server API locale"""
+import asyncio
+import time
+
+import pytest
+from ionos_ddns import AsyncDNSUpdater, AsyncIONOSClient, DNSUpdater, IONOSClient
+from tests.fake_ionos import FakeIONOSServer
+
+
+class StaticDetector:
+    """Rilevatore IP che restituisce sempre lo stesso indirizzo"""
+
+    def __init__(self, ip="203.0.113.42"):
+        self.ip = ip
+
+    def get_public_ip(self):
+        return self.ip, 'A'
+
+
+@pytest.fixture
+def make_server():
+    """Avvia server finti con zone example{i}.com e record A host{j}.example{i}.com"""
+    servers = []
+
+    def start(zones, hosts_per_zone, latency=0.0):
+        server = FakeIONOSServer(latency=latency)
+        server.populate(zones, hosts_per_zone)
+        servers.append(server.start())
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+class TestAsyncIONOSClient:
+    """Test per il client asyncio"""
+
+    def test_zone_lookups_share_one_download(self, make_server):
+        """Test che ricerche concorrenti della stessa lista zone facciano una sola richiesta"""
+        server = make_server(5, 0, latency=0.05)
+        client = AsyncIONOSClient(IONOSClient("pub", "secret", base_url=server.url))
+
+        async def lookup():
+            return await asyncio.gather(*(client.get_zone_id(f"example{i}.com") for i in range(5)))
+
+        try:
+            assert asyncio.run(lookup()) == [f"zone-{i}" for i in range(5)]
+        finally:
+            client.close()
+        assert server.count("GET", "/dns/v1/zones") == 1
+
+    def test_concurrency_limits(self, make_server):
+        """Test dei limiti globale e per zona sulle richieste in volo"""
+        server = make_server(4, 0, latency=0.05)
+        client = AsyncIONOSClient(IONOSClient("pub", "secret", base_url=server.url, pool_size=3),
+                                  concurrency=3, zone_concurrency=1)
+
+        async def fetch():
+            return await asyncio.gather(*(client.get_zone(f"zone-{i % 4}") for i in range(12)))
+
+        try:
+            zones = asyncio.run(fetch())
+        finally:
+            client.close()
+
+        assert len(zones) == 12
+        assert server.max_in_flight == 3
+        assert max(server.max_zone_in_flight.values()) == 1
+
+
+class TestAsyncDNSUpdater:
+    """Test per l'updater asyncio"""
+
+    def make_updater(self, server, **options):
+        return AsyncDNSUpdater("pub", "secret", base_url=server.url,
+                               ip_detector=StaticDetector(), **options)
+
+    def test_update_hosts_across_zones(self, make_server):
+        """Test aggiornamento di più zone in parallelo con gli stessi esiti del sync"""
+        server = make_server(3, 2)
+        server.zones["zone-0"]["records"]["record-0-1"]["content"] = "203.0.113.42"
+        updater = self.make_updater(server)
+        hostnames = ["host0.example0.com", "host1.example0.com", "new.example1.com",
+                     "host0.example2.com", "bad"]
+
+        try:
+            results = asyncio.run(updater.update_hosts(hostnames))
+        finally:
+            updater.close()
+
+        assert results[0][3].startswith("errore: Hostname non valido")
+        assert results[1:] == [
+            ("host0.example0.com", "A", "203.0.113.42", "aggiornato"),
+            ("host1.example0.com", "A", "203.0.113.42", "invariato"),
+            ("new.example1.com", "A", "203.0.113.42", "creato"),
+            ("host0.example2.com", "A", "203.0.113.42", "aggiornato"),
+        ]
+        assert server.find_record("host0.example0.com", "A")["content"] == "203.0.113.42"
+        assert server.find_record("host0.example2.com", "A")["content"] == "203.0.113.42"
+        assert server.find_record("new.example1.com", "A") is not None
+        # Una lista zone, una lettura per zona, una scrittura per zona modificata
+        assert server.count("GET", "/dns/v1/zones") == 1
+        assert sorted(r.method for r in server.log) == ["GET"] * 4 + ["PATCH"] * 2 + ["POST"]
+
+    def test_unknown_domain_does_not_stop_other_zones(self, make_server):
+        """Test che una zona non gestita produca errori solo per i suoi hostname"""
+        server = make_server(1, 1)
+        updater = self.make_updater(server)
+
+        try:
+            results = asyncio.run(updater.update_hosts(["host0.example0.com", "www.other.org"]))
+        finally:
+            updater.close()
+
+        assert ("host0.example0.com", "A", "203.0.113.42", "aggiornato") in results
+        assert ("www.other.org", "A", "203.0.113.42", "errore: dominio non gestito da IONOS") in results
+
+    def test_from_updater_shares_configuration(self, make_server, mocker):
+        """Test che from_updater usi client, rilevatore e metriche del DNSUpdater e li chiuda"""
+        server = make_server(1, 1)
+        updater = DNSUpdater("pub", "secret", base_url=server.url, ip_detector=StaticDetector("203.0.113.7"))
+        async_updater = AsyncDNSUpdater.from_updater(updater, concurrency=4, zone_concurrency=2)
+        close = mocker.spy(updater, "close")
+
+        try:
+            results = asyncio.run(async_updater.update_hosts(["host0.example0.com", "new.example0.com"]))
+        finally:
+            async_updater.close()
+
+        assert async_updater.client.client is updater.client
+        assert async_updater.client.concurrency == 4 and async_updater.client.zone_concurrency == 2
+        assert [outcome for _, _, _, outcome in results] == ["aggiornato", "creato"]
+        assert updater.metrics.value("ionos_ddns_runs_total", result="changed") == 1
+        close.assert_called_once()
+
+    def test_state_skips_api_on_second_run(self, make_server, tmp_path):
+        """Test che con lo stato locale la seconda esecuzione non chiami le API"""
+        server = make_server(2, 2)
+        hostnames = [f"host{j}.example{i}.com" for i in range(2) for j in range(2)]
+        state_file = tmp_path / "state.json"
+
+        for _ in range(2):
+            updater = self.make_updater(server, state_file=state_file)
+            try:
+                results = asyncio.run(updater.update_hosts(hostnames))
+            finally:
+                updater.close()
+
+        assert [outcome for _, _, _, outcome in results] == ["invariato"] * 4
+        assert len(server.log) == 5  # solo la prima esecuzione
+
+    def test_fleet_is_faster_than_serial(self, make_server):
+        """Test che le zone vengano elaborate in parallelo"""
+        server = make_server(8, 5, latency=0.05)
+        updater = self.make_updater(server, zone_concurrency=2, rate_limit=None)
+        hostnames = [f"host{j}.example{i}.com" for i in range(8) for j in range(5)]
+
+        start = time.monotonic()
+        try:
+            results = asyncio.run(updater.update_hosts(hostnames))
+        finally:
+            updater.close()
+        elapsed = time.monotonic() - start
+
+        assert [outcome for _, _, _, outcome in results] == ["aggiornato"] * 40
+        # 17 richieste da 50 ms in serie richiederebbero almeno 0.85 s
+        assert elapsed < 0.6
+        assert server.max_in_flight > 1
@@ -0,0 +1,43 @@
+"""Benchmark di DNSUpdater confrontati con tests/benchmark_baseline.json"""
+import pytest
+from ionos_ddns import IONOSClient
+from tests import benchmark
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    return benchmark.load_baseline()
+
+
+class TestBenchmark:
+    """Regressioni su richieste e byte rispetto alla baseline (tempo e memoria: python -m tests.benchmark)"""
+
+    @pytest.mark.parametrize("scenario", list(benchmark.SCENARIOS))
+    def test_scenario_within_baseline(self, baseline, scenario):
+        """Test che lo scenario non superi la baseline"""
+        result = benchmark.run_scenario(scenario)
+
+        assert benchmark.compare(result, baseline[scenario]) == []
+
+    def test_extra_request_is_a_regression(self, baseline, monkeypatch):
+        """Test che una chiamata in più a get_zones venga segnalata"""
+        get_zones = IONOSClient.get_zones
+
+        def get_zones_twice(self):
+            get_zones(self)
+            return get_zones(self)
+
+        monkeypatch.setattr(IONOSClient, "get_zones", get_zones_twice)
+        result = benchmark.run_scenario("changed_ip")
+
+        assert benchmark.compare(result, baseline["changed_ip"]) == [
+            "api GET /dns/v1/zones: 2 richieste (baseline 1)"
+        ]
+
+    def test_resources_are_compared_only_on_request(self, baseline):
+        """Test che tempo e memoria vengano confrontati solo con resources=True"""
+        result = dict(baseline["changed_ip"], wall_time=baseline["changed_ip"]["wall_time"] * 100 + 10)
+
+        assert benchmark.compare(result, baseline["changed_ip"]) == []
+        assert [regression.split(":")[0] for regression in
+                benchmark.compare(result, baseline["changed_ip"], resources=True)] == ["wall_time"]
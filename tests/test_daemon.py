@@ -0,0 +1,252 @@
+"""Test per Daemon"""
+import os
+import signal
+import pytest
+from unittest.mock import Mock
+from ionos_ddns import Daemon, Metrics
+
+
+class TestDaemon:
+    """Test suite per Daemon"""
+
+    def test_run_reuses_updater_between_cycles(self):
+        """Test che lo stesso DNSUpdater venga riusato tra i cicli"""
+        updater = Mock()
+        factory = Mock(return_value=updater)
+        daemon = Daemon(factory, ["test.example.com"], interval=0, jitter=0)
+
+        def update(hostname):
+            if updater.update_dns.call_count == 3:
+                daemon.stop()
+
+        updater.update_dns.side_effect = update
+        daemon.run()
+
+        factory.assert_called_once()
+        assert updater.update_dns.call_count == 3
+        updater.close.assert_called_once()
+
+    def test_cycle_errors_do_not_stop_daemon(self, capsys):
+        """Test che un errore in un ciclo non fermi il daemon"""
+        updater = Mock()
+        daemon = Daemon(Mock(return_value=updater), ["test.example.com"], interval=0, jitter=0)
+
+        def update(hostname):
+            if updater.update_dns.call_count == 1:
+                raise RuntimeError("Impossibile rilevare l'indirizzo IP pubblico")
+            if updater.update_dns.call_count == 2:
+                raise SystemExit(1)
+            daemon.stop()
+
+        updater.update_dns.side_effect = update
+        daemon.run()
+
+        assert updater.update_dns.call_count == 3
+        assert "ERRORE: Impossibile rilevare" in capsys.readouterr().out
+
+    def test_reload_recreates_updater(self):
+        """Test che reload() ricrei il DNSUpdater prima del ciclo successivo"""
+        first, second = Mock(), Mock()
+        daemon = Daemon(Mock(side_effect=[first, second]), ["test.example.com"], interval=60, jitter=0)
+
+        first.update_dns.side_effect = lambda hostname: daemon.reload()
+        second.update_dns.side_effect = lambda hostname: daemon.stop()
+        daemon.run()
+
+        first.close.assert_called_once()
+        second.update_dns.assert_called_once_with("test.example.com")
+
+    def test_reload_keeps_previous_updater_on_bad_config(self):
+        """Test che una configurazione non valida al reload mantenga quella precedente"""
+        updater = Mock()
+        daemon = Daemon(Mock(side_effect=[updater, SystemExit(1)]), ["test.example.com"], interval=0, jitter=0)
+
+        def update(hostname):
+            if updater.update_dns.call_count == 1:
+                daemon.reload()
+            else:
+                daemon.stop()
+
+        updater.update_dns.side_effect = update
+        daemon.run()
+
+        assert updater.update_dns.call_count == 2
+
+    def test_reload_rereads_hostnames(self):
+        """Test che reload() rilegga anche gli hostname dalla configurazione"""
+        first, second = Mock(), Mock()
+        hostnames = Mock(side_effect=[["a.example.com", "b.example.com"]])
+        daemon = Daemon(Mock(side_effect=[first, second]), ["test.example.com"], interval=60, jitter=0,
+                        hostnames_factory=hostnames)
+
+        first.update_dns.side_effect = lambda hostname: daemon.reload()
+        second.update_hosts.side_effect = lambda hostnames: daemon.stop() or []
+        daemon.run()
+
+        first.update_dns.assert_called_once_with("test.example.com")
+        second.update_hosts.assert_called_once_with(["a.example.com", "b.example.com"])
+
+    def test_reload_keeps_hostnames_on_empty_list(self, capsys):
+        """Test che una configurazione senza hostname al reload mantenga quelli precedenti"""
+        updater = Mock()
+        factory = Mock(return_value=updater)
+        daemon = Daemon(factory, ["test.example.com"], interval=0, jitter=0, hostnames_factory=Mock(return_value=[]))
+
+        def update(hostname):
+            if updater.update_dns.call_count == 1:
+                daemon.reload()
+            else:
+                daemon.stop()
+
+        updater.update_dns.side_effect = update
+        daemon.run()
+
+        factory.assert_called_once()
+        assert [call.args for call in updater.update_dns.call_args_list] == [("test.example.com",)] * 2
+        assert "nessun hostname configurato" in capsys.readouterr().out
+
+    def test_sigterm_stops_daemon(self):
+        """Test arresto pulito alla ricezione di SIGTERM"""
+        updater = Mock()
+        daemon = Daemon(Mock(return_value=updater), ["test.example.com"], interval=60, jitter=0)
+        previous = {sig: signal.getsignal(sig) for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT)}
+        updater.update_dns.side_effect = lambda hostname: os.kill(os.getpid(), signal.SIGTERM)
+
+        try:
+            daemon.install_signal_handlers()
+            daemon.run()
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+
+        updater.update_dns.assert_called_once()
+        updater.close.assert_called_once()
+
+    @pytest.mark.parametrize("interval,jitter", [(300, 0), (300, 30)])
+    def test_next_delay_with_jitter(self, interval, jitter):
+        """Test che il ritardo resti tra intervallo e intervallo + jitter"""
+        daemon = Daemon(Mock(), ["test.example.com"], interval=interval, jitter=jitter)
+
+        for _ in range(50):
+            assert interval <= daemon.next_delay() <= interval + jitter
+
+    def test_trigger_wakes_daemon(self):
+        """Test che trigger() anticipi il ciclo successivo senza attendere l'intervallo"""
+        updater = Mock()
+        daemon = Daemon(Mock(return_value=updater), ["test.example.com"], interval=3600, jitter=0)
+
+        def update(hostname):
+            if updater.update_dns.call_count == 1:
+                daemon.trigger()
+            else:
+                daemon.stop()
+
+        updater.update_dns.side_effect = update
+        daemon.run()
+
+        assert updater.update_dns.call_count == 2
+
+
+class TestAdaptiveInterval:
+    """Test per l'intervallo adattivo del daemon"""
+
+    def make_daemon(self, **options):
+        updater = Mock()
+        updater.metrics = Metrics()
+        updater.last_addresses = {'A': "203.0.113.1"}
+        daemon = Daemon(Mock(return_value=updater), ["test.example.com"], jitter=0, **options)
+        daemon.updater = updater
+        return daemon, updater
+
+    def test_stable_ip_stretches_to_max(self):
+        """Test che con IP stabile l'intervallo raddoppi fino al massimo"""
+        daemon, _ = self.make_daemon(interval=60, max_interval=300)
+
+        intervals = []
+        for _ in range(5):
+            daemon.run_cycle()
+            intervals.append(daemon.current_interval)
+
+        assert intervals == [60, 120, 240, 300, 300]
+        assert daemon.interval_reason == "stable"
+
+    def test_change_resets_to_min(self):
+        """Test che un cambio di IP riporti subito l'intervallo al minimo"""
+        daemon, updater = self.make_daemon(interval=60, max_interval=3600)
+        for _ in range(4):
+            daemon.run_cycle()
+        assert daemon.current_interval == 480
+
+        updater.last_addresses = {'A': "203.0.113.2"}
+        daemon.run_cycle()
+
+        assert daemon.current_interval == 60
+        assert daemon.interval_reason == "changed"
+
+    def test_error_resets_to_min(self):
+        """Test che un rilevamento fallito riporti l'intervallo al minimo"""
+        daemon, updater = self.make_daemon(interval=60, max_interval=3600)
+        for _ in range(3):
+            daemon.run_cycle()
+
+        updater.update_dns.side_effect = RuntimeError("Impossibile rilevare l'indirizzo IP pubblico")
+        daemon.run_cycle()
+
+        assert daemon.current_interval == 60
+        assert daemon.interval_reason == "error"
+
+    def test_host_errors_reset_to_min(self):
+        """Test che gli esiti di errore di update_hosts contino come ciclo fallito"""
+        updater = Mock()
+        updater.metrics = Metrics()
+        updater.last_addresses = {'A': "203.0.113.1"}
+        updater.update_hosts.return_value = [("a.example.com", "A", "203.0.113.1", "errore: timeout")]
+        daemon = Daemon(Mock(), ["a.example.com", "b.example.com"], interval=60, jitter=0, max_interval=600)
+        daemon.updater = updater
+        daemon.current_interval = 240
+
+        daemon.run_cycle()
+
+        assert daemon.current_interval == 60
+        assert daemon.interval_reason == "error"
+
+    def test_fixed_interval_without_max(self):
+        """Test che senza max_interval l'intervallo resti fisso"""
+        daemon, _ = self.make_daemon(interval=300)
+
+        for _ in range(3):
+            daemon.run_cycle()
+
+        assert not daemon.adaptive
+        assert daemon.current_interval == 300
+        assert daemon.interval_reason == "fixed"
+
+    @pytest.mark.parametrize("jitter", [0, 30])
+    def test_delay_respects_limits_and_jitter(self, jitter):
+        """Test che il ritardo resti tra minimo e massimo più jitter"""
+        daemon, _ = self.make_daemon(interval=60, max_interval=300)
+        daemon.jitter = jitter
+
+        for _ in range(10):
+            daemon.run_cycle()
+            assert 60 <= daemon.next_delay() <= 300 + jitter
+
+    def test_interval_in_metrics_and_logs(self, capsys):
+        """Test che intervallo e motivo siano esposti nelle metriche e nei log"""
+        daemon, updater = self.make_daemon(interval=60, max_interval=300)
+
+        def update(hostname):
+            if updater.update_dns.call_count == 1:
+                daemon.trigger()
+            else:
+                daemon.stop()
+
+        updater.update_dns.side_effect = update
+        daemon._reload_updater = lambda: None
+        daemon.run()
+
+        metrics = updater.metrics
+        assert metrics.value("ionos_ddns_poll_interval_seconds") == 120
+        assert metrics.value("ionos_ddns_poll_interval_reason", reason="stable") == 1
+        assert metrics.value("ionos_ddns_poll_interval_reason", reason="start") == 0
+        assert "Prossimo ciclo tra 60 secondi (primo ciclo)" in capsys.readouterr().out
@@ -0,0 +1,205 @@
+"""Test per DetectionCache, la cache dell'IP rilevato condivisa tra processi"""
+import json
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from ionos_ddns import (DetectionCache, Metrics, PublicIPDetector, UrllibTransport,
+                        interface_fingerprint)
+from tests.fake_ionos import FakeIPEchoServer
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+DETECT = """
+import sys
+from ionos_ddns import DetectionCache, PublicIPDetector, UrllibTransport
+
+detector = PublicIPDetector(transport=UrllibTransport(), cache=DetectionCache(sys.argv[1]))
+detector.IPV4_SERVICES = [sys.argv[2]]
+print(detector.get_public_ip()[0])
+"""
+
+
+@pytest.fixture
+def fingerprint(mocker):
+    """Impronta delle interfacce locali controllata dal test"""
+    return mocker.patch("ionos_ddns.interface_fingerprint", return_value="eth0/192.168.1.10/24")
+
+
+def make_detector(echo, cache, **options):
+    detector = PublicIPDetector(transport=UrllibTransport(), cache=cache, **options)
+    detector.IPV4_SERVICES = [echo.url]
+    return detector
+
+
+class TestDetectionCache:
+    """Test per scadenza e invalidazione delle voci"""
+
+    def test_set_and_get(self, tmp_path):
+        """Test lettura di una voce valida, per tipo di record"""
+        cache = DetectionCache(tmp_path / "detect.json")
+        cache.set("A", "93.184.216.34", "fp")
+        cache.set("AAAA", "2001:db8::1", "fp")
+
+        assert cache.get("A", "fp") == "93.184.216.34"
+        assert cache.get("AAAA", "fp") == "2001:db8::1"
+
+    def test_expired(self, tmp_path, mocker):
+        """Test che una voce più vecchia del TTL non venga usata"""
+        cache = DetectionCache(tmp_path / "detect.json", ttl=60)
+        time_mock = mocker.patch("ionos_ddns.time.time", return_value=1000.0)
+        cache.set("A", "93.184.216.34")
+
+        time_mock.return_value = 1059.0
+        assert cache.get("A") == "93.184.216.34"
+        time_mock.return_value = 1060.0
+        assert cache.get("A") is None
+
+    def test_interfaces_changed(self, tmp_path):
+        """Test che la voce non valga più se sono cambiati gli indirizzi locali"""
+        cache = DetectionCache(tmp_path / "detect.json")
+        cache.set("A", "93.184.216.34", "eth0/192.168.1.10/24")
+
+        assert cache.get("A", "wlan0/10.0.0.5/24") is None
+
+    def test_corrupted_file(self, tmp_path):
+        """Test che un file corrotto venga ignorato"""
+        path = tmp_path / "detect.json"
+        path.write_text("[1, 2")
+
+        assert DetectionCache(path).get("A") is None
+
+    def test_interface_fingerprint_is_stable(self):
+        """Test che l'impronta non cambi tra due letture consecutive"""
+        assert interface_fingerprint() == interface_fingerprint()
+
+
+class TestCachedDetection:
+    """Test del rilevamento con cache in PublicIPDetector"""
+
+    def test_second_detection_uses_cache(self, tmp_path, fingerprint):
+        """Test che un secondo rilevatore legga l'IP dalla cache senza interrogare i servizi"""
+        cache = DetectionCache(tmp_path / "detect.json")
+        with FakeIPEchoServer("93.184.216.34") as echo:
+            metrics = Metrics()
+            assert make_detector(echo, cache).get_public_ip() == ("93.184.216.34", "A")
+            assert make_detector(echo, cache, metrics=metrics).get_public_ip() == ("93.184.216.34", "A")
+
+            assert echo.count() == 1
+            assert metrics.value("ionos_ddns_detections_total", family="ipv4", source="cache") == 1
+
+    def test_interface_change_triggers_detection(self, tmp_path, fingerprint):
+        """Test che un cambio degli indirizzi locali porti a un nuovo rilevamento"""
+        cache = DetectionCache(tmp_path / "detect.json")
+        with FakeIPEchoServer("93.184.216.34") as echo:
+            make_detector(echo, cache).get_public_ip()
+            fingerprint.return_value = "ppp0/100.64.1.2/32"
+            echo.ip = "93.184.216.35"
+
+            assert make_detector(echo, cache).get_public_ip() == ("93.184.216.35", "A")
+            assert echo.count() == 2
+
+    def test_failure_is_cached_briefly(self, tmp_path, fingerprint, mocker):
+        """Test che un rilevamento fallito venga riusato solo per NEGATIVE_TTL secondi"""
+        path = tmp_path / "detect.json"
+        time_mock = mocker.patch("ionos_ddns.time.time", return_value=1000.0)
+        with FakeIPEchoServer("93.184.216.34") as echo:
+            echo.fail(500)
+            detector = make_detector(echo, DetectionCache(path))
+            detector.IPV6_SERVICES = []
+
+            with pytest.raises(RuntimeError):
+                detector.get_public_ip()
+            assert json.loads(path.read_text())["A"]["ip"] is None
+
+            # Entro NEGATIVE_TTL il fallimento viene letto dalla cache senza interrogare i servizi
+            time_mock.return_value = 1000.0 + DetectionCache.NEGATIVE_TTL - 1
+            with pytest.raises(RuntimeError):
+                make_detector(echo, DetectionCache(path)).get_public_ip()
+            assert echo.count() == 1
+
+            time_mock.return_value = 1000.0 + DetectionCache.NEGATIVE_TTL
+            assert make_detector(echo, DetectionCache(path)).get_public_ip() == ("93.184.216.34", "A")
+            assert echo.count() == 2
+
+    def test_negative_ttl_never_exceeds_ttl(self, tmp_path, fingerprint, mocker):
+        """Test che con un TTL più breve di NEGATIVE_TTL il fallimento scada con il TTL"""
+        cache = DetectionCache(tmp_path / "detect.json", ttl=2)
+        time_mock = mocker.patch("ionos_ddns.time.time", return_value=1000.0)
+        cache.set("A", None, "eth0/192.168.1.10/24")
+
+        time_mock.return_value = 1002.0
+        detect = mocker.Mock(return_value=("93.184.216.34", "https://api.ipify.org"))
+        assert cache.get_or_detect(4, detect) == ("93.184.216.34", "https://api.ipify.org")
+
+    def test_concurrent_threads_detect_once(self, tmp_path, fingerprint):
+        """Test che rilevatori concorrenti attendano il primo invece di interrogare tutti"""
+        cache = DetectionCache(tmp_path / "detect.json")
+        with FakeIPEchoServer("93.184.216.34", latency=0.2) as echo:
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(make_detector(echo, cache).get_public_ip()))
+                       for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            assert results == [("93.184.216.34", "A")] * 5
+            assert echo.count() == 1
+
+    def test_concurrent_failures_detect_once(self, tmp_path, fingerprint):
+        """Test che rilevatori concorrenti non ripetano uno dopo l'altro un rilevamento fallito"""
+        cache = DetectionCache(tmp_path / "detect.json")
+        with FakeIPEchoServer("93.184.216.34", latency=0.2) as echo:
+            echo.fail(500, times=5)
+            errors = []
+
+            def detect():
+                detector = make_detector(echo, cache)
+                detector.IPV6_SERVICES = []
+                try:
+                    detector.get_public_ip()
+                except RuntimeError as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=detect) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            assert len(errors) == 5
+            assert echo.count() == 1
+
+    def test_concurrent_processes_detect_once(self, tmp_path):
+        """Test con più processi, come più voci cron nello stesso minuto"""
+        path = tmp_path / "detect.json"
+        with FakeIPEchoServer("93.184.216.34", latency=0.3) as echo:
+            processes = [subprocess.Popen([sys.executable, "-c", DETECT, str(path), echo.url], cwd=REPO_ROOT,
+                                          stdout=subprocess.PIPE, text=True)
+                         for _ in range(4)]
+            outputs = [process.communicate(timeout=30)[0].strip() for process in processes]
+
+            assert outputs == ["93.184.216.34"] * 4
+            assert echo.count() == 1
+            assert json.loads(path.read_text())["A"]["ip"] == "93.184.216.34"
+
+    def test_detection_error_is_not_retried(self, tmp_path, fingerprint, mocker):
+        """Test che un OSError sollevato dal rilevamento non lo faccia ripetere"""
+        detect = mocker.Mock(side_effect=OSError("rete non raggiungibile"))
+
+        with pytest.raises(OSError):
+            DetectionCache(tmp_path / "detect.json").get_or_detect(4, detect)
+
+        detect.assert_called_once()
+
+    def test_unwritable_cache(self, tmp_path, fingerprint):
+        """Test che con la cache non scrivibile si rilevi comunque l'IP"""
+        blocker = tmp_path / "file"
+        blocker.write_text("")
+        with FakeIPEchoServer("93.184.216.34") as echo:
+            detector = make_detector(echo, DetectionCache(blocker / "detect.json"))
+
+            assert detector.get_public_ip() == ("93.184.216.34", "A")
@@ -0,0 +1,253 @@
+"""Test per DNSDetector contro un resolver UDP locale"""
+import socket
+import struct
+import threading
+import time
+
+import pytest
+from ionos_ddns import (DNSDetector, Metrics, PublicIPDetector, build_dns_query,
+                        parse_dns_response)
+
+TYPE_A, TYPE_AAAA, TYPE_TXT = 1, 28, 16
+
+
+def ipv6_available():
+    try:
+        with socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as sock:
+            sock.bind(("::1", 0))
+        return True
+    except OSError:
+        return False
+
+
+class FakeResolver:
+    """
+    Resolver DNS finto su UDP
+
+    Risponde alle domande con i record configurati in `records`
+    ((nome, tipo) -> [(tipo, rdata)]); con echo=True risponde ad A/AAAA con
+    l'indirizzo del client, come myip.opendns.com.
+    """
+
+    def __init__(self, host="127.0.0.1"):
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_DGRAM)
+        self.sock.bind((host, 0))
+        self.sock.settimeout(0.05)
+        self.port = self.sock.getsockname()[1]
+        self.records = {}
+        self.echo = False
+        self.rcode = 0
+        self.drop = 0  # Query da ignorare prima di rispondere
+        self.spoof = False  # Invia prima una risposta con ID diverso
+        self.queries = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sock.close()
+
+    def add(self, name, record_type, rdata):
+        self.records.setdefault((name, record_type), []).append((record_type, rdata))
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                data, client = self.sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            query_id, _, _, _, _, _ = struct.unpack_from("!HHHHHH", data)
+            offset, labels = 12, []
+            while data[offset]:
+                labels.append(data[offset + 1:offset + 1 + data[offset]].decode())
+                offset += 1 + data[offset]
+            question_end = offset + 5
+            name, (qtype,) = ".".join(labels), struct.unpack_from("!H", data, offset + 1)
+            self.queries.append((name, qtype))
+            if self.drop:
+                self.drop -= 1
+                continue
+
+            answers = list(self.records.get((name, qtype), []))
+            if self.echo and qtype in (TYPE_A, TYPE_AAAA):
+                family = socket.AF_INET if qtype == TYPE_A else socket.AF_INET6
+                try:
+                    answers.append((qtype, socket.inet_pton(family, client[0])))
+                except OSError:
+                    pass
+            flags = 0x8180 | self.rcode
+            body = data[12:question_end]
+            for record_type, rdata in answers:
+                # Nome compresso: puntatore alla domanda (offset 12)
+                body += struct.pack("!HHHIH", 0xC00C, record_type, 1, 0, len(rdata)) + rdata
+            if self.spoof:
+                wrong = struct.pack("!HHHHHH", query_id ^ 0xFFFF, flags, 1, 1, 0, 0)
+                self.sock.sendto(wrong + body, client)
+            header = struct.pack("!HHHHHH", query_id, flags, 1, len(answers), 0, 0)
+            self.sock.sendto(header + body, client)
+
+
+def txt(*strings):
+    return b"".join(bytes([len(s)]) + s.encode() for s in strings)
+
+
+@pytest.fixture
+def resolver():
+    with FakeResolver() as server:
+        yield server
+
+
+def make_detector(server, **options):
+    """DNSDetector che interroga il resolver finto"""
+    options.setdefault("timeout", 0.5)
+    return DNSDetector(resolvers=[server.sock.getsockname()[0]], port=server.port, **options)
+
+
+class TestDNSMessages:
+    """Test per la codifica delle query e la lettura delle risposte"""
+
+    def test_build_query(self):
+        """Test formato di una query A"""
+        query = build_dns_query("myip.opendns.com", "A", 0x1234)
+
+        assert query == (b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00"
+                         b"\x04myip\x07opendns\x03com\x00\x00\x01\x00\x01")
+
+    def test_invalid_name(self):
+        """Test che etichette vuote o troppo lunghe vengano rifiutate"""
+        with pytest.raises(ValueError):
+            build_dns_query("a..b", "A", 1)
+        with pytest.raises(ValueError):
+            build_dns_query("x" * 64 + ".com", "A", 1)
+
+    @pytest.mark.parametrize("data", [
+        b"\x00\x01",  # intestazione troncata
+        b"\x00\x01\x01\x00" + b"\x00" * 8,  # query, non risposta
+        b"\x00\x01\x81\x83" + b"\x00" * 8,  # NXDOMAIN
+        b"\x00\x01\x81\x80\x00\x00\x00\x01\x00\x00\x00\x00\xc0\x0c\x00\x01",  # record troncato
+    ])
+    def test_invalid_responses(self, data):
+        """Test che risposte troncate, non risposte o con errore sollevino ValueError"""
+        with pytest.raises(ValueError):
+            parse_dns_response(data)
+
+
+class TestDNSDetector:
+    """Test per DNSDetector"""
+
+    def test_a_record(self, resolver):
+        """Test rilevamento IPv4 da un record A (stile OpenDNS)"""
+        resolver.add("myip.opendns.com", TYPE_A, socket.inet_aton("203.0.113.7"))
+        detector = make_detector(resolver)
+
+        assert detector.detect(4) == "203.0.113.7"
+        assert resolver.queries == [("myip.opendns.com", TYPE_A)]
+
+    def test_echo_client_address(self, resolver):
+        """Test che venga pubblicato l'indirizzo visto dal resolver"""
+        resolver.echo = True
+        detector = make_detector(resolver)
+
+        assert detector.detect(4) == "127.0.0.1"
+
+    @pytest.mark.skipif(not ipv6_available(), reason="IPv6 non disponibile")
+    def test_aaaa_over_ipv6(self):
+        """Test che la famiglia IPv6 usi il resolver IPv6 e chieda AAAA"""
+        with FakeResolver("::1") as server:
+            server.echo = True
+            detector = DNSDetector(resolvers=["::1"], port=server.port, timeout=0.5)
+
+            assert detector.detect(6) == "::1"
+            assert server.queries == [("myip.opendns.com", TYPE_AAAA)]
+
+    def test_txt_record(self, resolver):
+        """Test rilevamento da record TXT (stile Google), ignorando le stringhe non IP"""
+        name = "o-o.myaddr.l.google.com"
+        resolver.add(name, TYPE_TXT, txt("edns0-client-subnet 198.51.100.0/24"))
+        resolver.add(name, TYPE_TXT, txt("203.0.113.8"))
+        detector = make_detector(resolver, provider="google")
+
+        assert detector.detect(4) == "203.0.113.8"
+        assert resolver.queries == [(name, TYPE_TXT)]
+
+    def test_custom_name_and_type(self, resolver):
+        """Test nome e tipo di record configurabili"""
+        resolver.add("whoami.example.net", TYPE_TXT, txt("203.0.113.9"))
+        detector = make_detector(resolver, query_name="whoami.example.net", record_type="TXT")
+
+        assert detector.detect(4) == "203.0.113.9"
+
+    def test_retry_after_lost_packet(self, resolver):
+        """Test nuovo tentativo quando la prima risposta non arriva"""
+        resolver.add("myip.opendns.com", TYPE_A, socket.inet_aton("203.0.113.7"))
+        resolver.drop = 1
+        detector = make_detector(resolver, timeout=0.2, retries=1)
+
+        assert detector.detect(4) == "203.0.113.7"
+        assert len(resolver.queries) == 2
+
+    def test_timeout(self, resolver):
+        """Test che senza risposta si rinunci dopo timeout e tentativi"""
+        resolver.drop = 10
+        detector = make_detector(resolver, timeout=0.1, retries=2)
+
+        start = time.monotonic()
+        assert detector.detect(4) is None
+        assert time.monotonic() - start < 1
+        assert len(resolver.queries) == 3
+
+    def test_mismatched_id_is_ignored(self, resolver):
+        """Test che una risposta con ID diverso venga scartata"""
+        resolver.add("myip.opendns.com", TYPE_A, socket.inet_aton("203.0.113.7"))
+        resolver.spoof = True
+        detector = make_detector(resolver)
+
+        assert detector.detect(4) == "203.0.113.7"
+
+    def test_error_rcode(self, resolver):
+        """Test che un errore del server non venga ritentato"""
+        resolver.rcode = 3
+        detector = make_detector(resolver)
+
+        assert detector.detect(4) is None
+        assert len(resolver.queries) == 1
+
+    def test_wrong_family_answer(self, resolver):
+        """Test che un indirizzo della famiglia sbagliata venga scartato"""
+        resolver.add("o-o.myaddr.l.google.com", TYPE_TXT, txt("2001:db8::1"))
+        detector = make_detector(resolver, provider="google")
+
+        assert detector.detect(4) is None
+
+    def test_invalid_configuration(self):
+        """Test errori di configurazione"""
+        with pytest.raises(ValueError):
+            DNSDetector("cloudflare")
+        with pytest.raises(ValueError):
+            DNSDetector(resolvers=["resolver1.opendns.com"])
+        with pytest.raises(ValueError):
+            DNSDetector(record_type="MX")
+
+    def test_resolvers_override_one_family(self):
+        """Test che un resolver personalizzato sostituisca solo quello della sua famiglia"""
+        detector = DNSDetector(resolvers=["192.0.2.53"])
+
+        assert detector.resolvers == {4: "192.0.2.53", 6: "2620:119:35::35"}
+
+    def test_public_ip_detector_backend(self, resolver, mocker):
+        """Test che con il backend DNS non venga fatta alcuna richiesta HTTP"""
+        resolver.add("myip.opendns.com", TYPE_A, socket.inet_aton("203.0.113.7"))
+        dns = make_detector(resolver)
+        transport = mocker.Mock()
+        metrics = Metrics()
+        detector = PublicIPDetector(backends=[dns], transport=transport, metrics=metrics)
+
+        assert detector.get_public_ip() == ("203.0.113.7", "A")
+        transport.request.assert_not_called()
+        assert metrics.value("ionos_ddns_detections_total", family="ipv4", source="DNSDetector") == 1
@@ -1,7 +1,7 @@
 """Test per DNSUpdater"""
 import pytest
 from unittest.mock import Mock, patch, MagicMock
-from ionos_ddns import DNSUpdater
+from ionos_ddns import DNSUpdater, HTTPStatusError, PublicIPDetector
 
 
 class TestDNSUpdater:
@@ -56,7 +56,7 @@ class TestDNSUpdater:
         # Verifica chiamate
         mock_get_ip.assert_called_once()
         mock_get_zone_id.assert_called_once_with("example.com")
-        mock_get_zone.assert_called_once_with("zone-123")
+        mock_get_zone.assert_called_once_with("zone-123", record_name="test.example.com", record_type="A")
         mock_create.assert_called_once_with("example.com", "test", "A", "203.0.113.1")
 
     def test_update_dns_update_existing_record(self, mocker):
@@ -104,7 +104,7 @@ class TestDNSUpdater:
         # Verifica chiamate
         mock_get_ip.assert_called_once()
         mock_get_zone_id.assert_called_once_with("example.com")
-        mock_get_zone.assert_called_once_with("zone-123")
+        mock_get_zone.assert_called_once_with("zone-123", record_name="test.example.com", record_type="A")
         mock_update.assert_called_once_with(
             "example.com", "test", "A", "203.0.113.10", "record-456"
         )
@@ -303,3 +303,247 @@ class TestDNSUpdater:
             self.updater.update_dns("test.example.com")
 
         assert exc_info.value.code == 1
+
+    def test_update_dns_unchanged_ip_skips_api(self, mocker, tmp_path):
+        """Test che con IP invariato nello stato locale non si chiamino le API IONOS"""
+        updater = DNSUpdater("test_pub", "test_secret", state_file=tmp_path / "state.json")
+        updater.state.set("test.example.com", "A", "203.0.113.1", "record-456", "zone-123")
+
+        mocker.patch.object(updater.ip_detector, 'get_public_ip', return_value=("203.0.113.1", "A"))
+        mock_get_zone_id = mocker.patch.object(updater.client, 'get_zone_id')
+        mock_get_zone = mocker.patch.object(updater.client, 'get_zone')
+
+        updater.update_dns("test.example.com")
+
+        mock_get_zone_id.assert_not_called()
+        mock_get_zone.assert_not_called()
+
+    def test_update_dns_forced_check_after_interval(self, mocker, tmp_path):
+        """Test che dopo l'intervallo di verifica si interroghi comunque IONOS"""
+        updater = DNSUpdater("test_pub", "test_secret", state_file=tmp_path / "state.json",
+                             force_check_interval=3600)
+        mock_time = mocker.patch("ionos_ddns.time.time", return_value=1000.0)
+        updater.state.set("test.example.com", "A", "203.0.113.1", "record-456", "zone-123")
+        mock_time.return_value = 1000.0 + 3601
+
+        mocker.patch.object(updater.ip_detector, 'get_public_ip', return_value=("203.0.113.1", "A"))
+        mocker.patch.object(updater.client, 'get_zone_id', return_value="zone-123")
+        mock_get_zone = mocker.patch.object(
+            updater.client,
+            'get_zone',
+            return_value={
+                "records": [
+                    {"name": "test.example.com", "type": "A", "content": "203.0.113.1", "id": "record-456"}
+                ]
+            }
+        )
+
+        updater.update_dns("test.example.com")
+
+        mock_get_zone.assert_called_once_with("zone-123", record_name="test.example.com", record_type="A")
+        assert updater.state.get("test.example.com", "A")["checked_at"] == 1000.0 + 3601
+
+    def test_update_dns_saves_state_after_create(self, mocker, tmp_path):
+        """Test che dopo la creazione del record lo stato locale venga aggiornato"""
+        updater = DNSUpdater("test_pub", "test_secret", state_file=tmp_path / "state.json")
+
+        mocker.patch.object(updater.ip_detector, 'get_public_ip', return_value=("203.0.113.1", "A"))
+        mocker.patch.object(updater.client, 'get_zone_id', return_value="zone-123")
+        mocker.patch.object(updater.client, 'get_zone', return_value={"records": []})
+        mocker.patch.object(updater.client, 'create_record', return_value=[{"id": "record-789"}])
+
+        updater.update_dns("test.example.com")
+
+        entry = updater.state.get("test.example.com", "A")
+        assert entry["ip"] == "203.0.113.1"
+        assert entry["record_id"] == "record-789"
+        assert entry["zone_id"] == "zone-123"
+
+    def test_update_dns_dual_stack(self, mocker):
+        """Test dual-stack: record A e AAAA riconciliati con una sola lettura della zona"""
+        updater = DNSUpdater("test_pub", "test_secret", dual_stack=True)
+        mocker.patch.object(
+            updater.ip_detector,
+            'get_public_ips',
+            return_value={"A": "203.0.113.10", "AAAA": "2001:db8::10"}
+        )
+        mocker.patch.object(updater.client, 'get_zone_id', return_value="zone-123")
+        mock_get_zone = mocker.patch.object(
+            updater.client,
+            'get_zone',
+            return_value={
+                "records": [
+                    {"name": "test.example.com", "type": "A", "content": "192.0.2.1", "id": "record-456"}
+                ]
+            }
+        )
+        mock_update = mocker.patch.object(updater.client, 'update_record')
+        mock_create = mocker.patch.object(updater.client, 'create_record', return_value=[{"id": "record-789"}])
+
+        updater.update_dns("test.example.com")
+
+        mock_get_zone.assert_called_once_with("zone-123", record_name="test.example.com", record_type=None)
+        mock_update.assert_called_once_with("example.com", "test", "A", "203.0.113.10", "record-456")
+        mock_create.assert_called_once_with("example.com", "test", "AAAA", "2001:db8::10")
+
+    def test_update_dns_dual_stack_family_missing(self, mocker, capsys):
+        """Test dual-stack: una famiglia non rilevata viene segnalata senza far fallire l'esecuzione"""
+        updater = DNSUpdater("test_pub", "test_secret", dual_stack=True)
+        mocker.patch.object(
+            updater.ip_detector,
+            'get_public_ips',
+            return_value={"A": "203.0.113.10", "AAAA": None}
+        )
+        mocker.patch.object(updater.client, 'get_zone_id', return_value="zone-123")
+        mocker.patch.object(updater.client, 'get_zone', return_value={"records": []})
+        mock_create = mocker.patch.object(updater.client, 'create_record', return_value=[{"id": "record-789"}])
+
+        updater.update_dns("test.example.com")
+
+        mock_create.assert_called_once_with("example.com", "test", "A", "203.0.113.10")
+        assert "impossibile rilevare l'indirizzo IPv6" in capsys.readouterr().out
+
+    def test_update_dns_dual_stack_all_families_missing(self, mocker):
+        """Test dual-stack: errore se nessuna famiglia viene rilevata"""
+        updater = DNSUpdater("test_pub", "test_secret", dual_stack=True)
+        mocker.patch.object(updater.ip_detector, 'get_public_ips', return_value={"A": None, "AAAA": None})
+
+        with pytest.raises(RuntimeError, match="Impossibile rilevare"):
+            updater.update_dns("test.example.com")
+
+    def test_update_dns_remembers_published_ip(self, mocker):
+        """Test che la stessa istanza non richiami IONOS se l'IP pubblicato non cambia"""
+        mocker.patch.object(self.updater.ip_detector, 'get_public_ip', return_value=("203.0.113.1", "A"))
+        mock_get_zone_id = mocker.patch.object(self.updater.client, 'get_zone_id', return_value="zone-123")
+        mocker.patch.object(self.updater.client, 'get_zone', return_value={"records": []})
+        mocker.patch.object(self.updater.client, 'create_record', return_value=[{"id": "record-789"}])
+
+        self.updater.update_dns("test.example.com")
+        self.updater.update_dns("test.example.com")
+
+        mock_get_zone_id.assert_called_once()
+
+    def test_update_hosts_grouped_by_zone(self, mocker, capsys):
+        """Test aggiornamento multiplo: una lettura per zona e scrittura solo dei record diversi"""
+        mock_get_ip = mocker.patch.object(
+            self.updater.ip_detector, 'get_public_ip', return_value=("203.0.113.10", "A")
+        )
+        mock_get_zone_id = mocker.patch.object(
+            self.updater.client, 'get_zone_id', side_effect=lambda domain: f"zone-{domain}"
+        )
+        zones = {
+            "zone-example.com": {"records": [
+                {"name": "www.example.com", "type": "A", "content": "203.0.113.10", "id": "record-1"},
+                {"name": "dev.example.com", "type": "A", "content": "192.0.2.1", "id": "record-2"},
+            ]},
+            "zone-test.com": {"records": []},
+        }
+        mock_get_zone = mocker.patch.object(
+            self.updater.client, 'get_zone', side_effect=lambda zone_id, **filters: zones[zone_id]
+        )
+        mock_update = mocker.patch.object(
+            self.updater.client, 'update_records', return_value={"record-2": None}
+        )
+        mock_create = mocker.patch.object(
+            self.updater.client, 'create_records',
+            return_value=[{"name": "api.test.com", "type": "A", "id": "record-3"}]
+        )
+
+        results = self.updater.update_hosts(["www.example.com", "dev.example.com", "api.test.com"])
+
+        mock_get_ip.assert_called_once()
+        assert mock_get_zone_id.call_count == 2
+        assert mock_get_zone.call_count == 2
+        mock_update.assert_called_once_with("example.com", [
+            {"id": "record-2", "name": "dev", "type": "A", "content": "203.0.113.10", "ttl": None}
+        ])
+        mock_create.assert_called_once_with("test.com", [
+            {"name": "api", "type": "A", "content": "203.0.113.10"}
+        ])
+        # La zona con un solo hostname viene letta con il filtro lato server
+        mock_get_zone.assert_any_call("zone-example.com")
+        mock_get_zone.assert_any_call("zone-test.com", record_name="api.test.com", record_type="A")
+        assert results == [
+            ("www.example.com", "A", "203.0.113.10", "invariato"),
+            ("dev.example.com", "A", "203.0.113.10", "aggiornato"),
+            ("api.test.com", "A", "203.0.113.10", "creato"),
+        ]
+        assert "Riepilogo:" in capsys.readouterr().out
+
+    def test_update_hosts_errors_do_not_stop_batch(self, mocker):
+        """Test aggiornamento multiplo: un dominio non gestito non blocca gli altri hostname"""
+        mocker.patch.object(self.updater.ip_detector, 'get_public_ip', return_value=("203.0.113.10", "A"))
+        mocker.patch.object(
+            self.updater.client, 'get_zone_id',
+            side_effect=lambda domain: "zone-123" if domain == "example.com" else None
+        )
+        mocker.patch.object(self.updater.client, 'get_zone', return_value={"records": []})
+        mocker.patch.object(self.updater.client, 'create_records', return_value=[{"id": "record-1"}])
+
+        results = self.updater.update_hosts(["invalid", "www.notfound.com", "www.example.com"])
+
+        assert results[0][0] == "invalid" and results[0][3].startswith("errore: Hostname non valido")
+        assert results[1] == ("www.notfound.com", "A", "203.0.113.10", "errore: dominio non gestito da IONOS")
+        assert results[2] == ("www.example.com", "A", "203.0.113.10", "creato")
+
+    def test_update_hosts_zone_api_error_does_not_stop_batch(self, mocker, capsys):
+        """Test aggiornamento multiplo: un errore API su una zona non blocca le zone successive"""
+        mocker.patch.object(self.updater.ip_detector, 'get_public_ip', return_value=("203.0.113.10", "A"))
+        mocker.patch.object(self.updater.client, 'get_zone_id', side_effect=lambda domain: f"zone-{domain}")
+
+        def get_zone(zone_id, **filters):
+            if zone_id == "zone-a.com":
+                response = Mock(status_code=500)
+                raise HTTPStatusError("500 Server Error for url: /dns/v1/zones/zone-a.com", response)
+            return {"records": []}
+
+        mocker.patch.object(self.updater.client, 'get_zone', side_effect=get_zone)
+        mock_create = mocker.patch.object(
+            self.updater.client, 'create_records',
+            return_value=[{"name": "www.b.com", "type": "A", "id": "record-1"}]
+        )
+
+        results = self.updater.update_hosts(["www.a.com", "dev.a.com", "www.b.com"])
+
+        mock_create.assert_called_once_with("b.com", [{"name": "www", "type": "A", "content": "203.0.113.10"}])
+        assert results == [
+            ("www.a.com", "A", "203.0.113.10", "errore: 500 Server Error for url: /dns/v1/zones/zone-a.com"),
+            ("dev.a.com", "A", "203.0.113.10", "errore: 500 Server Error for url: /dns/v1/zones/zone-a.com"),
+            ("www.b.com", "A", "203.0.113.10", "creato"),
+        ]
+        assert "Riepilogo:" in capsys.readouterr().out
+
+    def test_close_releases_api_and_detector_connections(self, mocker):
+        """Test che close() chiuda sia il client API sia il trasporto del rilevatore IP"""
+        detector_transport = Mock()
+        updater = DNSUpdater("test_pub", "test_secret", ip_detector=PublicIPDetector(transport=detector_transport))
+        client_close = mocker.patch.object(updater.client, 'close')
+
+        updater.close()
+
+        client_close.assert_called_once()
+        detector_transport.close.assert_called_once()
+
+    def test_update_hosts_bulk_writes_per_zone(self, mocker):
+        """Test che i record di una zona vengano creati con una sola chiamata ed errori riportati per record"""
+        mocker.patch.object(self.updater.ip_detector, 'get_public_ip', return_value=("203.0.113.10", "A"))
+        mocker.patch.object(self.updater.client, 'get_zone_id', return_value="zone-123")
+        mocker.patch.object(self.updater.client, 'get_zone', return_value={"records": [
+            {"name": "a.example.com", "type": "A", "content": "192.0.2.1", "id": "record-a", "ttl": 60},
+            {"name": "b.example.com", "type": "A", "content": "192.0.2.2", "id": "record-b", "ttl": 60},
+        ]})
+        mock_create = mocker.patch.object(self.updater.client, 'create_records', return_value=[
+            {"name": "c.example.com", "type": "A", "id": "record-c"},
+            {"name": "d.example.com", "type": "A", "id": "record-d"},
+        ])
+        mocker.patch.object(
+            self.updater.client, 'update_records',
+            return_value={"record-a": None, "record-b": "500 Server Error"}
+        )
+
+        results = self.updater.update_hosts(["a.example.com", "b.example.com", "c.example.com", "d.example.com"])
+
+        mock_create.assert_called_once()
+        assert [outcome for _, _, _, outcome in results] == [
+            "aggiornato", "errore: 500 Server Error", "creato", "creato"
+        ]
@@ -0,0 +1,154 @@
+"""Test di carico e latenza contro i server finti di tests/fake_ionos.py"""
+import time
+
+import pytest
+from ionos_ddns import DNSUpdater, IONOSClient, PublicIPDetector, RateLimiter, UrllibTransport
+from tests.fake_ionos import FakeIONOSServer, FakeIPEchoServer
+
+
+def make_updater(server, echo=None, **options):
+    """DNSUpdater collegato ai server finti con il trasporto della libreria standard"""
+    detector = PublicIPDetector(transport=UrllibTransport())
+    if echo is not None:
+        detector.IPV4_SERVICES = [echo.url]
+    options.setdefault("ip_detector", detector)
+    return DNSUpdater("pub", "secret", base_url=server.url, transport=UrllibTransport(), **options)
+
+
+class TestFakeIONOSServer:
+    """Test del server finto e del comportamento del client sotto carico"""
+
+    def test_accounting_and_latency(self):
+        """Test conteggio richieste per endpoint, byte e latenza simulata"""
+        with FakeIONOSServer(latency=0.05) as server:
+            server.populate(2, 3)
+            client = IONOSClient("pub", "secret", base_url=server.url, transport=UrllibTransport())
+
+            start = time.monotonic()
+            client.get_zone(client.get_zone_id("example1.com"))
+            elapsed = time.monotonic() - start
+            client.close()
+
+            assert server.by_endpoint() == {"GET /dns/v1/zones": 1, "GET /dns/v1/zones/{zoneId}": 1}
+            assert server.bytes_out > 0
+            assert all(r.duration >= 0.05 for r in server.log)
+            assert elapsed >= 0.1
+
+    def test_api_key_required(self):
+        """Test che una chiave errata riceva 401"""
+        with FakeIONOSServer(api_key="pub.secret") as server:
+            server.populate(1, 0)
+            assert IONOSClient("pub", "secret", base_url=server.url).get_zones()
+            with pytest.raises(Exception, match="401"):
+                IONOSClient("pub", "wrong", base_url=server.url).get_zones()
+
+    def test_injected_errors_are_retried(self):
+        """Test che gli errori temporanei iniettati vengano superati dai nuovi tentativi"""
+        with FakeIONOSServer() as server:
+            server.populate(1, 1)
+            server.fail(503, method="GET", endpoint="/dns/v1/zones/{zoneId}", times=2,
+                        headers={"Retry-After": "0"})
+            updater = make_updater(server, ip_detector=StaticDetector())
+
+            updater.update_dns("host0.example0.com")
+
+            assert server.count("GET", "/dns/v1/zones/{zoneId}", status=503) == 2
+            assert server.count("PUT") == 1
+            assert updater.client.stats["retries"] == 2
+
+    def test_server_rate_limit_without_client_limit(self):
+        """Test che senza limite lato client l'API risponda 429 e il client ritenti"""
+        with FakeIONOSServer(rate_limit=50, burst=5, retry_after=0.05) as server:
+            server.populate(20, 1)
+            client = IONOSClient("pub", "secret", base_url=server.url, rate_limit=None,
+                                 transport=UrllibTransport())
+
+            zones = [client.get_zone(f"zone-{i}") for i in range(20)]
+            client.close()
+
+            assert all(zones)
+            assert server.count(status=429) > 0
+            assert client.stats["rate_limited"] == server.count(status=429)
+
+    def test_client_rate_limit_avoids_429(self):
+        """Test che un limite lato client inferiore a quello dell'API eviti i rifiuti"""
+        with FakeIONOSServer(rate_limit=50, burst=5) as server:
+            server.populate(20, 1)
+            client = IONOSClient("pub", "secret", base_url=server.url, transport=UrllibTransport())
+            client.limiter = RateLimiter(25, burst=3)
+
+            for i in range(20):
+                client.get_zone(f"zone-{i}")
+            client.close()
+
+            assert server.count(status=429) == 0
+            assert client.stats["throttled"] > 0
+
+    def test_large_zone_single_host(self):
+        """Test che con 50k record l'aggiornamento di un hostname non scarichi tutta la zona"""
+        with FakeIONOSServer() as server:
+            server.populate(1, 50_000)
+            updater = make_updater(server, ip_detector=StaticDetector())
+
+            updater.update_dns("host42.example0.com")
+
+            assert server.find_record("host42.example0.com", "A")["content"] == "203.0.113.42"
+            zone_read = [r for r in server.log if r.endpoint == "/dns/v1/zones/{zoneId}" and r.method == "GET"]
+            assert len(zone_read) == 1
+            assert zone_read[0].bytes_out < 1000
+
+    def test_many_zones_many_hosts(self):
+        """Test 500 zone e 1000 hostname: una lista zone e una lettura per zona toccata"""
+        with FakeIONOSServer() as server:
+            server.populate(500, 10)
+            hostnames = [f"host{j}.example{i}.com" for i in range(0, 500, 5) for j in range(10)]
+            updater = make_updater(server, ip_detector=StaticDetector(), rate_limit=None)
+
+            results = updater.update_hosts(hostnames)
+
+            assert len(results) == 1000
+            assert {outcome for _, _, _, outcome in results} == {"aggiornato"}
+            assert server.by_endpoint() == {
+                "GET /dns/v1/zones": 1,
+                "GET /dns/v1/zones/{zoneId}": 100,
+                "PATCH /dns/v1/zones/{zoneId}": 100,
+            }
+
+
+class TestFakeIPEchoServer:
+    """Test del servizio IP finto per esecuzioni complete offline"""
+
+    def test_full_run_offline(self, tmp_path):
+        """Test esecuzione completa: rilevamento IP, creazione e seconda esecuzione invariata"""
+        with FakeIONOSServer() as server, FakeIPEchoServer("203.0.113.9", latency=0.01) as echo:
+            server.add_zone("example.com", zone_id="zone-1")
+            state_file = tmp_path / "state.json"
+
+            make_updater(server, echo, state_file=state_file).update_dns("dev01.example.com")
+            echo.ip = "203.0.113.10"
+            make_updater(server, echo, state_file=state_file).update_dns("dev01.example.com")
+            make_updater(server, echo, state_file=state_file).update_dns("dev01.example.com")
+
+            assert server.find_record("dev01.example.com", "A")["content"] == "203.0.113.10"
+            assert echo.count("GET") == 3
+            # Creazione, aggiornamento, poi nessuna chiamata all'API
+            assert server.count("POST") == 1
+            assert server.count("PUT") == 1
+            assert server.count() == 6
+
+    def test_echo_errors_fall_back_to_next_service(self):
+        """Test che un servizio IP in errore faccia passare al successivo"""
+        with FakeIPEchoServer("203.0.113.1") as broken, FakeIPEchoServer("203.0.113.2") as working:
+            broken.fail(500)
+            detector = PublicIPDetector(transport=UrllibTransport())
+            detector.IPV4_SERVICES = [broken.url, working.url]
+
+            assert detector.get_public_ip() == ("203.0.113.2", "A")
+            assert broken.count(status=500) == 1
+
+
+class StaticDetector:
+    """Rilevatore IP che restituisce sempre lo stesso indirizzo"""
+
+    def get_public_ip(self):
+        return "203.0.113.42", "A"
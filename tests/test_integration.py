@@ -68,8 +68,9 @@ class TestIntegration:
         updater.update_dns("test.example.com")
 
         # Verifica che tutte le chiamate siano state effettuate
-        # 1. get IP, 2. get zones, 3-4. get zone details (2x), 5. create record
-        assert len(responses.calls) == 5
+        # 1. get IP, 2. get zones, 3. get zone details, 4. create record
+        # (l'ID zona per la scrittura arriva dalla cache, senza ricaricare la lista)
+        assert len(responses.calls) == 4
 
     @responses.activate
     def test_complete_flow_update_record(self):
@@ -138,8 +139,12 @@ class TestIntegration:
         updater.update_dns("test.example.com")
 
         # Verifica che tutte le chiamate siano state effettuate
-        # 1. get IP, 2. get zones, 3-4. get zone details (2x), 5. update record
-        assert len(responses.calls) == 5
+        # 1. get IP, 2. get zones, 3. get zone details, 4. update record
+        # (l'ID zona per la scrittura arriva dalla cache, senza ricaricare la lista)
+        assert len(responses.calls) == 4
+
+        # La zona viene letta filtrando lato server solo il record dell'hostname
+        assert responses.calls[2].request.params == {"recordName": "test.example.com", "recordType": "A"}
 
     @responses.activate
     def test_complete_flow_ipv6(self):
@@ -197,3 +202,63 @@ class TestIntegration:
         # Verifica che sia stato creato un record AAAA
         create_call = responses.calls[-1]
         assert "AAAA" in str(create_call.request.body)
+
+    @responses.activate
+    def test_complete_flow_multiple_hosts(self):
+        """Test flusso completo con più hostname: lista zone e zone scaricate una sola volta"""
+        responses.add(
+            responses.GET,
+            "https://api.ipify.org",
+            body="203.0.113.60",
+            status=200
+        )
+
+        responses.add(
+            responses.GET,
+            "https://api.hosting.ionos.com/dns/v1/zones",
+            json=[
+                {"name": "example.com", "id": "zone-123", "type": "NATIVE"},
+                {"name": "test.com", "id": "zone-456", "type": "NATIVE"}
+            ],
+            status=200
+        )
+
+        responses.add(
+            responses.GET,
+            "https://api.hosting.ionos.com/dns/v1/zones/zone-123",
+            json={
+                "name": "example.com",
+                "id": "zone-123",
+                "records": [
+                    {"name": "a.example.com", "type": "A", "content": "203.0.113.60", "id": "record-1"},
+                    {"name": "b.example.com", "type": "A", "content": "192.0.2.1", "id": "record-2"}
+                ]
+            },
+            status=200
+        )
+
+        responses.add(
+            responses.GET,
+            "https://api.hosting.ionos.com/dns/v1/zones/zone-456",
+            json={"name": "test.com", "id": "zone-456", "records": []},
+            status=200
+        )
+
+        responses.add(
+            responses.PATCH,
+            "https://api.hosting.ionos.com/dns/v1/zones/zone-123",
+            status=200
+        )
+
+        responses.add(
+            responses.POST,
+            "https://api.hosting.ionos.com/dns/v1/zones/zone-456/records",
+            json=[{"id": "record-3", "content": "203.0.113.60"}],
+            status=201
+        )
+
+        updater = DNSUpdater("test_pub", "test_secret")
+        updater.update_hosts(["a.example.com", "b.example.com", "c.test.com"])
+
+        # 1. get IP, 2. get zones, 3-4. una lettura per zona, 5. PATCH zona per b, 6. POST per c
+        assert len(responses.calls) == 6
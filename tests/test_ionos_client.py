@@ -1,7 +1,12 @@
 """Test per IONOSClient"""
+import json
+import threading
+
 import pytest
+import requests
 import responses
-from ionos_ddns import IONOSClient
+import ionos_ddns
+from ionos_ddns import HTTPStatusError, IONOSClient, RequestsTransport
 
 
 class TestIONOSClient:
@@ -272,3 +277,458 @@ class TestIONOSClient:
                 new_content="192.0.2.20",
                 record_id="record-789"
             )
+
+    def test_default_session_pool(self):
+        """Test che il client crei una sessione con pool di connessioni keep-alive"""
+        client = IONOSClient("test_pub_key", "test_secret_key", pool_size=4)
+
+        adapter = client.transport.session.get_adapter(f"{self.base_url}/dns/v1/zones")
+        assert adapter._pool_maxsize == 4
+        assert adapter._pool_block is True
+
+    @responses.activate
+    def test_all_calls_share_session(self, mocker):
+        """Test che tutte le chiamate passino dalla stessa sessione iniettata"""
+        session = requests.Session()
+        send_spy = mocker.spy(session, "request")
+        client = IONOSClient("test_pub_key", "test_secret_key", session=session)
+
+        responses.add(
+            responses.GET,
+            f"{self.base_url}/dns/v1/zones",
+            json=[{"name": "example.com", "id": "zone-123", "type": "NATIVE"}],
+            status=200
+        )
+        responses.add(
+            responses.PUT,
+            f"{self.base_url}/dns/v1/zones/zone-123/records/record-789",
+            json={"id": "record-789", "content": "192.0.2.20"},
+            status=200
+        )
+
+        client.update_record("example.com", "test", "A", "192.0.2.20", "record-789")
+
+        assert isinstance(client.transport, RequestsTransport)
+        assert client.transport.session is session
+        assert send_spy.call_count == 2
+
+    @responses.activate
+    def test_get_zone_id_uses_cache(self):
+        """Test che la lista zone venga scaricata una sola volta entro il TTL"""
+        responses.add(
+            responses.GET,
+            f"{self.base_url}/dns/v1/zones",
+            json=[{"name": "example.com", "id": "zone-123", "type": "NATIVE"}],
+            status=200
+        )
+
+        assert self.client.get_zone_id("example.com") == "zone-123"
+        assert self.client.get_zone_id("example.com") == "zone-123"
+        assert len(responses.calls) == 1
+
+    @responses.activate
+    def test_get_zone_id_cache_expired(self, mocker):
+        """Test che la cache scaduta forzi un nuovo download della lista zone"""
+        client = IONOSClient("test_pub_key", "test_secret_key", zone_cache_ttl=60)
+        responses.add(
+            responses.GET,
+            f"{self.base_url}/dns/v1/zones",
+            json=[{"name": "example.com", "id": "zone-123", "type": "NATIVE"}],
+            status=200
+        )
+
+        mock_time = mocker.patch("ionos_ddns.time.time", return_value=1000.0)
+        client.get_zone_id("example.com")
+        mock_time.return_value = 1061.0
+        client.get_zone_id("example.com")
+
+        assert len(responses.calls) == 2
+
+    @responses.activate
+    def test_zone_cache_persisted(self, tmp_path):
+        """Test che la cache su file eviti la lista zone in un'esecuzione successiva"""
+        cache_file = tmp_path / "zones.json"
+        responses.add(
+            responses.GET,
+            f"{self.base_url}/dns/v1/zones",
+            json=[{"name": "example.com", "id": "zone-123", "type": "NATIVE"}],
+            status=200
+        )
+
+        IONOSClient("test_pub_key", "test_secret_key", zone_cache_file=cache_file).get_zone_id("example.com")
+        client = IONOSClient("test_pub_key", "test_secret_key", zone_cache_file=cache_file)
+
+        assert client.get_zone_id("example.com") == "zone-123"
+        assert len(responses.calls) == 1
+
+        # Un altro account non deve riusare la cache
+        other = IONOSClient("other_pub_key", "test_secret_key", zone_cache_file=cache_file)
+        assert other._cached_zone_id("example.com") is None
+
+    def test_zone_cache_save_is_serialized(self, tmp_path, mocker):
+        """Test che un thread non modifichi la cache degli ID zona mentre un altro la salva"""
+        cache_file = tmp_path / "zones.json"
+        client = IONOSClient("test_pub_key", "test_secret_key", zone_cache_file=cache_file)
+        client._zone_cache = {"example.com": ("zone-1", 1e12), "example.org": ("zone-2", 1e12)}
+        write_json_atomic = ionos_ddns.write_json_atomic
+        invalidating = []
+
+        def slow_write(path, data):
+            if not invalidating:
+                # Mentre il primo salvataggio è in corso un altro thread invalida una zona
+                thread = threading.Thread(target=client.invalidate_zone, args=("zone-2",))
+                invalidating.append(thread)
+                thread.start()
+                thread.join(0.2)
+                assert thread.is_alive(), "invalidate_zone non ha atteso la fine del salvataggio"
+            write_json_atomic(path, data)
+
+        mocker.patch("ionos_ddns.write_json_atomic", side_effect=slow_write)
+        client.invalidate_zone("zone-1")
+        invalidating[0].join()
+
+        assert client._zone_cache == {}
+        assert json.loads(cache_file.read_text())["zones"] == {}
+
+    @responses.activate
+    def test_zone_cache_invalidated_on_404(self):
+        """Test che un 404 dalla zona invalidi la cache e la scrittura venga ripetuta"""
+        responses.add(
+            responses.GET,
+            f"{self.base_url}/dns/v1/zones",
+            json=[{"name": "example.com", "id": "zone-old", "type": "NATIVE"}],
+            status=200
+        )
+        responses.add(
+            responses.GET,
+            f"{self.base_url}/dns/v1/zones",
+            json=[{"name": "example.com", "id": "zone-new", "type": "NATIVE"}],
+            status=200
+        )
+        responses.add(
+            responses.POST,
+            f"{self.base_url}/dns/v1/zones/zone-old/records",
+            status=404
+        )
+        responses.add(
+            responses.POST,
+            f"{self.base_url}/dns/v1/zones/zone-new/records",
+            json=[{"id": "record-1"}],
+            status=201
+        )
+
+        self.client.get_zone_id("example.com")
+        result = self.client.create_record("example.com", "test", "A", "192.0.2.10")
+
+        assert result == [{"id": "record-1"}]
+        assert self.client.get_zone_id("example.com") == "zone-new"
+
+    @responses.activate
+    def test_get_zone_not_found_invalidates_cache(self):
+        """Test che get_zone con 404 rimuova l'ID zona dalla cache"""
+        responses.add(
+            responses.GET,
+            f"{self.base_url}/dns/v1/zones",
+            json=[{"name": "example.com", "id": "zone-123", "type": "NATIVE"}],
+            status=200
+        )
+        responses.add(
+            responses.GET,
+            f"{self.base_url}/dns/v1/zones/zone-123",
+            status=404
+        )
+
+        self.client.get_zone_id("example.com")
+        assert self.client.get_zone("zone-123") is None
+        assert self.client._cached_zone_id("example.com") is None
+
+    @responses.activate
+    def test_create_records_single_post(self):
+        """Test creazione di più record con un'unica POST"""
+        responses.add(
+            responses.GET,
+            f"{self.base_url}/dns/v1/zones",
+            json=[{"name": "example.com", "id": "zone-123", "type": "NATIVE"}],
+            status=200
+        )
+        responses.add(
+            responses.POST,
+            f"{self.base_url}/dns/v1/zones/zone-123/records",
+            json=[{"id": "record-1"}, {"id": "record-2"}],
+            status=201
+        )
+
+        self.client.create_records("example.com", [
+            {"name": "a", "type": "A", "content": "192.0.2.1"},
+            {"name": "b", "type": "AAAA", "content": "2001:db8::1"},
+        ])
+
+        assert len(responses.calls) == 2
+        body = json.loads(responses.calls[1].request.body)
+        assert [record["name"] for record in body] == ["a.example.com", "b.example.com"]
+        assert body[1]["type"] == "AAAA"
+
+    @responses.activate
+    def test_update_records_patch(self):
+        """Test aggiornamento in blocco tramite PATCH della zona"""
+        responses.add(
+            responses.GET,
+            f"{self.base_url}/dns/v1/zones",
+            json=[{"name": "example.com", "id": "zone-123", "type": "NATIVE"}],
+            status=200
+        )
+        responses.add(
+            responses.PATCH,
+            f"{self.base_url}/dns/v1/zones/zone-123",
+            status=200
+        )
+
+        result = self.client.update_records("example.com", [
+            {"id": "record-1", "name": "a", "type": "A", "content": "192.0.2.10", "ttl": 60},
+            {"id": "record-2", "name": "b", "type": "A", "content": "192.0.2.10"},
+        ])
+
+        assert result == {"record-1": None, "record-2": None}
+        body = json.loads(responses.calls[1].request.body)
+        assert body[0] == {"name": "a.example.com", "type": "A", "content": "192.0.2.10",
+                           "disabled": False, "ttl": 60}
+        assert "ttl" not in body[1]
+
+    @responses.activate
+    def test_update_records_fallback_to_put(self):
+        """Test ripiego su PUT per record con esito per singolo record"""
+        responses.add(
+            responses.GET,
+            f"{self.base_url}/dns/v1/zones",
+            json=[{"name": "example.com", "id": "zone-123", "type": "NATIVE"}],
+            status=200
+        )
+        responses.add(
+            responses.PATCH,
+            f"{self.base_url}/dns/v1/zones/zone-123",
+            status=405
+        )
+        responses.add(
+            responses.PUT,
+            f"{self.base_url}/dns/v1/zones/zone-123/records/record-1",
+            json={"id": "record-1"},
+            status=200
+        )
+        responses.add(
+            responses.PUT,
+            f"{self.base_url}/dns/v1/zones/zone-123/records/record-2",
+            status=500
+        )
+
+        result = self.client.update_records("example.com", [
+            {"id": "record-1", "name": "a", "type": "A", "content": "192.0.2.10"},
+            {"id": "record-2", "name": "b", "type": "A", "content": "192.0.2.10"},
+        ])
+
+        assert result["record-1"] is None
+        assert "500" in result["record-2"]
+
+    @responses.activate
+    def test_get_zone_server_side_filter(self):
+        """Test che i filtri per nome e tipo vengano passati all'API"""
+        responses.add(
+            responses.GET,
+            f"{self.base_url}/dns/v1/zones/zone-123",
+            json={"id": "zone-123", "records": [{"name": "www.example.com", "type": "A"}]},
+            status=200
+        )
+
+        zone = self.client.get_zone("zone-123", record_name="www.example.com", record_type="A")
+
+        assert len(zone["records"]) == 1
+        request = responses.calls[0].request
+        assert request.params == {"recordName": "www.example.com", "recordType": "A"}
+
+    @responses.activate
+    def test_get_zone_filter_rejected_falls_back(self):
+        """Test ripiego sul download completo se l'API rifiuta i filtri"""
+        responses.add(
+            responses.GET,
+            f"{self.base_url}/dns/v1/zones/zone-123",
+            status=400
+        )
+        responses.add(
+            responses.GET,
+            f"{self.base_url}/dns/v1/zones/zone-123",
+            json={"id": "zone-123", "records": []},
+            status=200
+        )
+
+        zone = self.client.get_zone("zone-123", record_name="www.example.com")
+
+        assert zone == {"id": "zone-123", "records": []}
+        assert responses.calls[1].request.params == {}
+
+    @responses.activate
+    def test_retry_after_on_429(self, mocker):
+        """Test che una GET rifiutata con 429 venga ripetuta dopo il Retry-After"""
+        clock = {"now": 100.0}
+        mocker.patch("ionos_ddns.time.monotonic", side_effect=lambda: clock["now"])
+        sleep = mocker.patch("ionos_ddns.time.sleep",
+                             side_effect=lambda seconds: clock.__setitem__("now", clock["now"] + seconds))
+        client = IONOSClient("test_pub_key", "test_secret_key")
+        responses.add(responses.GET, f"{self.base_url}/dns/v1/zones",
+                      status=429, headers={"Retry-After": "7"})
+        responses.add(responses.GET, f"{self.base_url}/dns/v1/zones",
+                      json=[{"name": "example.com", "id": "zone-123", "type": "NATIVE"}], status=200)
+
+        zones = client.get_zones()
+
+        assert zones[0]["id"] == "zone-123"
+        assert len(responses.calls) == 2
+        assert sum(call.args[0] for call in sleep.call_args_list) == pytest.approx(7.0)
+        assert client.stats["retries"] == 1
+        assert client.stats["rate_limited"] == 1
+
+    @responses.activate
+    def test_retry_backoff_is_bounded(self, mocker):
+        """Test backoff esponenziale con jitter e rinuncia dopo max_retries"""
+        sleep = mocker.patch("ionos_ddns.time.sleep")
+        mocker.patch("ionos_ddns.random.uniform", side_effect=lambda low, high: high)
+        client = IONOSClient("test_pub_key", "test_secret_key", max_retries=3, rate_limit=None)
+        responses.add(responses.GET, f"{self.base_url}/dns/v1/zones", status=503)
+
+        with pytest.raises(HTTPStatusError):
+            client.get_zones()
+
+        assert len(responses.calls) == 4
+        assert [call.args[0] for call in sleep.call_args_list] == [1.0, 2.0, 4.0]
+        assert client.stats["retries"] == 3
+
+    @responses.activate
+    def test_post_is_not_retried(self, mocker):
+        """Test che le creazioni non vengano ripetute per non duplicare i record"""
+        sleep = mocker.patch("ionos_ddns.time.sleep")
+        responses.add(responses.GET, f"{self.base_url}/dns/v1/zones",
+                      json=[{"name": "example.com", "id": "zone-123", "type": "NATIVE"}], status=200)
+        responses.add(responses.POST, f"{self.base_url}/dns/v1/zones/zone-123/records",
+                      status=429, headers={"Retry-After": "1"})
+
+        with pytest.raises(HTTPStatusError):
+            self.client.create_record("example.com", "test", "A", "192.0.2.1")
+
+        assert len(responses.calls) == 2
+        sleep.assert_not_called()
+        assert self.client.stats["retries"] == 0
+
+    @responses.activate
+    def test_update_records_429_does_not_fall_back_to_put(self, mocker):
+        """Test che un 429 persistente sulla PATCH non scateni le PUT per record"""
+        mocker.patch("ionos_ddns.time.sleep")
+        client = IONOSClient("test_pub_key", "test_secret_key", max_retries=1)
+        responses.add(responses.GET, f"{self.base_url}/dns/v1/zones",
+                      json=[{"name": "example.com", "id": "zone-123", "type": "NATIVE"}], status=200)
+        responses.add(responses.PATCH, f"{self.base_url}/dns/v1/zones/zone-123", status=429)
+
+        with pytest.raises(HTTPStatusError):
+            client.update_records("example.com", [
+                {"id": "record-1", "name": "a", "type": "A", "content": "192.0.2.10"},
+            ])
+
+        assert [call.request.method for call in responses.calls] == ["GET", "PATCH", "PATCH"]
+
+    @responses.activate
+    def test_update_records_401_does_not_fall_back_to_put(self):
+        """Test che credenziali rifiutate sulla PATCH non scatenino le PUT per record"""
+        responses.add(responses.GET, f"{self.base_url}/dns/v1/zones",
+                      json=[{"name": "example.com", "id": "zone-123", "type": "NATIVE"}], status=200)
+        responses.add(responses.PATCH, f"{self.base_url}/dns/v1/zones/zone-123", status=401)
+
+        with pytest.raises(HTTPStatusError, match="401"):
+            self.client.update_records("example.com", [
+                {"id": "record-1", "name": "a", "type": "A", "content": "192.0.2.10"},
+                {"id": "record-2", "name": "b", "type": "A", "content": "192.0.2.10"},
+            ])
+
+        assert [call.request.method for call in responses.calls] == ["GET", "PATCH"]
+
+
+    @responses.activate
+    def test_update_records_404_falls_back_without_zone_refresh(self):
+        """Test che un 404 sulla PATCH porti subito alle PUT, senza rileggere le zone"""
+        responses.add(responses.GET, f"{self.base_url}/dns/v1/zones",
+                      json=[{"name": "example.com", "id": "zone-123", "type": "NATIVE"}], status=200)
+        responses.add(responses.PATCH, f"{self.base_url}/dns/v1/zones/zone-123", status=404)
+        responses.add(responses.PUT, f"{self.base_url}/dns/v1/zones/zone-123/records/record-1",
+                      json={"id": "record-1"}, status=200)
+
+        result = self.client.update_records("example.com", [
+            {"id": "record-1", "name": "a", "type": "A", "content": "192.0.2.10"},
+        ])
+
+        assert result == {"record-1": None}
+        assert [call.request.method for call in responses.calls] == ["GET", "PATCH", "PUT"]
+
+    @responses.activate
+    def test_update_records_same_name_and_type_use_put(self):
+        """Test che record con lo stesso nome e tipo (round-robin) non vengano fusi dalla PATCH"""
+        responses.add(responses.GET, f"{self.base_url}/dns/v1/zones",
+                      json=[{"name": "example.com", "id": "zone-123", "type": "NATIVE"}], status=200)
+        responses.add(responses.PATCH, f"{self.base_url}/dns/v1/zones/zone-123", status=200)
+        for record_id in ("record-1", "record-2"):
+            responses.add(responses.PUT, f"{self.base_url}/dns/v1/zones/zone-123/records/{record_id}",
+                          json={"id": record_id}, status=200)
+
+        result = self.client.update_records("example.com", [
+            {"id": "record-1", "name": "www", "type": "A", "content": "192.0.2.10"},
+            {"id": "record-2", "name": "www", "type": "A", "content": "192.0.2.11"},
+            {"id": "record-3", "name": "www", "type": "AAAA", "content": "2001:db8::10"},
+        ])
+
+        assert result == {"record-1": None, "record-2": None, "record-3": None}
+        patch = [json.loads(call.request.body) for call in responses.calls if call.request.method == "PATCH"]
+        assert patch == [[{"name": "www.example.com", "type": "AAAA", "content": "2001:db8::10", "disabled": False}]]
+        assert sorted(call.request.url.rsplit("/", 1)[1] for call in responses.calls
+                      if call.request.method == "PUT") == ["record-1", "record-2"]
+
+
+class TestRateLimiter:
+    """Test per il limitatore a token bucket"""
+
+    def make_clock(self, mocker):
+        """Orologio finto che avanza solo durante le attese"""
+        clock = {"now": 100.0}
+        mocker.patch("ionos_ddns.time.monotonic", side_effect=lambda: clock["now"])
+        sleep = mocker.patch("ionos_ddns.time.sleep",
+                             side_effect=lambda seconds: clock.__setitem__("now", clock["now"] + seconds))
+        return clock, sleep
+
+    def test_burst_then_rate(self, mocker):
+        """Test che dopo il burst le richieste vengano distanziate secondo il rate"""
+        from ionos_ddns import RateLimiter
+        clock, _ = self.make_clock(mocker)
+        limiter = RateLimiter(rate=2, burst=2)
+
+        waits = [limiter.acquire() for _ in range(4)]
+
+        assert waits == [0.0, 0.0, 0.5, 0.5]
+        assert clock["now"] == pytest.approx(101.0)
+
+    def test_pause_blocks_requests(self, mocker):
+        """Test che pause() sospenda le richieste anche senza limite di frequenza"""
+        from ionos_ddns import RateLimiter
+        clock, _ = self.make_clock(mocker)
+        limiter = RateLimiter(rate=None)
+
+        assert limiter.acquire() == 0.0
+        limiter.pause(3)
+        assert limiter.acquire() == pytest.approx(3.0)
+
+    @responses.activate
+    def test_client_counts_throttled_requests(self, mocker):
+        """Test che il client conti le richieste rallentate dal limitatore"""
+        self.make_clock(mocker)
+        client = IONOSClient("test_pub_key", "test_secret_key", rate_limit=1)
+        responses.add(responses.GET, "https://api.hosting.ionos.com/dns/v1/zones/zone-123",
+                      json={"id": "zone-123", "records": []}, status=200)
+
+        for _ in range(3):
+            client.get_zone("zone-123")
+
+        assert client.stats["requests"] == 3
+        assert client.stats["throttled"] == 2
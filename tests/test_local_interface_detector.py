@@ -0,0 +1,128 @@
+"""Test per LocalInterfaceDetector"""
+import socket
+import struct
+import responses
+from ionos_ddns import (
+    IFA_FLAGS,
+    IFA_LABEL,
+    IFA_LOCAL,
+    RTM_NEWADDR,
+    InterfaceAddress,
+    LocalInterfaceDetector,
+    PublicIPDetector,
+    interface_fingerprint,
+    parse_netlink_addresses,
+)
+
+
+def netlink_addr_message(family, address, prefixlen=24, scope=0, index=2, label=None, flags=None):
+    """Costruisce un messaggio RTM_NEWADDR come quelli inviati dal kernel"""
+    def attr(attr_type, payload):
+        length = 4 + len(payload)
+        return struct.pack("=HH", length, attr_type) + payload + b"\0" * ((4 - length % 4) % 4)
+
+    body = struct.pack("=BBBBI", family, prefixlen, 0, scope, index)
+    body += attr(IFA_LOCAL, socket.inet_pton(family, address))
+    if label:
+        body += attr(IFA_LABEL, label.encode() + b"\0")
+    if flags is not None:
+        body += attr(IFA_FLAGS, struct.pack("=I", flags))
+    return struct.pack("=IHHII", 16 + len(body), RTM_NEWADDR, 0, 0, 0) + body
+
+
+class TestLocalInterfaceDetector:
+    """Test suite per LocalInterfaceDetector"""
+
+    def test_accepts_only_global_stable_addresses(self):
+        """Test che vengano scartati indirizzi privati, link-local, temporanei e deprecati"""
+        detector = LocalInterfaceDetector()
+
+        assert detector.accepts(InterfaceAddress("eth0", "2a00:1450:4001::1", 64, 0, 0x80))
+        assert detector.accepts(InterfaceAddress("ppp0", "93.184.216.34", 32, 0, 0x80))
+        assert not detector.accepts(InterfaceAddress("eth0", "192.168.1.10", 24, 0, 0x80))
+        assert not detector.accepts(InterfaceAddress("eth0", "fd00::2", 64, 0, 0x80))
+        assert not detector.accepts(InterfaceAddress("eth0", "fe80::1", 64, 253, 0x80))
+        assert not detector.accepts(InterfaceAddress("eth0", "2a00:1450:4001::2", 64, 0, 0x01))
+        assert not detector.accepts(InterfaceAddress("eth0", "2a00:1450:4001::3", 64, 0, 0x20))
+
+    def test_ipv4_secondary_address_is_accepted(self):
+        """Test che un IPv4 secondario (flag 0x01, IFA_F_SECONDARY) non venga scambiato per temporaneo"""
+        detector = LocalInterfaceDetector()
+
+        assert detector.accepts(InterfaceAddress("eth0", "93.184.216.35", 24, 0, 0x01))
+        assert detector.accepts(InterfaceAddress("eth0", "93.184.216.36", 24, 0, 0x81))
+
+    def test_ipv4_secondary_address_in_fingerprint(self, mocker):
+        """Test che un IPv4 secondario entri nell'impronta e un IPv6 temporaneo no"""
+        dump = mocker.patch("ionos_ddns.netlink_dump_addresses")
+        dump.side_effect = lambda family: (
+            [InterfaceAddress("eth0", "93.184.216.34", 24, 0, 0x80)] if family == socket.AF_INET
+            else [InterfaceAddress("eth0", "2a00:1450:4001::1", 64, 0, 0x80)])
+        base = interface_fingerprint()
+
+        dump.side_effect = lambda family: (
+            [InterfaceAddress("eth0", "93.184.216.34", 24, 0, 0x80),
+             InterfaceAddress("eth0", "93.184.216.35", 24, 0, 0x01)] if family == socket.AF_INET
+            else [InterfaceAddress("eth0", "2a00:1450:4001::1", 64, 0, 0x80)])
+        with_secondary = interface_fingerprint()
+
+        dump.side_effect = lambda family: (
+            [InterfaceAddress("eth0", "93.184.216.34", 24, 0, 0x80)] if family == socket.AF_INET
+            else [InterfaceAddress("eth0", "2a00:1450:4001::1", 64, 0, 0x80),
+                  InterfaceAddress("eth0", "2a00:1450:4001::2", 64, 0, 0x01)])
+
+        assert with_secondary != base
+        assert interface_fingerprint() == base
+
+    def test_interface_and_prefix_filters(self):
+        """Test filtri per nome interfaccia (con jolly) e per prefisso"""
+        detector = LocalInterfaceDetector(interfaces=["ppp*"], prefixes=["2a00:1450::/32"])
+
+        assert detector.accepts(InterfaceAddress("ppp0", "2a00:1450:4001::1", 64, 0, 0))
+        assert not detector.accepts(InterfaceAddress("eth0", "2a00:1450:4001::1", 64, 0, 0))
+        assert not detector.accepts(InterfaceAddress("ppp0", "2a01:4f8::1", 64, 0, 0))
+        # Il prefisso IPv6 non filtra via gli indirizzi IPv4
+        assert not detector.accepts(InterfaceAddress("ppp0", "93.184.216.34", 32, 0, 0))
+
+    def test_read_if_inet6(self, tmp_path, mocker):
+        """Test lettura degli indirizzi IPv6 da /proc/net/if_inet6"""
+        proc_file = tmp_path / "if_inet6"
+        proc_file.write_text(
+            "2a001450400100000000000000000001 02 40 00 80     eth0\n"
+            "2a001450400100000000000000000002 02 40 00 01     eth0\n"
+            "fe800000000000000000000000000001 02 40 20 80     eth0\n"
+            "00000000000000000000000000000001 01 80 10 80       lo\n"
+        )
+        mocker.patch.object(LocalInterfaceDetector, "IF_INET6_PATH", str(proc_file))
+        mocker.patch("ionos_ddns.netlink_dump_addresses", side_effect=OSError("netlink non disponibile"))
+
+        detector = LocalInterfaceDetector()
+
+        assert detector.addresses(6) == ["2a00:1450:4001::1"]
+        assert detector.addresses(4) == []
+
+    def test_parse_netlink_addresses(self):
+        """Test decodifica dei messaggi netlink RTM_NEWADDR"""
+        data = (
+            netlink_addr_message(socket.AF_INET, "93.184.216.34", label="ppp0")
+            + netlink_addr_message(socket.AF_INET6, "2a00:1450:4001::1", prefixlen=64, flags=0x101)
+        )
+
+        messages = list(parse_netlink_addresses(data))
+
+        assert messages[0] == (RTM_NEWADDR, InterfaceAddress("ppp0", "93.184.216.34", 24, 0, 0))
+        assert messages[1][1].address == "2a00:1450:4001::1"
+        assert messages[1][1].flags == 0x101
+
+    @responses.activate
+    def test_public_ip_detector_prefers_local_backend(self, mocker):
+        """Test che il backend locale venga usato prima dei servizi HTTP"""
+        mocker.patch(
+            "ionos_ddns.netlink_dump_addresses",
+            return_value=[InterfaceAddress("ppp0", "93.184.216.34", 32, 0, 0x80)]
+        )
+
+        detector = PublicIPDetector(backends=[LocalInterfaceDetector()])
+
+        assert detector.get_public_ip() == ("93.184.216.34", "A")
+        assert len(responses.calls) == 0
@@ -0,0 +1,207 @@
+"""Test per Metrics, MetricsServer e la strumentazione di rilevatore, client e updater"""
+import os
+import stat
+import urllib.error
+import urllib.request
+from unittest.mock import Mock
+
+import pytest
+from ionos_ddns import (Daemon, DNSUpdater, Metrics, MetricsServer, PublicIPDetector,
+                        UrllibTransport)
+from tests.fake_ionos import FakeIONOSServer, FakeIPEchoServer
+
+
+def parse(text):
+    """Converte il formato testuale di Prometheus in {riga senza valore: valore}"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, value = line.rsplit(" ", 1)
+            samples[series] = float(value)
+    return samples
+
+
+class TestMetrics:
+    """Test per il registro delle metriche"""
+
+    def test_counter_and_gauge(self):
+        """Test formato di contatori e gauge con etichette"""
+        metrics = Metrics()
+        metrics.inc("ionos_ddns_runs_total", result="changed")
+        metrics.inc("ionos_ddns_runs_total", result="changed")
+        metrics.set("ionos_ddns_last_run_timestamp_seconds", 1700000000.5)
+
+        text = metrics.render()
+
+        assert "# TYPE ionos_ddns_runs_total counter" in text
+        assert 'ionos_ddns_runs_total{result="changed"} 2\n' in text
+        assert "ionos_ddns_last_run_timestamp_seconds 1700000000.5\n" in text
+        assert metrics.value("ionos_ddns_runs_total", result="changed") == 2
+        assert metrics.value("ionos_ddns_runs_total", result="error") == 0
+
+    def test_histogram(self):
+        """Test bucket cumulativi, somma e conteggio di un istogramma"""
+        metrics = Metrics()
+        for value in (0.003, 0.2, 42):
+            metrics.observe("ionos_ddns_phase_duration_seconds", value, phase="detect")
+
+        samples = parse(metrics.render())
+
+        prefix = 'ionos_ddns_phase_duration_seconds'
+        assert samples[f'{prefix}_bucket{{phase="detect",le="0.005"}}'] == 1
+        assert samples[f'{prefix}_bucket{{phase="detect",le="0.25"}}'] == 2
+        assert samples[f'{prefix}_bucket{{phase="detect",le="30.0"}}'] == 2
+        assert samples[f'{prefix}_bucket{{phase="detect",le="+Inf"}}'] == 3
+        assert samples[f'{prefix}_sum{{phase="detect"}}'] == pytest.approx(42.203)
+        assert samples[f'{prefix}_count{{phase="detect"}}'] == 3
+
+    def test_label_escaping(self):
+        """Test escape di virgolette, backslash e a capo nei valori delle etichette"""
+        metrics = Metrics()
+        metrics.inc("ionos_ddns_detections_total", family="ipv4", source='a"b\\c\nd')
+
+        assert 'source="a\\"b\\\\c\\nd"' in metrics.render()
+
+    def test_empty_registry(self):
+        """Test che senza campioni non venga prodotto nulla"""
+        assert Metrics().render() == ""
+
+    def test_write_textfile(self, tmp_path):
+        """Test scrittura atomica e leggibile da node_exporter"""
+        metrics = Metrics()
+        metrics.inc("ionos_ddns_runs_total", result="unchanged")
+        path = tmp_path / "textfile" / "ionos_ddns.prom"
+
+        assert metrics.write_textfile(path)
+
+        assert path.read_text() == metrics.render()
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+        assert os.listdir(path.parent) == ["ionos_ddns.prom"]
+
+    def test_write_textfile_error(self, tmp_path, capsys):
+        """Test che un errore di scrittura venga segnalato senza eccezioni"""
+        blocker = tmp_path / "file"
+        blocker.write_text("")
+
+        assert not Metrics().write_textfile(blocker / "ionos_ddns.prom")
+        assert "ATTENZIONE: impossibile scrivere le metriche" in capsys.readouterr().out
+
+
+class TestInstrumentation:
+    """Test delle metriche raccolte durante un aggiornamento completo"""
+
+    def make_updater(self, server, echo, **options):
+        metrics = Metrics()
+        detector = PublicIPDetector(transport=UrllibTransport(), metrics=metrics)
+        detector.IPV4_SERVICES = [echo.url]
+        return DNSUpdater("pub", "secret", base_url=server.url, transport=UrllibTransport(),
+                          ip_detector=detector, rate_limit=None, metrics=metrics, **options)
+
+    def test_changed_run(self):
+        """Test fasi, richieste per endpoint, servizio IP ed esito di un aggiornamento"""
+        with FakeIONOSServer() as server, FakeIPEchoServer("203.0.113.42") as echo:
+            server.populate(1, 1)
+            updater = self.make_updater(server, echo)
+
+            updater.update_dns("host0.example0.com")
+            metrics = updater.metrics
+
+            assert metrics.value("ionos_ddns_runs_total", result="changed") == 1
+            assert metrics.value("ionos_ddns_records_total", type="A", outcome="updated") == 1
+            for phase in ("detect", "zone_lookup", "zone_read", "write", "total"):
+                assert metrics.value("ionos_ddns_phase_duration_seconds", phase=phase) == 1
+            assert metrics.value("ionos_ddns_detections_total", family="ipv4", source=echo.url) == 1
+            assert metrics.value("ionos_ddns_ip_service_requests_total",
+                                 service=echo.url, family="ipv4", result="ok") == 1
+            assert metrics.value("ionos_ddns_api_requests_total", method="GET",
+                                 endpoint="/dns/v1/zones", status="200") == 1
+            assert metrics.value("ionos_ddns_api_request_duration_seconds", method="PUT",
+                                 endpoint="/dns/v1/zones/{zoneId}/records/{recordId}") == 1
+            assert metrics.value("ionos_ddns_last_success_timestamp_seconds") > 0
+
+    def test_unchanged_run(self, tmp_path):
+        """Test che un'esecuzione con IP invariato risulti unchanged senza richieste API"""
+        with FakeIONOSServer() as server, FakeIPEchoServer("203.0.113.42") as echo:
+            server.populate(1, 1, content="203.0.113.42")
+            state_file = tmp_path / "state.json"
+
+            self.make_updater(server, echo, state_file=state_file).update_dns("host0.example0.com")
+            updater = self.make_updater(server, echo, state_file=state_file)
+            updater.update_dns("host0.example0.com")
+
+            text = updater.metrics.render()
+            assert updater.metrics.value("ionos_ddns_runs_total", result="unchanged") == 1
+            assert updater.metrics.value("ionos_ddns_records_total", type="A", outcome="unchanged") == 1
+            assert "ionos_ddns_api_requests_total" not in text
+
+    def test_error_run(self):
+        """Test che un dominio non gestito venga contato come errore"""
+        with FakeIONOSServer() as server, FakeIPEchoServer("203.0.113.42") as echo:
+            server.populate(1, 0)
+            updater = self.make_updater(server, echo)
+
+            with pytest.raises(SystemExit):
+                updater.update_dns("www.other.org")
+
+            assert updater.metrics.value("ionos_ddns_runs_total", result="error") == 1
+            assert updater.metrics.value("ionos_ddns_last_success_timestamp_seconds") == 0
+
+    def test_retries_and_failed_services(self):
+        """Test conteggio di nuovi tentativi API e servizi IP in errore"""
+        with FakeIONOSServer() as server, FakeIPEchoServer("203.0.113.42") as echo:
+            server.populate(2, 2)
+            server.fail(503, method="GET", endpoint="/dns/v1/zones/{zoneId}", times=1,
+                        headers={"Retry-After": "0"})
+            echo.fail(500, times=1)
+            updater = self.make_updater(server, echo)
+            updater.ip_detector.IPV4_SERVICES = [echo.url, echo.url]
+
+            results = updater.update_hosts(["host0.example0.com", "host1.example0.com", "new.example1.com"])
+            metrics = updater.metrics
+
+            assert [outcome for _, _, _, outcome in results] == ["aggiornato", "aggiornato", "creato"]
+            assert metrics.value("ionos_ddns_ip_service_requests_total",
+                                 service=echo.url, family="ipv4", result="error") == 1
+            assert metrics.value("ionos_ddns_api_requests_total", method="GET",
+                                 endpoint="/dns/v1/zones/{zoneId}", status="503") == 1
+            assert metrics.value("ionos_ddns_api_retries_total", method="GET",
+                                 endpoint="/dns/v1/zones/{zoneId}") == 1
+            assert metrics.value("ionos_ddns_records_total", type="A", outcome="updated") == 2
+            assert metrics.value("ionos_ddns_records_total", type="A", outcome="created") == 1
+            assert metrics.value("ionos_ddns_phase_duration_seconds", phase="zone_read") == 2
+
+
+class TestMetricsServer:
+    """Test per l'endpoint /metrics del daemon"""
+
+    def test_serves_metrics(self):
+        """Test GET /metrics e 404 sugli altri percorsi"""
+        metrics = Metrics()
+        metrics.inc("ionos_ddns_runs_total", result="changed")
+        server = MetricsServer(metrics, port=0).start()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as response:
+                assert response.headers["Content-Type"] == MetricsServer.CONTENT_TYPE
+                assert response.read().decode() == metrics.render()
+            with pytest.raises(urllib.error.HTTPError, match="404"):
+                urllib.request.urlopen(f"http://127.0.0.1:{server.port}/", timeout=5)
+        finally:
+            server.stop()
+
+    def test_daemon_writes_textfile_every_cycle(self, tmp_path):
+        """Test che il daemon riscriva il textfile dopo ogni ciclo"""
+        path = tmp_path / "ionos_ddns.prom"
+        updater = Mock()
+        updater.metrics = Metrics()
+        daemon = Daemon(Mock(return_value=updater), ["test.example.com"], interval=0, jitter=0,
+                        metrics_file=path)
+
+        def update(hostname):
+            updater.metrics.inc("ionos_ddns_runs_total", result="unchanged")
+            if updater.update_dns.call_count == 2:
+                daemon.stop()
+
+        updater.update_dns.side_effect = update
+        daemon.run()
+
+        assert parse(path.read_text())['ionos_ddns_runs_total{result="unchanged"}'] == 2
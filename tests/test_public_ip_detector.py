@@ -1,7 +1,8 @@
 """Test per PublicIPDetector"""
+import time
 import pytest
 import responses
-from ionos_ddns import PublicIPDetector
+from ionos_ddns import HTTPResponse, PublicIPDetector, TransportError
 
 
 class TestPublicIPDetector:
@@ -131,3 +132,95 @@ class TestPublicIPDetector:
 
         assert ip == "192.0.2.100"
         assert record_type == "A"
+
+    @responses.activate
+    def test_race_fastest_service_wins(self):
+        """Test modalità gara: vince il servizio più veloce"""
+        def slow(request):
+            time.sleep(1)
+            return (200, {}, "203.0.113.1")
+
+        responses.add_callback(responses.GET, "https://api.ipify.org", callback=slow)
+        responses.add(responses.GET, "https://ifconfig.me/ip", status=500)
+        responses.add(responses.GET, "https://icanhazip.com", body="198.51.100.7", status=200)
+
+        detector = PublicIPDetector(race=True)
+        start = time.monotonic()
+        ip, record_type = detector.get_public_ip()
+
+        assert ip == "198.51.100.7"
+        assert record_type == "A"
+        assert time.monotonic() - start < 0.9
+
+    @responses.activate
+    def test_race_deadline_falls_back_to_ipv6(self):
+        """Test modalità gara: allo scadere della deadline IPv4 si passa a IPv6"""
+        def slow(request):
+            time.sleep(1)
+            return (200, {}, "203.0.113.1")
+
+        for service in PublicIPDetector.IPV4_SERVICES:
+            responses.add_callback(responses.GET, service, callback=slow)
+        responses.add(responses.GET, "https://api64.ipify.org", body="2001:db8::1", status=200)
+
+        detector = PublicIPDetector(race=True, race_deadline=0.2)
+        start = time.monotonic()
+        ip, record_type = detector.get_public_ip()
+
+        assert (ip, record_type) == ("2001:db8::1", "AAAA")
+        assert time.monotonic() - start < 0.9
+
+    def test_race_losers_are_bounded_by_deadline(self, mocker):
+        """Test modalità gara: le richieste perdenti non durano oltre la deadline"""
+        finished = []
+
+        def request(method, url, timeout=None, **kwargs):
+            if url != "https://icanhazip.com":
+                # Servizio che non risponde: attende fino al timeout ricevuto
+                time.sleep(timeout)
+                finished.append(time.monotonic())
+                raise TransportError(f"{url}: timeout")
+            return HTTPResponse(200, {}, b"198.51.100.7", url)
+
+        transport = mocker.Mock()
+        transport.request.side_effect = request
+        detector = PublicIPDetector(race=True, race_deadline=0.3, transport=transport)
+        start = time.monotonic()
+
+        assert detector.get_public_ip() == ("198.51.100.7", "A")
+        time.sleep(0.5)
+        assert all(call.kwargs["timeout"] <= 0.3 for call in transport.request.call_args_list)
+        assert len(finished) == 2 and max(finished) - start < 0.45
+
+    @responses.activate
+    def test_race_all_services_fail(self):
+        """Test modalità gara quando tutti i servizi falliscono"""
+        for service in PublicIPDetector.IPV4_SERVICES + PublicIPDetector.IPV6_SERVICES:
+            responses.add(responses.GET, service, status=500)
+
+        detector = PublicIPDetector(race=True)
+
+        with pytest.raises(RuntimeError, match="Impossibile rilevare l'indirizzo IP pubblico"):
+            detector.get_public_ip()
+
+    @responses.activate
+    def test_get_public_ips_dual_stack(self):
+        """Test rilevamento contemporaneo di IPv4 e IPv6"""
+        responses.add(responses.GET, "https://api.ipify.org", body="203.0.113.42", status=200)
+        responses.add(responses.GET, "https://api64.ipify.org", body="2001:db8::42", status=200)
+
+        detector = PublicIPDetector()
+
+        assert detector.get_public_ips() == {"A": "203.0.113.42", "AAAA": "2001:db8::42"}
+
+    @responses.activate
+    def test_get_public_ips_missing_family(self):
+        """Test dual-stack con una famiglia non rilevabile"""
+        responses.add(responses.GET, "https://api.ipify.org", body="203.0.113.42", status=200)
+        responses.add(responses.GET, "https://api64.ipify.org", status=500)
+        # ifconfig.me su rete solo IPv4 restituisce un IPv4, non valido come IPv6
+        responses.add(responses.GET, "https://ifconfig.me/ip", body="203.0.113.42", status=200)
+
+        detector = PublicIPDetector()
+
+        assert detector.get_public_ips() == {"A": "203.0.113.42", "AAAA": None}
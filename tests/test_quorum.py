@@ -0,0 +1,119 @@
+"""Test per la modalità quorum di PublicIPDetector"""
+import time
+
+import pytest
+from ionos_ddns import DNSUpdater, Metrics, PublicIPDetector, UrllibTransport
+from tests.fake_ionos import FakeIONOSServer, FakeIPEchoServer
+
+SERVICES = [f"https://ip{i}.example/" for i in range(5)]
+
+
+def make_detector(transport, services, **options):
+    detector = PublicIPDetector(transport=transport, **options)
+    detector.IPV4_SERVICES = list(services)
+    detector.IPV6_SERVICES = list(services)
+    return detector
+
+
+class TestQuorum:
+    """Test della votazione tra servizi"""
+
+    def test_majority_wins(self, ip_service_transport):
+        """Test che vinca l'IP indicato da 2 servizi su 3"""
+        answers = {SERVICES[0]: "198.51.100.9", SERVICES[1]: "93.184.216.34", SERVICES[2]: "93.184.216.34"}
+        metrics = Metrics()
+        detector = make_detector(ip_service_transport(answers, {SERVICES[0]: 0.05}), SERVICES[:3],
+                                 quorum=2, metrics=metrics)
+
+        assert detector.get_public_ip() == ("93.184.216.34", "A")
+        assert metrics.value("ionos_ddns_detections_total", family="ipv4", source="quorum") == 1
+
+    def test_dissent_is_reported(self, ip_service_transport, capsys):
+        """Test che un servizio discordante arrivato prima del quorum venga segnalato"""
+        answers = {SERVICES[0]: "198.51.100.9", SERVICES[1]: "93.184.216.34", SERVICES[2]: "93.184.216.34"}
+        metrics = Metrics()
+        transport = ip_service_transport(answers, {SERVICES[1]: 0.05, SERVICES[2]: 0.05})
+        detector = make_detector(transport, SERVICES[:3], quorum=2, metrics=metrics)
+
+        assert detector.get_public_ip() == ("93.184.216.34", "A")
+        assert metrics.value("ionos_ddns_ip_service_dissents_total", service=SERVICES[0], family="ipv4") == 1
+        assert f"{SERVICES[0]} ha risposto 198.51.100.9" in capsys.readouterr().out
+
+    def test_returns_as_soon_as_quorum_is_reached(self, ip_service_transport):
+        """Test che non si attenda il servizio più lento una volta raggiunto il quorum"""
+        answers = {service: "93.184.216.34" for service in SERVICES[:3]}
+        detector = make_detector(ip_service_transport(answers, {SERVICES[2]: 1.0}), SERVICES[:3], quorum=2)
+
+        start = time.monotonic()
+        assert detector.get_public_ip() == ("93.184.216.34", "A")
+        assert time.monotonic() - start < 0.5
+
+    def test_failures_are_replaced(self, ip_service_transport):
+        """Test che un servizio in errore venga sostituito dal successivo"""
+        answers = {SERVICES[0]: None, SERVICES[1]: "93.184.216.34", SERVICES[2]: "93.184.216.34"}
+        transport = ip_service_transport(answers)
+        detector = make_detector(transport, SERVICES[:3], quorum=2, quorum_size=2)
+
+        assert detector.get_public_ip() == ("93.184.216.34", "A")
+        assert transport.request.call_count == 3
+
+    def test_only_needed_services_are_queried(self, ip_service_transport):
+        """Test che con risposte concordi non vengano interrogati servizi oltre quorum_size"""
+        answers = {service: "93.184.216.34" for service in SERVICES}
+        transport = ip_service_transport(answers)
+        detector = make_detector(transport, SERVICES, quorum=2)
+
+        detector.get_public_ip()
+        time.sleep(0.05)
+
+        assert transport.request.call_count == 3
+
+    def test_no_quorum(self, ip_service_transport, capsys):
+        """Test che senza accordo non venga restituito alcun IP"""
+        answers = {SERVICES[0]: "93.184.216.34", SERVICES[1]: "198.51.100.9", SERVICES[2]: None}
+        detector = make_detector(ip_service_transport(answers), SERVICES[:3], quorum=2)
+
+        assert detector._detect(detector.IPV4_SERVICES, 4) is None
+        assert "quorum di 2 servizi non raggiunto per IPv4" in capsys.readouterr().out
+
+    def test_equivalent_ipv6_spellings_agree(self, ip_service_transport):
+        """Test che grafie diverse dello stesso IPv6 contino come un solo voto"""
+        answers = {SERVICES[0]: "2001:DB8:0::1", SERVICES[1]: "2001:db8::1"}
+        detector = make_detector(ip_service_transport(answers), SERVICES[:2], quorum=2)
+
+        assert detector._detect(detector.IPV6_SERVICES, 6) == "2001:db8::1"
+
+    def test_ipv4_mapped_is_rejected(self, ip_service_transport):
+        """Test che un indirizzo IPv4-mapped non valga come IPv6"""
+        answers = {SERVICES[0]: "::ffff:93.184.216.34"}
+        detector = make_detector(ip_service_transport(answers), SERVICES[:1])
+
+        assert detector._detect(detector.IPV6_SERVICES, 6) is None
+
+    def test_invalid_quorum(self):
+        """Test che un quorum superiore ai servizi interrogati venga rifiutato"""
+        with pytest.raises(ValueError):
+            PublicIPDetector(quorum=3, quorum_size=2)
+        with pytest.raises(ValueError):
+            PublicIPDetector(quorum=0)
+        assert PublicIPDetector(quorum=3).quorum_size == 5
+
+    def test_quorum_with_backends_is_rejected(self, mocker):
+        """Test che il quorum non venga aggirato in silenzio da un backend che risponde"""
+        with pytest.raises(ValueError):
+            PublicIPDetector(quorum=2, backends=[mocker.Mock()])
+
+    def test_bogus_answer_does_not_reach_the_api(self):
+        """Test end-to-end: un servizio anomalo non provoca scritture con un IP sbagliato"""
+        with FakeIONOSServer() as server, FakeIPEchoServer("93.184.216.34") as good1, \
+                FakeIPEchoServer("93.184.216.34") as good2, FakeIPEchoServer("10.0.0.1") as bogus:
+            server.populate(1, 1, content="93.184.216.34")
+            detector = PublicIPDetector(transport=UrllibTransport(), quorum=2)
+            detector.IPV4_SERVICES = [bogus.url, good1.url, good2.url]
+            updater = DNSUpdater("pub", "secret", base_url=server.url, transport=UrllibTransport(),
+                                 ip_detector=detector, rate_limit=None)
+
+            updater.update_dns("host0.example0.com")
+
+            assert server.count(method="PUT") == 0
+            assert server.count(method="PATCH") == 0
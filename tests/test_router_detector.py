@@ -0,0 +1,176 @@
+"""Test per RouterDetector contro un router finto (SSDP, UPnP IGD, NAT-PMP)"""
+import json
+import socket
+import struct
+import time
+
+import pytest
+from ionos_ddns import (PublicIPDetector, RouterDetector, UrllibTransport, default_gateway,
+                        find_wan_service, parse_natpmp_response, parse_ssdp_response)
+from tests.fake_router import DESCRIPTION, FakeRouter
+
+
+@pytest.fixture
+def router():
+    with FakeRouter() as server:
+        yield server
+
+
+def make_detector(router, **options):
+    """RouterDetector che parla con il router finto"""
+    options.setdefault("gateway", "127.0.0.1")
+    options.setdefault("discovery_timeout", 0.3)
+    options.setdefault("timeout", 0.5)
+    return RouterDetector(ssdp_address=router.ssdp_address, natpmp_port=router.natpmp_port,
+                          transport=UrllibTransport(), **options)
+
+
+class TestRouterMessages:
+    """Test per risposte SSDP, descrizioni IGD, NAT-PMP e tabella di routing"""
+
+    def test_parse_ssdp_response(self):
+        """Test header case-insensitive di una risposta SSDP"""
+        headers = parse_ssdp_response(b"HTTP/1.1 200 OK\r\nLocation: http://192.168.1.1:5000/desc.xml\r\n"
+                                      b"ST: upnp:rootdevice\r\n\r\n")
+
+        assert headers["location"] == "http://192.168.1.1:5000/desc.xml"
+
+    def test_ssdp_notify_is_rejected(self):
+        """Test che un annuncio NOTIFY non venga scambiato per una risposta"""
+        with pytest.raises(ValueError):
+            parse_ssdp_response(b"NOTIFY * HTTP/1.1\r\nLOCATION: http://x/\r\n\r\n")
+
+    def test_find_wan_service(self):
+        """Test ricerca del servizio WAN annidato e URL di controllo assoluto"""
+        description = DESCRIPTION.format(service_type="urn:schemas-upnp-org:service:WANPPPConnection:1")
+
+        service = find_wan_service(description.encode(), "http://192.168.1.1:5000/rootDesc.xml",
+                                   RouterDetector.WAN_SERVICES)
+
+        assert service == ("http://192.168.1.1:5000/ctl/IPConn",
+                           "urn:schemas-upnp-org:service:WANPPPConnection:1")
+
+    def test_find_wan_service_missing(self):
+        """Test descrizione senza servizi WAN o non valida"""
+        description = DESCRIPTION.format(service_type="urn:schemas-upnp-org:service:WANCommonInterfaceConfig:1")
+
+        assert find_wan_service(description.encode(), "http://x/", RouterDetector.WAN_SERVICES) is None
+        with pytest.raises(ValueError):
+            find_wan_service(b"<root>", "http://x/", RouterDetector.WAN_SERVICES)
+
+    def test_parse_natpmp_response(self):
+        """Test risposta NAT-PMP e codice di errore"""
+        assert parse_natpmp_response(b"\x00\x80\x00\x00\x00\x00\x0e\x10\x5d\xb8\xd8\x22") == "93.184.216.34"
+        with pytest.raises(ValueError):
+            parse_natpmp_response(b"\x00\x80\x00\x03\x00\x00\x0e\x10\x00\x00\x00\x00")
+
+    def test_default_gateway(self, tmp_path):
+        """Test lettura del gateway predefinito da /proc/net/route"""
+        # Il kernel scrive gli indirizzi nell'ordine dei byte della macchina
+        gateway = "%08X" % struct.unpack("=I", socket.inet_aton("192.168.1.1"))[0]
+        route = tmp_path / "route"
+        route.write_text(
+            "Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\n"
+            "eth0\t0001A8C0\t00000000\t0001\t0\t0\t0\t00FFFFFF\n"
+            f"eth0\t00000000\t{gateway}\t0003\t0\t0\t100\t00000000\n"
+        )
+
+        assert default_gateway(str(route)) == "192.168.1.1"
+        assert default_gateway(str(tmp_path / "missing")) is None
+
+
+class TestRouterDetector:
+    """Test per RouterDetector"""
+
+    def test_upnp(self, router):
+        """Test ricerca SSDP, lettura della descrizione e GetExternalIPAddress"""
+        detector = make_detector(router)
+
+        assert detector.detect(4) == "93.184.216.34"
+        assert router.requests["description"] == 1
+        assert router.requests["soap"] == 1
+
+    def test_control_url_is_reused(self, router):
+        """Test che dopo la prima ricerca basti una richiesta SOAP"""
+        detector = make_detector(router)
+        detector.detect(4)
+        router.requests.clear()
+
+        assert detector.detect(4) == "93.184.216.34"
+        assert router.requests == {"soap": 1}
+
+    def test_cache_file_between_runs(self, router, tmp_path):
+        """Test che l'URL di controllo salvato eviti SSDP e descrizione all'esecuzione successiva"""
+        cache_file = tmp_path / "router.json"
+        make_detector(router, cache_file=cache_file).detect(4)
+        router.requests.clear()
+
+        assert make_detector(router, cache_file=cache_file).detect(4) == "93.184.216.34"
+        assert router.requests == {"soap": 1}
+        assert json.loads(cache_file.read_text()) == {
+            "method": "upnp",
+            "control_url": router.location.replace("/rootDesc.xml", "/ctl/IPConn"),
+            "service_type": router.service_type,
+        }
+
+    def test_stale_cache_triggers_discovery(self, router, tmp_path):
+        """Test che un URL di controllo non più valido porti a una nuova ricerca"""
+        cache_file = tmp_path / "router.json"
+        cache_file.write_text(json.dumps({"method": "upnp", "control_url": "http://127.0.0.1:9/ctl",
+                                          "service_type": router.service_type}))
+
+        assert make_detector(router, cache_file=cache_file).detect(4) == "93.184.216.34"
+        assert json.loads(cache_file.read_text())["control_url"].endswith("/ctl/IPConn")
+
+    def test_natpmp_fallback(self, tmp_path):
+        """Test NAT-PMP quando il router non risponde a SSDP, e metodo ricordato"""
+        cache_file = tmp_path / "router.json"
+        with FakeRouter(upnp=False) as router:
+            assert make_detector(router, cache_file=cache_file).detect(4) == "93.184.216.34"
+            router.requests.clear()
+
+            start = time.monotonic()
+            assert make_detector(router, cache_file=cache_file).detect(4) == "93.184.216.34"
+            assert time.monotonic() - start < 0.2
+            assert router.requests == {"natpmp": 1}
+            assert json.loads(cache_file.read_text()) == {"method": "natpmp", "gateway": "127.0.0.1"}
+
+    def test_natpmp_retransmission(self):
+        """Test ritrasmissione NAT-PMP dopo un pacchetto perso"""
+        with FakeRouter(upnp=False) as router:
+            router.natpmp_drop = 1
+
+            assert make_detector(router, methods=["natpmp"], timeout=1).detect(4) == "93.184.216.34"
+            assert router.requests["natpmp"] == 2
+
+    def test_private_wan_address_is_rejected(self):
+        """Test che un indirizzo WAN non pubblico (CGNAT) venga scartato"""
+        with FakeRouter("100.64.0.7") as router:
+            assert make_detector(router).detect(4) is None
+
+    def test_ipv6_is_not_supported(self, router):
+        """Test che per IPv6 non venga interrogato il router"""
+        assert make_detector(router).detect(6) is None
+        assert router.requests == {}
+
+    def test_no_router(self):
+        """Test che senza risposte si rinunci entro i timeout"""
+        with FakeRouter(upnp=False, natpmp=False) as router:
+            detector = make_detector(router, discovery_timeout=0.2, timeout=0.3)
+
+            start = time.monotonic()
+            assert detector.detect(4) is None
+            assert time.monotonic() - start < 1
+
+    def test_unknown_method(self):
+        """Test che un metodo sconosciuto venga rifiutato"""
+        with pytest.raises(ValueError):
+            RouterDetector(methods=["pcp"])
+
+    def test_public_ip_detector_backend(self, router, mocker):
+        """Test che con il router disponibile non venga fatta alcuna richiesta ai servizi esterni"""
+        transport = mocker.Mock()
+        detector = PublicIPDetector(backends=[make_detector(router)], transport=transport)
+
+        assert detector.get_public_ip() == ("93.184.216.34", "A")
+        transport.request.assert_not_called()
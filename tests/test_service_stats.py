@@ -0,0 +1,180 @@
+"""Test per ServiceStats e l'ordinamento dei servizi di rilevamento IP"""
+import json
+
+import pytest
+from ionos_ddns import Metrics, PublicIPDetector, ServiceStats, load_config
+
+FAST = "https://fast.example/ip"
+SLOW = "https://slow.example/ip"
+BROKEN = "https://broken.example/ip"
+
+
+def queried(transport):
+    return [call.args[1] for call in transport.request.call_args_list]
+
+
+class TestServiceStats:
+    """Test per medie mobili, costo atteso, circuit breaker e persistenza"""
+
+    def test_ewma(self):
+        """Test medie mobili di latenza e tasso di successo"""
+        stats = ServiceStats()
+        stats.record(FAST, True, 0.2)
+        stats.record(FAST, True, 0.4)
+        stats.record(FAST, False, 5.0)
+
+        entry = stats.get(FAST)
+        assert entry["latency"] == pytest.approx(0.26)
+        assert entry["success"] == pytest.approx(0.7)
+        assert entry["attempts"] == 3
+        assert entry["failures"] == 1
+
+    def test_cost(self):
+        """Test costo atteso: latenza più timeout pesato per la probabilità di fallimento"""
+        stats = ServiceStats()
+        stats.record(FAST, True, 0.1)
+        stats.record(FAST, False, 5.0)
+
+        assert stats.cost(FAST, timeout=5) == pytest.approx(0.1 + 0.3 * 5)
+        assert stats.cost(SLOW, timeout=5) == ServiceStats.PRIOR_LATENCY
+
+    def test_circuit_breaker(self):
+        """Test apertura dopo fallimenti consecutivi e chiusura dopo il cooldown"""
+        stats = ServiceStats(failure_threshold=3, cooldown=600)
+        for _ in range(2):
+            stats.record(BROKEN, False, 5.0, now=1000)
+        assert not stats.is_open(BROKEN, now=1000)
+
+        stats.record(BROKEN, False, 5.0, now=1000)
+        assert stats.is_open(BROKEN, now=1599)
+        assert not stats.is_open(BROKEN, now=1600)
+
+        stats.record(BROKEN, True, 0.1, now=1600)
+        stats.record(BROKEN, False, 5.0, now=1601)
+        assert not stats.is_open(BROKEN, now=1601)
+
+    def test_persistence(self, tmp_path):
+        """Test salvataggio e rilettura, senza perdere i servizi aggiornati da altri processi"""
+        path = tmp_path / "stats.json"
+        first, second = ServiceStats(path), ServiceStats(path)
+        first.record(FAST, True, 0.1)
+        second.record(SLOW, True, 2.0)
+
+        first.save()
+        second.save()
+
+        reloaded = ServiceStats(path)
+        assert reloaded.get(FAST)["latency"] == 0.1
+        assert reloaded.get(SLOW)["latency"] == 2.0
+
+    def test_corrupted_file(self, tmp_path):
+        """Test che un file corrotto venga ignorato"""
+        path = tmp_path / "stats.json"
+        path.write_text("{non json")
+
+        assert ServiceStats(path).get(FAST) is None
+
+
+class TestServiceRanking:
+    """Test dell'ordinamento dei servizi in PublicIPDetector"""
+
+    def make_detector(self, transport, *services, **options):
+        detector = PublicIPDetector(transport=transport, **options)
+        detector.IPV4_SERVICES = list(services)
+        return detector
+
+    def test_configured_order_without_stats(self, ip_service_transport):
+        """Test che senza statistiche resti l'ordine configurato"""
+        transport = ip_service_transport({SLOW: "198.51.100.1", FAST: "198.51.100.1"})
+        detector = self.make_detector(transport, SLOW, FAST)
+
+        assert detector.get_public_ip() == ("198.51.100.1", "A")
+        assert queried(transport) == [SLOW]
+
+    def test_failing_service_is_demoted(self, ip_service_transport):
+        """Test che dopo un fallimento il servizio venga interrogato per ultimo"""
+        transport = ip_service_transport({BROKEN: None, FAST: "198.51.100.1"})
+        detector = self.make_detector(transport, BROKEN, FAST)
+        detector.get_public_ip()
+        transport.request.reset_mock()
+
+        detector.get_public_ip()
+
+        assert queried(transport) == [FAST]
+
+    def test_fastest_service_first(self, ip_service_transport):
+        """Test che a parità di affidabilità vinca il servizio con latenza media minore"""
+        stats = ServiceStats()
+        stats.record(SLOW, True, 0.8)
+        stats.record(FAST, True, 0.05)
+        transport = ip_service_transport({SLOW: "198.51.100.1", FAST: "198.51.100.1"})
+        detector = self.make_detector(transport, SLOW, FAST, stats=stats)
+
+        detector.get_public_ip()
+
+        assert queried(transport) == [FAST]
+
+    def test_open_circuit_is_skipped(self, ip_service_transport):
+        """Test che un servizio sospeso non venga interrogato e venga contato nelle metriche"""
+        stats = ServiceStats()
+        for _ in range(ServiceStats.FAILURE_THRESHOLD):
+            stats.record(BROKEN, False, 5.0)
+        stats.record(SLOW, False, 5.0)
+        metrics = Metrics()
+        transport = ip_service_transport({BROKEN: None, SLOW: None})
+        detector = self.make_detector(transport, BROKEN, SLOW, stats=stats, metrics=metrics)
+
+        assert detector._detect(detector.IPV4_SERVICES, 4) is None
+        assert queried(transport) == [SLOW]
+        assert metrics.value("ionos_ddns_ip_service_skipped_total", service=BROKEN, family="ipv4") == 1
+
+    def test_all_open_are_still_tried(self, ip_service_transport):
+        """Test che con tutti i servizi sospesi si provi comunque"""
+        stats = ServiceStats()
+        for _ in range(ServiceStats.FAILURE_THRESHOLD):
+            stats.record(BROKEN, False, 5.0)
+        transport = ip_service_transport({BROKEN: "198.51.100.1"})
+        detector = self.make_detector(transport, BROKEN, stats=stats)
+
+        assert detector.get_public_ip() == ("198.51.100.1", "A")
+        assert not stats.is_open(BROKEN)
+
+    def test_stats_persist_between_runs(self, ip_service_transport, tmp_path):
+        """Test che l'esecuzione successiva parta dal servizio che ha funzionato"""
+        path = tmp_path / "stats.json"
+        transport = ip_service_transport({BROKEN: None, FAST: "198.51.100.1"})
+        self.make_detector(transport, BROKEN, FAST, stats=ServiceStats(path)).get_public_ip()
+        transport.request.reset_mock()
+
+        self.make_detector(transport, BROKEN, FAST, stats=ServiceStats(path)).get_public_ip()
+
+        assert queried(transport) == [FAST]
+        assert set(json.loads(path.read_text())["services"]) == {BROKEN, FAST}
+
+
+class TestUserServices:
+    """Test per i servizi aggiunti dal file di configurazione"""
+
+    def test_services_are_appended(self):
+        """Test che i servizi aggiuntivi seguano quelli predefiniti"""
+        detector = PublicIPDetector(ipv4_services=[FAST], ipv6_services=["stun:stun.example.net"])
+
+        assert detector.IPV4_SERVICES == PublicIPDetector.IPV4_SERVICES + [FAST]
+        assert detector.IPV6_SERVICES == PublicIPDetector.IPV6_SERVICES + ["stun:stun.example.net"]
+
+    def test_invalid_service(self):
+        """Test che un servizio che non è un URL HTTP(S) o STUN venga rifiutato"""
+        with pytest.raises(ValueError):
+            PublicIPDetector(ipv4_services=["ftp://example.net/ip"])
+
+    def test_config_validation(self, tmp_path, capsys):
+        """Test che una chiave di servizi non valida nel file di configurazione termini con errore"""
+        config = tmp_path / "dns.json"
+        config.write_text(json.dumps({"pub": "p", "secret": "s", "ipv4_services": ["example.net/ip"]}))
+
+        with pytest.raises(SystemExit):
+            load_config(config)
+        assert "non valido: example.net/ip" in capsys.readouterr().out
+
+        config.write_text(json.dumps({"pub": "p", "secret": "s", "ipv4_services": [FAST]}))
+        assert load_config(config)["ipv4_services"] == [FAST]
@@ -0,0 +1,56 @@
+"""Test per StateStore"""
+import json
+import threading
+from ionos_ddns import StateStore
+
+
+class TestStateStore:
+    """Test suite per StateStore"""
+
+    def test_get_missing_file(self, tmp_path):
+        """Test lettura con file di stato inesistente"""
+        store = StateStore(tmp_path / "state.json")
+        assert store.get("test.example.com", "A") is None
+
+    def test_set_and_get(self, tmp_path, mocker):
+        """Test salvataggio e rilettura dello stato di un hostname"""
+        mocker.patch("ionos_ddns.time.time", return_value=1000.0)
+        store = StateStore(tmp_path / "state.json")
+
+        store.set("test.example.com", "A", "203.0.113.1", "record-456", "zone-123")
+
+        assert store.get("test.example.com", "A") == {
+            "ip": "203.0.113.1",
+            "record_id": "record-456",
+            "zone_id": "zone-123",
+            "checked_at": 1000.0
+        }
+        assert store.get("test.example.com", "AAAA") is None
+
+    def test_corrupted_file(self, tmp_path):
+        """Test che un file di stato corrotto venga trattato come vuoto"""
+        state_file = tmp_path / "state.json"
+        state_file.write_text("{not json")
+        store = StateStore(state_file)
+
+        assert store.get("test.example.com", "A") is None
+        store.set("test.example.com", "A", "203.0.113.1", None, None)
+        assert store.get("test.example.com", "A")["ip"] == "203.0.113.1"
+
+    def test_concurrent_writers(self, tmp_path):
+        """Test che scritture concorrenti su hostname diversi non si perdano"""
+        state_file = tmp_path / "state.json"
+
+        def writer(index):
+            StateStore(state_file).set(f"host{index}.example.com", "A", f"192.0.2.{index}", None, None)
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        hosts = json.loads(state_file.read_text())["hosts"]
+        assert len(hosts) == 20
+        # Nessun file temporaneo lasciato nella directory
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["state.json", "state.json.lock"]
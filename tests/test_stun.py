@@ -0,0 +1,257 @@
+"""Test per il backend STUN di PublicIPDetector contro un server STUN locale"""
+import socket
+import struct
+import threading
+import time
+
+import pytest
+from ionos_ddns import (Metrics, PublicIPDetector, build_stun_request, parse_stun_response,
+                        parse_stun_uri, stun_query)
+
+MAGIC_COOKIE = 0x2112A442
+
+
+def ipv6_available():
+    try:
+        with socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as sock:
+            sock.bind(("::1", 0))
+        return True
+    except OSError:
+        return False
+
+
+def address_attribute(attr_type, ip, port, mask=bytes(16)):
+    """Attributo MAPPED-ADDRESS o XOR-MAPPED-ADDRESS (con mask = cookie + ID transazione)"""
+    packed = socket.inet_pton(socket.AF_INET6 if ":" in ip else socket.AF_INET, ip)
+    family = 0x02 if len(packed) == 16 else 0x01
+    packed = bytes(a ^ b for a, b in zip(packed, mask))
+    value = struct.pack("!BBH", 0, family, port ^ int.from_bytes(mask[:2], "big")) + packed
+    return struct.pack("!HH", attr_type, len(value)) + value
+
+
+class FakeStunServer:
+    """
+    Server STUN finto su UDP
+
+    Risponde alle richieste Binding con l'indirizzo del client in
+    XOR-MAPPED-ADDRESS (o solo MAPPED-ADDRESS con legacy=True).
+    """
+
+    def __init__(self, host="127.0.0.1"):
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_DGRAM)
+        self.sock.bind((host, 0))
+        self.sock.settimeout(0.05)
+        self.port = self.sock.getsockname()[1]
+        self.uri = f"stun:[{host}]:{self.port}" if ":" in host else f"stun:{host}:{self.port}"
+        self.mapped = None  # Indirizzo da restituire (default: quello del client)
+        self.legacy = False
+        self.error = False
+        self.drop = 0  # Richieste da ignorare prima di rispondere
+        self.spoof = False  # Invia prima una risposta con ID di transazione diverso
+        self.requests = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sock.close()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                data, client = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            message_type, _, cookie, transaction_id = struct.unpack_from("!HHI12s", data)
+            if message_type != 0x0001 or cookie != MAGIC_COOKIE:
+                continue
+            self.requests += 1
+            if self.drop:
+                self.drop -= 1
+                continue
+
+            ip, port = (self.mapped or client[0]), client[1]
+            if self.error:
+                # 400 Bad Request in ERROR-CODE
+                attributes = struct.pack("!HHHBB", 0x0009, 4, 0, 4, 0)
+                message_type = 0x0111
+            elif self.legacy:
+                attributes = address_attribute(0x0001, ip, port)
+                message_type = 0x0101
+            else:
+                mask = struct.pack("!I", MAGIC_COOKIE) + transaction_id
+                # SOFTWARE prima dell'indirizzo, con padding a 4 byte
+                attributes = struct.pack("!HH", 0x8022, 3) + b"abc\x00"
+                attributes += address_attribute(0x0020, ip, port, mask)
+                message_type = 0x0101
+            if self.spoof:
+                wrong = struct.pack("!HHI12s", message_type, len(attributes), MAGIC_COOKIE, bytes(12))
+                self.sock.sendto(wrong + attributes, client)
+            header = struct.pack("!HHI12s", message_type, len(attributes), MAGIC_COOKIE, transaction_id)
+            self.sock.sendto(header + attributes, client)
+
+
+@pytest.fixture
+def stun():
+    with FakeStunServer() as server:
+        yield server
+
+
+def make_detector(*uris, **options):
+    """PublicIPDetector con solo server STUN e un trasporto HTTP che non deve essere usato"""
+    detector = PublicIPDetector(stun_servers=list(uris), transport=options.pop("transport", None), **options)
+    detector.IPV4_SERVICES = [uri for uri in detector.IPV4_SERVICES if uri.startswith("stun:")]
+    detector.IPV6_SERVICES = [uri for uri in detector.IPV6_SERVICES if uri.startswith("stun:")]
+    detector.STUN_TIMEOUT = 0.5
+    return detector
+
+
+class TestStunMessages:
+    """Test per URI, richieste e risposte STUN"""
+
+    @pytest.mark.parametrize("uri, expected", [
+        ("stun:stun.example.net", ("stun.example.net", 3478)),
+        ("stun:stun.example.net:19302", ("stun.example.net", 19302)),
+        ("stun:192.0.2.1:3479", ("192.0.2.1", 3479)),
+        ("stun:[2001:db8::1]:3479", ("2001:db8::1", 3479)),
+        ("stun:[2001:db8::1]", ("2001:db8::1", 3478)),
+    ])
+    def test_parse_uri(self, uri, expected):
+        """Test host e porta (predefinita 3478) da un URI stun:"""
+        assert parse_stun_uri(uri) == expected
+
+    @pytest.mark.parametrize("uri", ["stun:", "stun.example.net", "stun:host:porta", "https://host"])
+    def test_invalid_uri(self, uri):
+        """Test che URI senza schema stun:, host o porta numerica vengano rifiutati"""
+        with pytest.raises(ValueError):
+            parse_stun_uri(uri)
+
+    def test_build_request(self):
+        """Test intestazione di una richiesta Binding"""
+        request = build_stun_request(b"\x01" * 12)
+
+        assert request == b"\x00\x01\x00\x00\x21\x12\xa4\x42" + b"\x01" * 12
+
+    def test_xor_mapped_ipv6(self):
+        """Test decodifica di XOR-MAPPED-ADDRESS IPv6 (maschera con cookie e ID transazione)"""
+        transaction_id = bytes(range(12))
+        mask = struct.pack("!I", MAGIC_COOKIE) + transaction_id
+        attribute = address_attribute(0x0020, "2001:db8::42", 4242, mask)
+        response = struct.pack("!HHI12s", 0x0101, len(attribute), MAGIC_COOKIE, transaction_id) + attribute
+
+        assert parse_stun_response(response, transaction_id) == "2001:db8::42"
+
+    def test_mismatched_transaction(self):
+        """Test che una risposta a un'altra transazione venga rifiutata"""
+        response = struct.pack("!HHI12s", 0x0101, 0, MAGIC_COOKIE, bytes(12))
+
+        with pytest.raises(ValueError):
+            parse_stun_response(response, b"\x01" * 12)
+
+
+class TestStunDetection:
+    """Test del rilevamento tramite server STUN"""
+
+    def test_ipv4(self, stun, mocker):
+        """Test che l'indirizzo venga letto da XOR-MAPPED-ADDRESS senza richieste HTTP"""
+        stun.mapped = "203.0.113.7"
+        transport = mocker.Mock()
+        detector = make_detector(stun.uri, transport=transport)
+
+        assert detector.get_public_ip() == ("203.0.113.7", "A")
+        assert stun.requests == 1
+        transport.request.assert_not_called()
+
+    @pytest.mark.skipif(not ipv6_available(), reason="IPv6 non disponibile")
+    def test_ipv6(self):
+        """Test rilevamento IPv6 da un server STUN raggiunto su IPv6"""
+        with FakeStunServer("::1") as server:
+            server.mapped = "2001:db8::7"
+            detector = make_detector(server.uri)
+
+            assert detector._detect(detector.IPV6_SERVICES, 6) == "2001:db8::7"
+
+    def test_wrong_family_is_rejected(self, stun):
+        """Test che un indirizzo della famiglia sbagliata non venga accettato"""
+        stun.mapped = "2001:db8::7"
+        detector = make_detector(stun.uri)
+
+        assert detector._detect(detector.IPV4_SERVICES, 4) is None
+
+    def test_legacy_mapped_address(self, stun):
+        """Test ripiego su MAPPED-ADDRESS per i server RFC 3489"""
+        stun.legacy = True
+        detector = make_detector(stun.uri)
+
+        assert detector._detect(detector.IPV4_SERVICES, 4) == "127.0.0.1"
+
+    def test_retransmission(self, stun):
+        """Test che la richiesta venga ritrasmessa se la risposta non arriva"""
+        stun.drop = 1
+
+        assert stun_query("127.0.0.1", stun.port, 4, timeout=2) == "127.0.0.1"
+        assert stun.requests == 2
+
+    def test_mismatched_transaction_is_ignored(self, stun):
+        """Test che una risposta con ID di transazione diverso venga scartata"""
+        stun.spoof = True
+
+        assert stun_query("127.0.0.1", stun.port, 4, timeout=1) == "127.0.0.1"
+
+    def test_timeout_falls_back_to_next_server(self, mocker):
+        """Test che un server muto venga abbandonato dopo il suo timeout"""
+        with FakeStunServer() as silent, FakeStunServer() as working:
+            silent.drop = 100
+            working.mapped = "203.0.113.8"
+            metrics = Metrics()
+            detector = make_detector(silent.uri, working.uri, metrics=metrics)
+            detector.STUN_TIMEOUT = 0.3
+
+            start = time.monotonic()
+            assert detector._detect(detector.IPV4_SERVICES, 4) == "203.0.113.8"
+            assert time.monotonic() - start < 1.5
+            assert silent.requests >= 2
+            assert metrics.value("ionos_ddns_ip_service_requests_total",
+                                 service=silent.uri, family="ipv4", result="error") == 1
+            assert metrics.value("ionos_ddns_detections_total", family="ipv4", source=working.uri) == 1
+
+    def test_error_response_falls_back(self):
+        """Test che una risposta di errore passi al server successivo senza attendere"""
+        with FakeStunServer() as failing, FakeStunServer() as working:
+            failing.error = True
+            working.mapped = "203.0.113.8"
+            detector = make_detector(failing.uri, working.uri)
+
+            start = time.monotonic()
+            assert detector._detect(detector.IPV4_SERVICES, 4) == "203.0.113.8"
+            assert time.monotonic() - start < 0.5
+            assert failing.requests == 1
+
+    def test_race_with_http_services(self, mocker):
+        """Test che in gara il server STUN competa con i servizi HTTP"""
+        with FakeStunServer() as server:
+            server.mapped = "203.0.113.9"
+            transport = mocker.Mock()
+            transport.request.side_effect = lambda *args, **kwargs: time.sleep(1) or mocker.Mock(status_code=503)
+            detector = PublicIPDetector(race=True, stun_servers=[server.uri], transport=transport)
+            detector.IPV4_SERVICES = detector.IPV4_SERVICES[:2]
+
+            start = time.monotonic()
+            assert detector._detect(detector.IPV4_SERVICES, 4) == "203.0.113.9"
+            assert time.monotonic() - start < 0.9
+
+    def test_servers_precede_http_services(self):
+        """Test che i server STUN vengano interrogati prima dei servizi HTTP"""
+        detector = PublicIPDetector(stun_servers=PublicIPDetector.STUN_SERVERS)
+
+        assert detector.IPV4_SERVICES[:3] == PublicIPDetector.STUN_SERVERS
+        assert detector.IPV6_SERVICES[:3] == PublicIPDetector.STUN_SERVERS
+        assert detector.IPV4_SERVICES[3:] == PublicIPDetector.IPV4_SERVICES
+        with pytest.raises(ValueError):
+            PublicIPDetector(stun_servers=["stun.example.net"])
@@ -0,0 +1,388 @@
+"""Test per il trasporto HTTP basato sulla libreria standard"""
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+from ionos_ddns import (AsyncDNSUpdater, DNSUpdater, HTTPStatusError, IONOSClient, PublicIPDetector,
+                        TransportError, UrllibTransport, create_transport)
+from tests.fake_ionos import FakeIONOSServer, FakeIPEchoServer
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    """Risponde con metodo, percorso, header e corpo ricevuti"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        server = self.server
+        server.peers.add(self.client_address)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode() if length else None
+        if self.path.startswith("/drop"):
+            # Esegue la richiesta ma chiude la connessione prima di rispondere
+            server.dropped.append(self.command)
+            self.close_connection = True
+            return
+        if self.path.startswith("/slow"):
+            server.release.wait(5)
+        status = 503 if self.path.startswith("/error") else 200
+        data = json.dumps({
+            "method": self.command,
+            "path": self.path,
+            "content_type": self.headers.get("Content-Type"),
+            "api_key": self.headers.get("X-API-Key"),
+            "body": body,
+        }).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Retry-After", "3")
+        self.end_headers()
+        self.wfile.write(data)
+        if server.drop_idle:
+            # Chiude la connessione senza annunciarlo, come un server che scade il keep-alive
+            self.close_connection = True
+
+    do_GET = do_POST = do_PUT = do_PATCH = _handle
+
+
+@pytest.fixture
+def echo_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+    server.daemon_threads = True
+    server.peers = set()
+    server.drop_idle = False
+    server.dropped = []
+    server.release = threading.Event()
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+
+class TestUrllibTransport:
+    """Test per UrllibTransport"""
+
+    def test_get_with_params_and_headers(self, echo_server):
+        """Test GET con parametri di query e header"""
+        transport = UrllibTransport()
+
+        response = transport.request("GET", f"{echo_server.url}/dns/v1/zones?a=1",
+                                     headers={"X-API-Key": "pub.secret"},
+                                     params={"recordName": "www.example.com"})
+
+        assert response.status_code == 200
+        assert response.headers.get("content-type") == "application/json"
+        data = response.json()
+        assert data["path"] == "/dns/v1/zones?a=1&recordName=www.example.com"
+        assert data["api_key"] == "pub.secret"
+        transport.close()
+
+    def test_json_body(self, echo_server):
+        """Test che il payload JSON venga serializzato con il Content-Type corretto"""
+        transport = UrllibTransport()
+
+        data = transport.request("POST", f"{echo_server.url}/records", json=[{"name": "a"}]).json()
+
+        assert data["content_type"] == "application/json"
+        assert json.loads(data["body"]) == [{"name": "a"}]
+        transport.close()
+
+    def test_connections_are_reused(self, echo_server):
+        """Test che richieste successive riusino la stessa connessione keep-alive"""
+        transport = UrllibTransport()
+
+        for _ in range(5):
+            transport.request("GET", f"{echo_server.url}/")
+
+        assert len(echo_server.peers) == 1
+        transport.close()
+
+    def test_stale_connection_is_replaced(self, echo_server):
+        """Test che una connessione chiusa dal server mentre era inattiva venga sostituita"""
+        echo_server.drop_idle = True
+        transport = UrllibTransport()
+
+        for _ in range(3):
+            assert transport.request("PUT", f"{echo_server.url}/", json={}).status_code == 200
+
+        assert len(echo_server.peers) == 3
+        transport.close()
+
+    def test_all_stale_connections_are_replaced(self, echo_server):
+        """Test che più connessioni inattive scadute insieme non facciano fallire la richiesta"""
+        echo_server.drop_idle = True
+        transport = UrllibTransport()
+        threads = [threading.Thread(target=transport.request, args=("GET", f"{echo_server.url}/slow"))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        # Attende che le tre richieste abbiano aperto ognuna la propria connessione
+        deadline = time.monotonic() + 5
+        while len(echo_server.peers) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        echo_server.release.set()
+        for thread in threads:
+            thread.join()
+
+        assert transport.request("GET", f"{echo_server.url}/").status_code == 200
+        assert len(echo_server.peers) == 4
+        transport.close()
+
+    def test_post_is_not_replayed_on_dropped_connection(self, echo_server):
+        """Test che una POST già inviata su una connessione riusata e poi chiusa non venga ripetuta"""
+        transport = UrllibTransport()
+        transport.request("GET", f"{echo_server.url}/")
+
+        with pytest.raises(TransportError):
+            transport.request("POST", f"{echo_server.url}/drop", json={})
+
+        assert echo_server.dropped == ["POST"]
+        transport.close()
+
+    def test_put_is_retried_on_dropped_connection(self, echo_server):
+        """Test che una richiesta idempotente su una connessione riusata e poi chiusa venga ripetuta una volta"""
+        transport = UrllibTransport()
+        transport.request("GET", f"{echo_server.url}/")
+
+        with pytest.raises(TransportError):
+            transport.request("PUT", f"{echo_server.url}/drop", json={})
+
+        # La seconda PUT, su una connessione nuova, non viene ripetuta oltre
+        assert echo_server.dropped == ["PUT", "PUT"]
+        transport.close()
+
+    def test_post_on_expired_idle_connection(self, echo_server):
+        """Test che una POST non venga inviata su una connessione inattiva già chiusa dal server"""
+        echo_server.drop_idle = True
+        transport = UrllibTransport()
+        transport.request("GET", f"{echo_server.url}/")
+        # Lascia al server il tempo di chiudere la connessione inattiva
+        time.sleep(0.2)
+
+        assert transport.request("POST", f"{echo_server.url}/", json={}).status_code == 200
+        assert len(echo_server.peers) == 2
+        transport.close()
+
+    def test_error_status_is_returned(self, echo_server):
+        """Test che gli stati di errore vengano restituiti e segnalati da raise_for_status"""
+        transport = UrllibTransport()
+
+        response = transport.request("GET", f"{echo_server.url}/error")
+
+        assert response.status_code == 503
+        assert response.headers.get("Retry-After") == "3"
+        with pytest.raises(HTTPStatusError, match="503") as excinfo:
+            response.raise_for_status()
+        assert excinfo.value.response is response
+        transport.close()
+
+    def test_connection_refused(self):
+        """Test che gli errori di rete diventino TransportError"""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+
+        with pytest.raises(TransportError):
+            UrllibTransport().request("GET", f"http://127.0.0.1:{port}/")
+
+    def test_timeout(self, echo_server):
+        """Test che un timeout diventi TransportError"""
+        with pytest.raises(TransportError):
+            UrllibTransport().request("GET", f"{echo_server.url}/slow", timeout=0.1)
+
+    def test_create_transport_unknown(self):
+        """Test errore per un trasporto sconosciuto"""
+        with pytest.raises(ValueError):
+            create_transport("curl")
+
+
+class TestUrllibTransportClients:
+    """Test di IONOSClient e PublicIPDetector sul trasporto urllib"""
+
+    def test_ionos_client_roundtrip(self):
+        """Test lettura e scritture in blocco contro il server finto"""
+        with FakeIONOSServer() as server:
+            server.populate(1, 1)
+            client = IONOSClient("pub", "secret", base_url=server.url, transport=UrllibTransport())
+            try:
+                assert client.get_zone_id("example0.com") == "zone-0"
+                errors = client.update_records("example0.com", [
+                    {"id": "record-0-0", "name": "host0", "type": "A", "content": "203.0.113.42"}
+                ])
+                created = client.create_records("example0.com", [
+                    {"name": "new", "type": "A", "content": "203.0.113.42"}
+                ])
+                records = client.get_records("zone-0", record_name="new.example0.com")
+            finally:
+                client.close()
+
+            assert errors == {"record-0-0": None}
+            assert server.find_record("host0.example0.com", "A")["content"] == "203.0.113.42"
+            assert created[0]["name"] == "new.example0.com"
+            assert [r["id"] for r in records] == [created[0]["id"]]
+
+    def test_public_ip_detector(self, mocker):
+        """Test rilevamento IP con il trasporto iniettato"""
+        transport = mocker.Mock()
+        transport.request.return_value.status_code = 200
+        transport.request.return_value.text = "203.0.113.7\n"
+        detector = PublicIPDetector(transport=transport)
+
+        assert detector.get_public_ip() == ("203.0.113.7", "A")
+        transport.request.assert_called_once_with(
+            "GET", PublicIPDetector.IPV4_SERVICES[0], timeout=PublicIPDetector.REQUEST_TIMEOUT
+        )
+
+
+class TestUrllibTransportUpdater:
+    """
+    Test di DNSUpdater sul trasporto urllib, il predefinito in produzione
+
+    conftest.py imposta requests come trasporto predefinito per i test con
+    responses: qui il trasporto urllib viene passato esplicitamente.
+    """
+
+    HOSTS = ["host0.example0.com", "host1.example0.com", "host0.example1.com", "new.example1.com"]
+
+    def make_updater(self, server, echo, **options):
+        detector = PublicIPDetector(transport=UrllibTransport())
+        detector.IPV4_SERVICES = [echo.url]
+        return DNSUpdater("pub", "secret", base_url=server.url, transport=UrllibTransport(),
+                          ip_detector=detector, rate_limit=None, **options)
+
+    def test_update_hosts(self):
+        """Test aggiornamento e creazione di record su più zone"""
+        with FakeIONOSServer() as server, FakeIPEchoServer("93.184.216.34") as echo:
+            server.populate(2, 2)
+            updater = self.make_updater(server, echo)
+
+            results = updater.update_hosts(self.HOSTS)
+
+            assert [outcome for _, _, _, outcome in results] == ["aggiornato", "aggiornato", "aggiornato",
+                                                                  "creato"]
+            assert server.find_record("new.example1.com", "A")["content"] == "93.184.216.34"
+
+    def test_connections_expired_between_cycles(self):
+        """Test come nel daemon: connessioni scadute durante la pausa non fanno perdere scritture"""
+        with FakeIONOSServer() as server, FakeIPEchoServer("93.184.216.34") as echo:
+            server.populate(2, 2)
+            updater = self.make_updater(server, echo)
+            updater.update_hosts(self.HOSTS)
+            server.close_connections()
+            echo.close_connections()
+            echo.ip = "93.184.216.35"
+
+            results = updater.update_hosts(self.HOSTS + ["other.example0.com"])
+
+            outcomes = {hostname: outcome for hostname, _, _, outcome in results}
+            assert outcomes == {**{hostname: "aggiornato" for hostname in self.HOSTS},
+                                "other.example0.com": "creato"}
+            assert server.find_record("other.example0.com", "A")["content"] == "93.184.216.35"
+
+    def test_put_fallback_after_expired_connections(self):
+        """Test del ripiego su PUT per singolo record con più connessioni inattive scadute"""
+        with FakeIONOSServer() as server, FakeIPEchoServer("93.184.216.34") as echo:
+            server.populate(1, 4)
+            hosts = [f"host{i}.example0.com" for i in range(4)]
+            updater = self.make_updater(server, echo)
+            server.fail(405, method="PATCH", times=2)
+            updater.update_hosts(hosts)
+            server.close_connections()
+            echo.ip = "93.184.216.35"
+            updater._published.clear()
+
+            results = updater.update_hosts(hosts)
+
+            assert [outcome for _, _, _, outcome in results] == ["aggiornato"] * 4
+            assert server.count(method="PUT", status=200) == 8
+
+    def test_async_updater_after_expired_connections(self):
+        """Test di --concurrency: le scritture in parallelo sostituiscono tutte le connessioni scadute"""
+        import asyncio
+        with FakeIONOSServer(latency=0.02) as server, FakeIPEchoServer("93.184.216.34") as echo:
+            server.populate(4, 2)
+            hosts = [f"host{i}.example{z}.com" for z in range(4) for i in range(2)]
+            detector = PublicIPDetector(transport=UrllibTransport())
+            detector.IPV4_SERVICES = [echo.url]
+            updater = AsyncDNSUpdater("pub", "secret", concurrency=8, base_url=server.url,
+                                      transport=UrllibTransport(pool_size=8), ip_detector=detector,
+                                      rate_limit=None)
+            try:
+                asyncio.run(updater.update_hosts(hosts))
+                assert server.close_connections() > 1
+                echo.ip = "93.184.216.35"
+
+                results = asyncio.run(updater.update_hosts(hosts + ["new.example3.com"]))
+            finally:
+                updater.close()
+
+            outcomes = {hostname: outcome for hostname, _, _, outcome in results}
+            assert outcomes == {**{hostname: "aggiornato" for hostname in hosts}, "new.example3.com": "creato"}
+
+
+HEAVY_MODULES = ["requests", "urllib3", "asyncio", "concurrent.futures", "ssl", "email.utils"]
+
+UNCHANGED_RUN = """
+import json, sys
+import ionos_ddns
+
+class StaticDetector:
+    def get_public_ip(self):
+        return "203.0.113.42", "A"
+
+state_file = sys.argv[1]
+ionos_ddns.StateStore(state_file).set("dev01.example.com", "A", "203.0.113.42", "record-1", "zone-1")
+updater = ionos_ddns.DNSUpdater("pub", "secret", state_file=state_file, ip_detector=StaticDetector())
+updater.update_dns("dev01.example.com")
+print(json.dumps([name for name in {heavy!r} if name in sys.modules]))
+"""
+
+
+class TestStartup:
+    """Test di regressione sul tempo di avvio"""
+
+    def run_python(self, *args):
+        return subprocess.run([sys.executable, *args], cwd=REPO_ROOT, capture_output=True,
+                              text=True, timeout=30, check=True)
+
+    def test_import_is_light(self):
+        """Test con -X importtime: l'import del modulo non carica librerie pesanti"""
+        result = self.run_python("-X", "importtime", "-c", "import ionos_ddns")
+
+        imported = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            self_us, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                imported[name.strip()] = (int(self_us), int(cumulative))
+
+        assert "ionos_ddns" in imported
+        assert [name for name in HEAVY_MODULES if name in imported] == []
+        # Tempo speso a importare le dipendenze del modulo, in microsecondi
+        self_us, cumulative = imported["ionos_ddns"]
+        dependencies = cumulative - self_us
+        assert dependencies < 100_000
+
+    def test_unchanged_ip_path_is_light(self, tmp_path):
+        """Test che un'esecuzione con IP invariato non importi le librerie pesanti"""
+        script = UNCHANGED_RUN.format(heavy=HEAVY_MODULES)
+
+        result = self.run_python("-c", script, str(tmp_path / "state.json"))
+
+        assert "invariato" in result.stdout
+        assert json.loads(result.stdout.strip().splitlines()[-1]) == []
@@ -0,0 +1,55 @@
+"""Test per Zone e DNSRecord"""
+import pytest
+from ionos_ddns import DNSRecord, Zone
+
+
+class TestZone:
+    """Test suite per il modello di zona indicizzato"""
+
+    def test_from_api(self, mock_zone_data):
+        """Test costruzione della zona dai dati dell'API"""
+        zone = Zone.from_api("zone-123", mock_zone_data)
+
+        assert len(zone) == 2
+        record = zone.find("www.example.com", "A")
+        assert record.id == "record-002"
+        assert record.content == "192.0.2.2"
+        assert record.ttl == 3600
+        assert zone.get("record-001").name == "example.com"
+
+    def test_find_missing(self, mock_zone_data):
+        """Test ricerca di nome o tipo non presenti"""
+        zone = Zone.from_api("zone-123", mock_zone_data)
+
+        assert zone.find("www.example.com", "AAAA") is None
+        assert zone.find("mail.example.com", "A") is None
+        assert zone.get("record-999") is None
+
+    def test_duplicate_name_type_keeps_first(self):
+        """Test che a parità di nome e tipo venga restituito il primo record, come la ricerca lineare"""
+        zone = Zone("zone-123", [
+            DNSRecord("record-1", "rr.example.com", "A", "192.0.2.1"),
+            DNSRecord("record-2", "rr.example.com", "A", "192.0.2.2"),
+        ])
+
+        assert zone.find("rr.example.com", "A").id == "record-1"
+        assert zone.get("record-2").content == "192.0.2.2"
+
+    def test_updated_in_place(self, mock_zone_data):
+        """Test aggiornamento degli indici dopo scritture riuscite"""
+        zone = Zone.from_api("zone-123", mock_zone_data)
+
+        zone.set_content("record-002", "203.0.113.5")
+        zone.add(DNSRecord("record-003", "dev.example.com", "AAAA", "2001:db8::5"))
+
+        assert zone.find("www.example.com", "A").content == "203.0.113.5"
+        assert zone.find("dev.example.com", "AAAA").id == "record-003"
+        assert len(zone) == 3
+
+    def test_record_uses_slots(self):
+        """Test che i record non abbiano un __dict__ per istanza"""
+        record = DNSRecord("record-1", "www.example.com", "A", "192.0.2.1")
+
+        assert not hasattr(record, "__dict__")
+        with pytest.raises(AttributeError):
+            record.extra = "x"